@@ -9,8 +9,36 @@ https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 
 import os
 
+from channels.security.websocket import AllowedHostsOriginValidator
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'CMHS.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up so app models are ready
+from appointments.consumers import chat_socket  # noqa: E402
+
+WEBSOCKET_ROUTES = {
+    '/ws/chat/': chat_socket,
+}
+
+
+async def websocket_router(scope, receive, send):
+    handler = WEBSOCKET_ROUTES.get(scope['path'])
+    if handler is None:
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+    return await handler(scope, receive, send)
+
+
+# Browsers send cookies with cross-site WebSocket handshakes, so a socket
+# is only accepted from pages served by one of our own hosts
+websocket_application = AllowedHostsOriginValidator(websocket_router)
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        return await websocket_application(scope, receive, send)
+
+    return await django_application(scope, receive, send)
@@ -15,7 +15,8 @@ SECRET_KEY = 'django-insecure-zu_@phyfzk+vi&xu&v26k9*zefpv!hy%j$!%gz^&l-dgnc1c6!
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
-ALLOWED_HOSTS = ['cmhs.onrender.com', '127.0.0.1', 'alline-hirtellous-dario.ngrok-free.dev', '*']
+# Also the WebSocket origin allow-list, so no wildcard here
+ALLOWED_HOSTS = ['cmhs.onrender.com', '127.0.0.1', 'localhost', 'alline-hirtellous-dario.ngrok-free.dev']
 SITE_ID = 1
 # Application definition
 
@@ -35,6 +36,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'cmhsApp.middleware.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -64,6 +66,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'CMHS.wsgi.application'
+ASGI_APPLICATION = 'CMHS.asgi.application'
 
 
 # Database
@@ -95,6 +98,39 @@ DATABASES = {
 }
 
 
+# CACHE
+# Counters and versions (USSD sessions, load counters, analytics and
+# schedule versions) and every invalidation must be seen by the web
+# process and the workers in the Procfile alike, so the default cache is
+# always shared: Redis in production (REDIS_URL), otherwise the database
+# (run `manage.py createcachetable` once). Workers refuse to start on a
+# per-process backend; see cmhsApp.workers.
+if os.getenv('REDIS_URL'):
+    DEFAULT_CACHE = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REDIS_URL'),
+    }
+else:
+    DEFAULT_CACHE = {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'cmhs_cache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+
+CACHES = {
+    'default': DEFAULT_CACHE,
+    # The M-Pesa OAuth token only: file-based so every process on the host
+    # reuses one token, with or without Redis
+    'mpesa': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('MPESA_CACHE_DIR', '/tmp/cmhs-mpesa-cache'),
+    },
+}
+
+# Tests run on a memory cache; see cmhsApp.testing.TestRunner
+TEST_RUNNER = 'cmhsApp.testing.TestRunner'
+
+
 USE_X_FORWARDED_HOST = True
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 
@@ -155,6 +191,107 @@ MPESA_CONSUMER_KEY = os.getenv('MPESA_CONSUMER_KEY')
 MPESA_CONSUMER_SECRET = os.getenv('MPESA_CONSUMER_SECRET')
 MPESA_SHORTCODE = os.getenv('MPESA_SHORTCODE')
 MPESA_PASSKEY = os.getenv('MPESA_PASSKEY')
+# (connect, read) seconds; a slow gateway must not pin a worker
+MPESA_TIMEOUT = (5, 20)
+MPESA_MAX_RETRIES = 2
+# --replay-failed also retries 'unknown' callbacks this young: they may have
+# arrived before the STK push response saved their checkout id
+MPESA_UNKNOWN_REPLAY_SECONDS = 24 * 60 * 60
+
+# QUERY BUDGETS
+# Per-URL-name query ceilings, enforced in tests and warned about at runtime.
+QUERY_INSPECTOR_ENABLED = DEBUG
+QUERY_REPEAT_THRESHOLD = 3
+QUERY_BUDGETS = {
+    'dashboard': 5,
+    'therapist_dashboard': 7,
+    'therapist_appointments': 3,
+    'therapist_patients': 3,
+    'patient_appointments': 3,
+    'calendar': 3,
+    'inbox_with_id': 5,
+    'conversation_list': 3,
+    'get_chat_messages': 7,
+    'journal': 3,
+    'transaction_history': 4,
+    'preview_appointments_report': 5,
+    'therapist_availability': 4,
+    'analytics_trends': 5,
+    'therapist_schedule': 5,
+    'schedule_board': 6,
+}
+
+# OUTBOUND NOTIFICATIONS
+# Delivered by `manage.py dispatch_notifications`. Set NOTIFICATIONS_OFFLINE=1
+# to route every channel to the in-memory stub provider.
+if os.getenv('NOTIFICATIONS_OFFLINE'):
+    NOTIFICATION_PROVIDERS = {
+        'email': 'cmhsApp.notifications.StubProvider',
+        'sms': 'cmhsApp.notifications.StubProvider',
+    }
+else:
+    NOTIFICATION_PROVIDERS = {
+        'email': 'cmhsApp.notifications.EmailProvider',
+        'sms': 'cmhsApp.notifications.AfricasTalkingSMSProvider',
+    }
+NOTIFICATION_FROM_EMAIL = 'noreply@chiromo.com'
+# Sends per second, per provider
+NOTIFICATION_RATE_LIMITS = {'email': 5, 'sms': 10}
+NOTIFICATION_MAX_ATTEMPTS = 5
+NOTIFICATION_RETRY_BASE_SECONDS = 30
+NOTIFICATION_LEASE_SECONDS = 300
+
+# REPORT JOBS
+# Rendered admin PDFs are stored on the job row, keyed by filters and data
+# version. A running job whose worker has not sent a heartbeat for this
+# long is assumed orphaned and requeued.
+REPORT_JOB_TIMEOUT_SECONDS = 15 * 60
+
+# REAL-TIME CHAT
+# Dotted path to the pub/sub broker used by the /ws/chat/ socket.
+# LocalSocketBroker fans out between workers on one host without Redis.
+CHAT_BROKER = os.getenv('CHAT_BROKER', 'appointments.realtime.LocalSocketBroker')
+CHAT_SOCKET_DIR = os.getenv('CHAT_SOCKET_DIR', '/tmp/cmhs-chat')
+
+# THERAPIST AVAILABILITY
+# Per-therapist, per-day booked-slot bitmaps are refreshed on every booking
+# change; the timeout only bounds how long a missed update could linger.
+AVAILABILITY_CACHE_SECONDS = 60 * 60
+# How long an unpaid web booking keeps its slot. Renewed on each visit to
+# checkout; `manage.py release_slot_holds` frees the slot once it lapses.
+SLOT_HOLD_SECONDS = 10 * 60
+# A hold whose STK push is still awaiting its callback is extended rather
+# than released, for at most this long after the push.
+SLOT_HOLD_PAYMENT_SECONDS = 60 * 60
+
+# DASHBOARDS
+# Per-user dashboard snapshots are dropped by model signals as soon as a
+# row behind them changes; the timeout is only a safety net.
+DASHBOARD_CACHE_SECONDS = 15 * 60
+
+# USSD
+# Gateway sessions are short-lived; the menu position is kept in the
+# cache between hops and dropped when the session ends.
+USSD_SESSION_SECONDS = 180
+# How long a finished session's END is kept to answer gateway resends
+USSD_ENDED_SECONDS = 5 * 60
+
+# THERAPIST ASSIGNMENT
+# USSD bookings go to the least-loaded therapist for the chosen service.
+# Pools and daily load counters are cached and refreshed on writes.
+ASSIGNMENT_CACHE_SECONDS = 60 * 60
+# Therapists tried, in load order, when the first already has the slot
+ASSIGNMENT_ATTEMPTS = 3
+
+# ANALYTICS
+# Trend series are keyed by a per-patient / per-caseload version that
+# signals bump on every mood or assessment write.
+ANALYTICS_CACHE_SECONDS = 6 * 60 * 60
+
+# SCHEDULE BOARD
+# Week/month schedules are cached per therapist under a version that
+# signals bump on every appointment write; responses carry a matching ETag.
+SCHEDULE_CACHE_SECONDS = 60 * 60
 
 JAZZMIN_SETTINGS = {
     # TITLE & HEADER
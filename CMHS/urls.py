@@ -3,6 +3,7 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from appointments.views import export_appointments_pdf, preview_appointments_report, preview_payments_report, export_payments_pdf
+from appointments.views import report_job, report_job_status, download_report_job
 
 urlpatterns = [
 
@@ -10,6 +11,9 @@ urlpatterns = [
     path('admin/reports/payments/preview/', preview_payments_report, name='preview_payments_report'),
     path('admin/reports/appointments/download/', export_appointments_pdf, name='export_appointments_pdf'),
     path('admin/reports/payments/download/', export_payments_pdf, name='export_payments_pdf'),
+    path('admin/reports/jobs/<int:job_id>/', report_job, name='report_job'),
+    path('admin/reports/jobs/<int:job_id>/status/', report_job_status, name='report_job_status'),
+    path('admin/reports/jobs/<int:job_id>/download/', download_report_job, name='download_report_job'),
     path('admin/', admin.site.urls),
     path('', include('cmhsApp.urls')),
     path('', include('accounts.urls')),
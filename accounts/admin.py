@@ -1,52 +1,18 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from .models import User, Specialization
-from django.http import HttpResponse
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
+from django.db.models import Count, Q
+from django.shortcuts import redirect
+from appointments.reports import request_report
 
 # --- 1. PDF Export Action ---
 def export_customers_pdf(modeladmin, request, queryset):
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = 'attachment; filename="Customer_Demographics_Report.pdf"'
-
-    doc = SimpleDocTemplate(response, pagesize=letter)
-    elements = []
-    styles = getSampleStyleSheet()
-
-    # Header Section
-    elements.append(Paragraph("Online CMHS", styles['Title']))
-    elements.append(Paragraph("Patient Demographics Report", styles['Heading2']))
-    elements.append(Paragraph("<br/>", styles['Normal']))
-
-    # Table Data
-    data = [['Username', 'Email', 'Role', 'High Risk', 'Premium']]
-
-    for user in queryset:
-        data.append([
-            user.username,
-            user.email,
-            user.role,
-            "Yes" if user.is_high_risk else "No",
-            "Yes" if user.is_premium else "No"
-        ])
-
-    # Executive Styling
-    table = Table(data, hAlign='LEFT')
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#00183E")),  # Navy Header
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('GRID', (0, 0), (-1, -1), 1, colors.grey)
-    ]))
-
-    elements.append(table)
-    doc.build(elements)
-    return response
+    # Rendered by the report worker; repeat exports of the same selection are served from cache
+    user_ids = list(queryset.order_by('id').values_list('id', flat=True))
+    job = request_report('customers', {'user_ids': user_ids}, request.user)
+    if job.status == 'done':
+        return redirect('download_report_job', job_id=job.id)
+    return redirect('report_job', job_id=job.id)
 
 export_customers_pdf.short_description = "Generate Customer PDF Report"
 
@@ -70,6 +36,7 @@ class CustomUserAdmin(UserAdmin):
 
     display_specialization.short_description = 'Professional Specialization'
 
+    list_select_related = ('specialization',)
     list_filter = ('role', 'is_high_risk', 'specialization', 'is_staff')
     search_fields = ('username', 'email', 'phone_number')
     actions = [export_customers_pdf]
@@ -90,6 +57,10 @@ class CustomUserAdmin(UserAdmin):
     # Dashboard Statistics logic
     def changelist_view(self, request, extra_context=None):
         extra_context = extra_context or {}
-        extra_context['total_high_risk'] = User.objects.filter(is_high_risk=True).count()
-        extra_context['total_therapists'] = User.objects.filter(role='therapist').count()
+        # Both counts in one pass over the table
+        counts = User.objects.aggregate(
+            total_high_risk=Count('id', filter=Q(is_high_risk=True)),
+            total_therapists=Count('id', filter=Q(role='therapist')),
+        )
+        extra_context.update(counts)
         return super().changelist_view(request, extra_context=extra_context)
\ No newline at end of file
@@ -0,0 +1,87 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from appointments import chat
+from appointments.models import Appointment, MoodEntry
+
+
+# ---------------------------------------------
+# DASHBOARD SNAPSHOTS
+# One cache entry per user holds everything their dashboard shows.
+# Entries are dropped by accounts.signals whenever a row behind them
+# changes, and rebuilt on the next visit.
+# ---------------------------------------------
+def patient_key(user_id):
+    return f"dashboard:patient:{user_id}"
+
+
+def therapist_key(user_id):
+    return f"dashboard:therapist:{user_id}"
+
+
+def invalidate(*user_ids):
+    keys = []
+    for user_id in set(user_ids):
+        if user_id:
+            keys += [patient_key(user_id), therapist_key(user_id)]
+    if keys:
+        cache.delete_many(keys)
+
+
+def _cached(key, build):
+    today = timezone.now().date()
+    snapshot = cache.get(key)
+    # "Today" rolls over at midnight without any row changing
+    if snapshot is None or snapshot['day'] != today:
+        snapshot = build(today)
+        snapshot['day'] = today
+        cache.set(key, snapshot, settings.DASHBOARD_CACHE_SECONDS)
+    return snapshot
+
+
+# Snapshots hold plain dicts of the fields the templates render, never
+# model instances: the cache is shared storage and a pickled User carries its
+# password hash.
+APPOINTMENT_FIELDS = ('id', 'date', 'time', 'mode', 'status', 'meeting_link')
+
+
+def _with_patient_names(appointments):
+    rows = []
+    for row in appointments.values(*APPOINTMENT_FIELDS, 'patient__first_name', 'patient__last_name', 'patient__username'):
+        first, last, username = row.pop('patient__first_name'), row.pop('patient__last_name'), row.pop('patient__username')
+        row['patient_name'] = f"{first} {last}".strip() or username
+        rows.append(row)
+    return rows
+
+
+def patient_snapshot(user):
+    def build(today):
+        return {
+            # Today's online confirmed sessions for the Join Card
+            'upcoming_appointments': list(Appointment.objects.filter(
+                patient=user, status='confirmed', date=today, mode='online'
+            ).values(*APPOINTMENT_FIELDS)),
+            'todays_mood': MoodEntry.objects.filter(patient=user, created_at=today).values('mood').first(),
+            'unread_count': chat.unread_total(user.id),
+        }
+    return _cached(patient_key(user.id), build)
+
+
+def therapist_snapshot(user):
+    def build(today):
+        pending_requests = _with_patient_names(Appointment.objects.filter(
+            therapist=user, status='pending'
+        ).order_by('date', 'time'))
+
+        approved_sessions = _with_patient_names(Appointment.objects.filter(
+            therapist=user, date=today, status='confirmed'
+        ).order_by('time'))
+
+        return {
+            'pending_requests': pending_requests,
+            'approved_sessions': approved_sessions,
+            'pending_count': len(pending_requests),
+            'todays_count': len(approved_sessions),
+            'total_patients': Appointment.objects.filter(therapist=user).values('patient').distinct().count(),
+        }
+    return _cached(therapist_key(user.id), build)
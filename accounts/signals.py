@@ -0,0 +1,56 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from appointments import assignment
+from appointments.models import Appointment, MoodEntry, Message
+from appointments.signals import appointments_changed
+from . import dashboards
+from .models import Specialization, User
+
+
+def invalidate_on_commit(*user_ids):
+    # After commit, so a concurrent visit cannot re-cache the old rows
+    transaction.on_commit(lambda: dashboards.invalidate(*user_ids))
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def appointment_changed(sender, instance, **kwargs):
+    # A reassigned appointment also leaves its previous therapist's dashboard
+    previous_therapist_id = getattr(instance, '_loaded_slot_day', (None, None))[0]
+    invalidate_on_commit(instance.patient_id, instance.therapist_id, previous_therapist_id)
+
+
+@receiver(appointments_changed)
+def appointments_changed_in_bulk(sender, appointment_ids, **kwargs):
+    people = Appointment.objects.filter(id__in=appointment_ids).values_list('patient_id', 'therapist_id')
+    dashboards.invalidate(*[user_id for pair in people for user_id in pair])
+
+
+@receiver(post_save, sender=MoodEntry)
+@receiver(post_delete, sender=MoodEntry)
+def mood_changed(sender, instance, **kwargs):
+    invalidate_on_commit(instance.patient_id)
+
+
+@receiver(post_save, sender=Message)
+@receiver(post_delete, sender=Message)
+def message_changed(sender, instance, **kwargs):
+    # Only the recipient's unread count is on a dashboard
+    invalidate_on_commit(instance.recipient_id)
+
+
+# ---------------------------------------------
+# ASSIGNMENT POOLS
+# ---------------------------------------------
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Specialization)
+@receiver(post_delete, sender=Specialization)
+def therapist_profile_changed(sender, instance, created=False, update_fields=None, **kwargs):
+    # Logins only touch last_login, and new patients (e.g. USSD callers) join no pool
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    if created and getattr(instance, 'role', None) == 'patient':
+        return
+    transaction.on_commit(assignment.invalidate_pools)
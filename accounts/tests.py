@@ -1,3 +1,98 @@
+from datetime import date, time, timedelta
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+from appointments import chat
+from appointments.models import Appointment, Message, MoodEntry
+from cmhsApp.testing import QueryBudgetMixin
+from . import dashboards
+from .models import User
 
-# Create your tests here.
+
+class DashboardQueryBudgetTests(QueryBudgetMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.therapist = User.objects.create_user('therapist', password='pw', role='therapist')
+        cls.patients = [User.objects.create_user(f'patient{i}', password='pw') for i in range(5)]
+        for i, patient in enumerate(cls.patients):
+            Appointment.objects.create(patient=patient, therapist=cls.therapist, date=date.today(),
+                                       time=time(8 + i), status='confirmed')
+            Appointment.objects.create(patient=patient, therapist=cls.therapist,
+                                       date=date.today() + timedelta(days=1), time=time(8 + i))
+            Message.objects.create(sender=cls.therapist, recipient=patient, body='Hello')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_patient_dashboard(self):
+        self.client.force_login(self.patients[0])
+        with self.assertQueryBudget('dashboard'):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_therapist_dashboard(self):
+        self.client.force_login(self.therapist)
+        with self.assertQueryBudget('therapist_dashboard'):
+            response = self.client.get(reverse('therapist_dashboard'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_therapist_appointments(self):
+        self.client.force_login(self.therapist)
+        with self.assertQueryBudget('therapist_appointments'):
+            response = self.client.get(reverse('therapist_appointments'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_therapist_patients(self):
+        self.client.force_login(self.therapist)
+        with self.assertQueryBudget('therapist_patients'):
+            response = self.client.get(reverse('therapist_patients'))
+        self.assertEqual(response.status_code, 200)
+
+
+class DashboardSnapshotTests(QueryBudgetMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.therapist = User.objects.create_user('therapist', password='pw', role='therapist')
+        cls.patient = User.objects.create_user('patient', password='pw')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_repeat_visit_is_a_cache_hit(self):
+        self.client.force_login(self.therapist)
+        self.client.get(reverse('therapist_dashboard'))
+        # Session and user lookups only
+        with self.assertQueryBudget('therapist_dashboard', budget=2):
+            response = self.client.get(reverse('therapist_dashboard'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_changes_invalidate_affected_users(self):
+        self.client.force_login(self.patient)
+        self.assertEqual(self.client.get(reverse('dashboard')).context['unread_count'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            chat.send_message(self.therapist.id, self.patient.id, 'Hello')
+            MoodEntry.objects.create(patient=self.patient, mood='great')
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['unread_count'], 1)
+        self.assertEqual(response.context['todays_mood']['mood'], 'great')
+
+        self.client.force_login(self.therapist)
+        self.assertEqual(self.client.get(reverse('therapist_dashboard')).context['pending_count'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            Appointment.objects.create(patient=self.patient, therapist=self.therapist,
+                                       date=date.today() + timedelta(days=1), time=time(8))
+        self.assertEqual(self.client.get(reverse('therapist_dashboard')).context['pending_count'], 1)
+
+    def test_snapshots_hold_no_user_rows(self):
+        User.objects.filter(id=self.patient.id).update(first_name='Amina', last_name='Wanjiru')
+        Appointment.objects.create(patient=self.patient, therapist=self.therapist, date=date.today(),
+                                   time=time(8), status='confirmed', mode='online')
+        self.client.force_login(self.therapist)
+        self.assertContains(self.client.get(reverse('therapist_dashboard')), 'Amina Wanjiru')
+
+        snapshot = cache.get(dashboards.therapist_key(self.therapist.id))
+        self.assertEqual(snapshot['approved_sessions'][0]['patient_name'], 'Amina Wanjiru')
+        self.assertNotIn(self.patient.password, repr(snapshot))
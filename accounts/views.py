@@ -4,9 +4,10 @@ from django.contrib.auth import login
 from django.contrib.auth.forms import AuthenticationForm
 from .forms import PatientRegistrationForm, ProfileUpdateForm
 from django.contrib.auth.decorators import login_required
-from appointments.models import Appointment, MoodEntry, Message
-from datetime import date
+from appointments.models import Appointment
 from .models import User
+from . import dashboards
+from cmhsApp.pagination import paginate_request
 from django.utils import timezone
 from django.contrib import messages
 
@@ -86,26 +87,8 @@ def toggle_risk(request, user_id):
 # -------------------------------
 @login_required
 def dashboard(request):
-    user = request.user
-    today = timezone.now().date()
-
-    # Pulls today's online confirmed sessions for the Join Card
-    upcoming_appointments = Appointment.objects.filter(
-        patient=user,
-        status='Confirmed',
-        date=today,
-        mode='online'
-    )
-
-    # Check if mood logged today
-    todays_mood = MoodEntry.objects.filter(patient=user, created_at=today).first()
-    unread_count = Message.objects.filter(recipient=user, is_read=False).count()
-
-    context = {
-        'upcoming_appointments': upcoming_appointments,
-        'todays_mood': todays_mood,
-        'unread_count': unread_count,
-    }
+    # Today's join card, mood and unread count come from one cached snapshot
+    context = dashboards.patient_snapshot(request.user)
     return render(request, 'accounts/patient_dashboard.html', context)
 
 @login_required
@@ -115,38 +98,8 @@ def therapist_dashboard(request):
         messages.error(request, "Access denied. Restricted to medical staff.")
         return redirect('dashboard')
 
-    # 2. Get the specific data for THIS therapist
-    pending_requests = Appointment.objects.filter(
-        therapist=request.user,
-        status='pending'
-    ).order_by('date', 'time')
-
-    # Fetch Approved Sessions for Today (link generation)
-    approved_sessions = Appointment.objects.filter(
-        therapist=request.user,
-        date=date.today(),
-        status='confirmed'
-    ).order_by('time')
-
-    # the counts
-    pending_count = pending_requests.count()
-
-    # count of the approved sessions
-    todays_count = approved_sessions.count()
-
-    # Count distinct patients assigned to this therapist
-    total_patients = Appointment.objects.filter(
-        therapist=request.user
-    ).values('patient').distinct().count()
-
-    # context dictionary
-    context = {
-        'pending_requests': pending_requests,
-        'approved_sessions': approved_sessions,
-        'pending_count': pending_count,
-        'todays_count': todays_count,
-        'total_patients': total_patients,
-    }
+    # 2. Requests, today's sessions and counts for THIS therapist (cached snapshot)
+    context = dashboards.therapist_snapshot(request.user)
 
     return render(request, 'accounts/therapist_dashboard.html', context)
 
@@ -156,7 +109,9 @@ def therapist_appointments(request):
         return redirect('dashboard')
 
     # Get all appointments
-    appointments = Appointment.objects.filter(therapist=request.user).order_by('-date', '-time')
+    appointments = paginate_request(
+        request, Appointment.objects.filter(therapist=request.user).select_related('patient'), ('-date', '-time', '-id')
+    )
     return render(request, 'accounts/therapist_appointments.html', {'appointments': appointments})
 
 @login_required
@@ -166,7 +121,7 @@ def therapist_patients(request):
 
     # Get distinct patients who have booked with this therapist
     patient_ids = Appointment.objects.filter(therapist=request.user).values_list('patient', flat=True).distinct()
-    patients = User.objects.filter(id__in=patient_ids)
+    patients = paginate_request(request, User.objects.filter(id__in=patient_ids), ('username', 'id'))
 
     return render(request, 'accounts/therapist_patients.html', {'patients': patients})
 
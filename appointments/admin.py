@@ -1,7 +1,6 @@
 from django.contrib import admin
-from payments.models import Transaction
-from .models import Appointment, SessionLog
-from django.db.models import Sum
+from cmhsApp import reporting
+from .models import Appointment, AssessmentResult, SessionLog
 
 
 
@@ -13,25 +12,30 @@ class AppointmentAdmin(admin.ModelAdmin):
     list_display = ('patient', 'therapist', 'date', 'status')
     list_filter = ('status', 'date', 'therapist')
     search_fields = ('patient__username', 'therapist__username', 'notes')
+    # list_display renders both users via __str__
+    list_select_related = ('patient', 'therapist')
 
 
-def custom_admin_index(request, extra_context=None):
-    extra_context = extra_context or {}
-
-    total_apps = Appointment.objects.count()
+@admin.register(AssessmentResult)
+class AssessmentResultAdmin(admin.ModelAdmin):
+    list_display = ('patient', 'test_type', 'score', 'severity', 'risk_flag', 'date_taken')
+    # Flagged results include anonymous screenings with no patient to follow up
+    list_filter = ('risk_flag', 'test_type', 'severity')
+    list_select_related = ('patient',)
 
-    ussd_count = Appointment.objects.filter(status__iexact='Pending').count()
 
-    actual_revenue = Transaction.objects.filter(status='completed').aggregate(Sum('amount'))['amount__sum'] or 0
+def custom_admin_index(request, extra_context=None):
+    extra_context = extra_context or {}
 
-    formatted_revenue = "{:,.2f}".format(actual_revenue)
+    # Read from the daily rollups: cost grows with days, not rows
+    kpis = reporting.admin_kpis()
 
-    extra_context['ussd_intake'] = ussd_count
-    extra_context['web_intake'] = total_apps - ussd_count
+    extra_context['ussd_intake'] = kpis['ussd']
+    extra_context['web_intake'] = kpis['total_appointments'] - kpis['ussd']
 
-    extra_context['total_appointments'] = total_apps
-    extra_context['pending_sessions'] = ussd_count
-    extra_context['total_revenue'] = formatted_revenue
+    extra_context['total_appointments'] = kpis['total_appointments']
+    extra_context['pending_sessions'] = kpis['pending']
+    extra_context['total_revenue'] = "{:,.2f}".format(kpis['revenue'])
 
     return original_index(request, extra_context=extra_context)
 
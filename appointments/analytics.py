@@ -0,0 +1,134 @@
+from datetime import datetime, time, timedelta
+from time import time_ns
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Count, DateField, Max, Min, Q
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.utils import timezone
+from .models import Appointment, AssessmentResult, MoodEntry
+
+
+BUCKETS = {
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+# Default window when no start date is given
+DEFAULT_SPAN = {
+    'week': timedelta(weeks=12),
+    'month': timedelta(days=365),
+}
+MOODS = [value for value, label in MoodEntry.MOOD_CHOICES]
+
+
+# ---------------------------------------------
+# SCOPES
+# A series covers one patient, or every patient on a therapist's caseload
+# (anyone they have an appointment with).
+# ---------------------------------------------
+def caseload(therapist_id):
+    return Appointment.objects.filter(therapist_id=therapist_id).values('patient_id')
+
+
+def on_caseload(therapist_id, patient_id):
+    return Appointment.objects.filter(therapist_id=therapist_id, patient_id=patient_id).exists()
+
+
+def _patients(scope, owner_id):
+    return caseload(owner_id) if scope == 'therapist' else [owner_id]
+
+
+# ---------------------------------------------
+# SERIES
+# Bucketing runs in the database (date_trunc / strftime), so only one row
+# per period and category comes back however long the window is.
+# ---------------------------------------------
+def mood_distribution(scope, owner_id, bucket, start, end):
+    rows = MoodEntry.objects.filter(
+        patient_id__in=_patients(scope, owner_id), created_at__gte=start, created_at__lte=end
+    ).annotate(period=BUCKETS[bucket]('created_at')).values('period', 'mood').annotate(n=Count('id')).order_by('period')
+
+    series = {}
+    for row in rows:
+        point = series.setdefault(row['period'], dict({mood: 0 for mood in MOODS}, period=row['period'], total=0))
+        point[row['mood']] = row['n']
+        point['total'] += row['n']
+    return list(series.values())
+
+
+def assessment_series(scope, owner_id, bucket, start, end, test_type=None):
+    # Whole local days, as a range the date_taken index can seek
+    lower = timezone.make_aware(datetime.combine(start, time.min))
+    upper = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min))
+    results = AssessmentResult.objects.filter(
+        patient_id__in=_patients(scope, owner_id), date_taken__gte=lower, date_taken__lt=upper
+    )
+    if test_type:
+        results = results.filter(test_type=test_type)
+
+    period = BUCKETS[bucket]('date_taken', output_field=DateField())
+    rows = results.annotate(period=period).values('test_type', 'period').annotate(
+        n=Count('id'), average=Avg('score'), low=Min('score'), high=Max('score'),
+        severe=Count('id', filter=Q(severity__in=['moderately_severe', 'severe'])),
+    ).order_by('test_type', 'period')
+
+    series = {}
+    for row in rows:
+        series.setdefault(row['test_type'], []).append({
+            'period': row['period'],
+            'count': row['n'],
+            'average': round(row['average'], 2),
+            'min': row['low'],
+            'max': row['high'],
+            'severe': row['severe'],
+        })
+    return series
+
+
+# ---------------------------------------------
+# CACHE
+# Each scope has a version number in the cache, bumped by signals when a
+# mood or assessment row behind it changes. Old entries simply stop being
+# read and expire on their own.
+# ---------------------------------------------
+def version_key(scope, owner_id):
+    return f"analytics:version:{scope}:{owner_id}"
+
+
+def _version(scope, owner_id):
+    key = version_key(scope, owner_id)
+    # Seeded from the clock, so a version lost to eviction never comes
+    # back as a number that stale series are still cached under
+    cache.add(key, time_ns() // 1_000_000, None)
+    return cache.get(key)
+
+
+def bump(patient_id, *therapist_ids):
+    """Invalidates the patient's series and those of every caseload they are on."""
+    therapist_ids = set(therapist_ids) | set(
+        Appointment.objects.filter(patient_id=patient_id).values_list('therapist_id', flat=True).distinct()
+    )
+    keys = [version_key('patient', patient_id)] + [version_key('therapist', tid) for tid in therapist_ids if tid]
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Never read yet, so nothing cached under it
+            pass
+
+
+def trends(scope, owner_id, bucket='week', start=None, end=None, test_type=None):
+    end = end or timezone.localdate()
+    start = start or end - DEFAULT_SPAN[bucket]
+    key = f"analytics:{scope}:{owner_id}:v{_version(scope, owner_id)}:{bucket}:{start}:{end}:{test_type or ''}"
+
+    payload = cache.get(key)
+    if payload is None:
+        payload = {
+            'bucket': bucket,
+            'start': start,
+            'end': end,
+            'moods': mood_distribution(scope, owner_id, bucket, start, end),
+            'assessments': assessment_series(scope, owner_id, bucket, start, end, test_type),
+        }
+        cache.set(key, payload, settings.ANALYTICS_CACHE_SECONDS)
+    return payload
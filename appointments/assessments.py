@@ -0,0 +1,226 @@
+from bisect import bisect_right
+from collections import namedtuple
+from operator import itemgetter
+from django.db import transaction
+from accounts.models import User
+from .models import AssessmentResult
+from . import analytics
+
+
+FREQUENCY = [
+    ('0', 'Not at all'),
+    ('1', 'Several days'),
+    ('2', 'More than half the days'),
+    ('3', 'Nearly every day'),
+]
+YES_NO = [('0', 'No'), ('1', 'Yes')]
+
+# What a patient reads for each AssessmentResult severity
+SEVERITY_TEXT = {
+    'minimal': ("Minimal Symptoms", "Your responses suggest minimal symptoms at this time. Continue prioritizing your wellness and check back if anything changes."),
+    'mild': ("Mild Symptoms", "Your responses suggest mild symptoms. Keep an eye on how you feel, and consider talking to a counselor if they persist."),
+    'moderate': ("Moderate Symptoms", "Your responses suggest moderate symptoms. Speaking with a therapist or counselor would be a helpful next step."),
+    'moderately_severe': ("Moderately Severe Symptoms", "Your responses suggest a significant level of symptoms. We recommend booking a session with a therapist soon."),
+    'severe': ("Severe Symptoms", "Your responses suggest a high level of symptoms. We strongly recommend scheduling a comprehensive clinical evaluation with a psychiatrist."),
+}
+
+Question = namedtuple('Question', 'id label')
+Band = namedtuple('Band', 'severity title description')
+
+
+# ---------------------------------------------
+# INSTRUMENTS
+# Everything about a questionnaire is fixed at import: the question ids,
+# the answer values each accepts, and the score floors of its severity
+# bands. Scoring a submission is then an itemgetter, a sum and a bisect.
+# ---------------------------------------------
+class Instrument:
+
+    def __init__(self, key, title, questions, choices, bands, specialty, theme_color='blue', risk_items=()):
+        self.key = key
+        self.title = title
+        self.questions = [Question(f"q{position}", label) for position, label in enumerate(questions, 1)]
+        self.choices = choices
+        self.specialty = specialty
+        self.theme_color = theme_color
+
+        self._answers = itemgetter(*[question.id for question in self.questions])
+        self._values = {value: int(value) for value, _ in choices}
+        self.max_score = len(self.questions) * max(self._values.values())
+        # Items where any answer above 0 needs follow-up whatever the total
+        self._risk_items = [f"q{position}" for position in risk_items]
+
+        # bands: [(lowest score, severity), ...] in ascending order
+        self._floors = [floor for floor, _ in bands]
+        self._bands = [Band(severity, *SEVERITY_TEXT[severity]) for _, severity in bands]
+
+    def score(self, answers):
+        """Total for a mapping of question id -> answer value; KeyError if incomplete or invalid."""
+        return sum(self._values[str(value)] for value in self._answers(answers))
+
+    def band(self, score):
+        return self._bands[bisect_right(self._floors, score) - 1]
+
+    def flags_risk(self, answers):
+        return any(self._values[str(answers[item])] > 0 for item in self._risk_items)
+
+
+REGISTRY = {instrument.key: instrument for instrument in [
+    Instrument(
+        'general', 'General Mental Health Check-in',
+        [
+            'Little interest or pleasure in doing things? (Mood)',
+            'Feeling nervous, anxious or on edge? (Anxiety)',
+            'Have you felt you ought to cut down on your drinking or drug use? (Habits)',
+            'Trouble falling or staying asleep, or sleeping too much? (Sleep)',
+        ],
+        FREQUENCY, [(0, 'minimal'), (6, 'moderate'), (12, 'severe')], 'general', 'chiromo-navy',
+    ),
+    Instrument(
+        'depression', 'Depression Screening (PHQ-9)',
+        [
+            'Little interest or pleasure in doing things',
+            'Feeling down, depressed, or hopeless',
+            'Trouble falling or staying asleep, or sleeping too much',
+            'Feeling tired or having little energy',
+            'Poor appetite or overeating',
+            'Feeling bad about yourself, or that you are a failure or have let yourself or your family down',
+            'Trouble concentrating on things, such as reading or watching television',
+            'Moving or speaking so slowly that other people could have noticed, or being so fidgety or restless that you have been moving around a lot more than usual',
+            'Thoughts that you would be better off dead, or of hurting yourself',
+        ],
+        FREQUENCY, [(0, 'minimal'), (5, 'mild'), (10, 'moderate'), (15, 'moderately_severe'), (20, 'severe')],
+        # Item 9 (self-harm) is a risk on its own, even with a low total
+        'clinical', 'purple', risk_items=(9,),
+    ),
+    Instrument(
+        'anxiety', 'Anxiety Screening (GAD-7)',
+        [
+            'Feeling nervous, anxious or on edge',
+            'Not being able to stop or control worrying',
+            'Worrying too much about different things',
+            'Trouble relaxing',
+            'Being so restless that it is hard to sit still',
+            'Becoming easily annoyed or irritable',
+            'Feeling afraid as if something awful might happen',
+        ],
+        FREQUENCY, [(0, 'minimal'), (5, 'mild'), (10, 'moderate'), (15, 'severe')], 'clinical', 'blue',
+    ),
+    Instrument(
+        'substance', 'Substance Use Screening (CAGE)',
+        [
+            'Have you ever felt you ought to cut down on your drinking or drug use?',
+            'Have people annoyed you by criticizing your drinking or drug use?',
+            'Have you ever felt bad or guilty about your drinking or drug use?',
+            'Have you ever used first thing in the morning to steady your nerves or get rid of a hangover?',
+        ],
+        # Two or more "yes" answers is clinically significant
+        YES_NO, [(0, 'minimal'), (1, 'mild'), (2, 'moderate'), (4, 'severe')], 'addiction', 'orange',
+    ),
+    Instrument(
+        'ptsd', 'PTSD Screening (PC-PTSD-5)',
+        [
+            'Have you had nightmares about the event or thought about it when you did not want to?',
+            'Tried hard not to think about the event or went out of your way to avoid situations that reminded you of it?',
+            'Were you constantly on guard, watchful, or easily startled?',
+            'Felt numb or detached from people, activities, or your surroundings?',
+            'Felt guilty or unable to stop blaming yourself or others for the event or any problems it may have caused?',
+        ],
+        # Three or more "yes" answers is a probable PTSD screen
+        YES_NO, [(0, 'minimal'), (1, 'mild'), (3, 'moderate'), (4, 'severe')], 'clinical', 'indigo',
+    ),
+    Instrument(
+        'bipolar', 'Bipolar Screening',
+        [
+            'Has there ever been a period where you felt so good/hyper that you got into trouble?',
+            'During this time, did you need less sleep than usual?',
+            'Were you more talkative or did you speak faster than usual?',
+            'Did you spend money purely on impulse?',
+            'Did you experience racing thoughts?',
+        ],
+        YES_NO, [(0, 'minimal'), (2, 'mild'), (3, 'moderate'), (4, 'severe')], 'clinical', 'pink',
+    ),
+]}
+
+DEFAULT_INSTRUMENT = 'general'
+
+
+def get_instrument(key):
+    # Unknown types (e.g. the hub's ADHD card) get the general check-in
+    return REGISTRY.get(key, REGISTRY[DEFAULT_INSTRUMENT])
+
+
+# ---------------------------------------------
+# SCORING AND PERSISTENCE
+# ---------------------------------------------
+def score_many(key, submissions):
+    """[(score, band, risk flagged), ...] for a list of answer mappings to one instrument."""
+    instrument = REGISTRY[key]
+    scored = []
+    for answers in submissions:
+        score = instrument.score(answers)
+        scored.append((score, instrument.band(score), instrument.flags_risk(answers)))
+    return scored
+
+
+def save_results(submissions, batch_size=500):
+    """
+    Scores and stores [(patient_id, instrument key, answers), ...] with
+    bulk INSERTs. Patients with a flagged risk item are marked high risk
+    for their therapists. Returns the created AssessmentResult rows.
+    """
+    rows = []
+    for patient_id, key, answers in submissions:
+        instrument = REGISTRY[key]
+        score = instrument.score(answers)
+        rows.append(AssessmentResult(
+            patient_id=patient_id, test_type=key, score=score, severity=instrument.band(score).severity,
+            risk_flag=instrument.flags_risk(answers),
+        ))
+
+    with transaction.atomic():
+        AssessmentResult.objects.bulk_create(rows, batch_size=batch_size)
+        at_risk = {row.patient_id for row in rows if row.risk_flag and row.patient_id}
+        if at_risk:
+            User.objects.filter(id__in=at_risk, is_high_risk=False).update(is_high_risk=True)
+        # bulk_create skips post_save, so refresh the trend series here
+        patient_ids = {row.patient_id for row in rows if row.patient_id}
+
+        def refresh():
+            for patient_id in patient_ids:
+                analytics.bump(patient_id)
+        transaction.on_commit(refresh)
+    return rows
+
+
+# ---------------------------------------------
+# RE-SCORING
+# Stored severities go stale when band floors change. Scores themselves
+# do not, so re-banding needs only (id, test_type, score) per row.
+# ---------------------------------------------
+def reband_chunk(after_id=0, chunk_size=5000):
+    """
+    Re-bands the next `chunk_size` results after `after_id` in id order.
+    Returns (last id seen or None when done, rows read, rows changed, patient ids changed).
+    """
+    rows = list(AssessmentResult.objects.filter(id__gt=after_id).order_by('id').values_list(
+        'id', 'patient_id', 'test_type', 'score', 'severity'
+    )[:chunk_size])
+    if not rows:
+        return None, 0, 0, set()
+
+    # Changed ids grouped by their new severity: at most one UPDATE per band,
+    # instead of bulk_update's per-row CASE
+    changed, patient_ids = {}, set()
+    for result_id, patient_id, test_type, score, severity in rows:
+        instrument = REGISTRY.get(test_type)
+        if instrument is None:
+            continue
+        current = instrument.band(score).severity
+        if current != severity:
+            changed.setdefault(current, []).append(result_id)
+            patient_ids.add(patient_id)
+
+    for severity, result_ids in changed.items():
+        AssessmentResult.objects.filter(id__in=result_ids).update(severity=severity)
+    return rows[-1][0], len(rows), sum(map(len, changed.values())), patient_ids
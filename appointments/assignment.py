@@ -0,0 +1,103 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from accounts.models import User
+from .models import Appointment
+from .availability import ACTIVE_STATUSES, day_value
+
+
+# Intake services and the words that mark a matching Specialization name
+SERVICE_KEYWORDS = {
+    'depression': ['depression', 'mood', 'clinical'],
+    'anxiety': ['anxiety', 'stress', 'clinical'],
+    'addiction': ['addiction', 'substance', 'rehab'],
+}
+
+POOL_KEY = 'assignment:pools'
+
+
+# ---------------------------------------------
+# THERAPIST POOLS
+# The ids of active therapists per service, cached until a therapist's
+# profile changes (accounts.signals drops the key).
+# ---------------------------------------------
+def _build_pools():
+    therapists = list(User.objects.filter(role='therapist', is_active=True).values_list(
+        'id', 'specialization__name'
+    ).order_by('id'))
+    pools = {'': [therapist_id for therapist_id, _ in therapists]}
+    for service, keywords in SERVICE_KEYWORDS.items():
+        pools[service] = [
+            therapist_id for therapist_id, name in therapists
+            if name and any(keyword in name.lower() for keyword in keywords)
+        ]
+    return pools
+
+
+def pool(service=None):
+    pools = cache.get(POOL_KEY)
+    if pools is None:
+        pools = _build_pools()
+        cache.set(POOL_KEY, pools, settings.ASSIGNMENT_CACHE_SECONDS)
+    # With nobody specialised in the service, anyone can take it
+    return pools.get(service or '') or pools['']
+
+
+def invalidate_pools():
+    cache.delete(POOL_KEY)
+
+
+# ---------------------------------------------
+# DAILY LOAD COUNTERS
+# Live bookings per therapist per day, recounted from the database by
+# appointments.signals after each write commits. Never adjusted in place:
+# the recount is the only writer, so a counter cannot drift from the rows.
+# ---------------------------------------------
+def load_key(therapist_id, day):
+    return f"assignment:load:{therapist_id}:{day.isoformat()}"
+
+
+def _count_loads(therapist_ids, day):
+    loads = dict.fromkeys(therapist_ids, 0)
+    rows = Appointment.objects.filter(
+        therapist_id__in=therapist_ids, date=day, status__in=ACTIVE_STATUSES
+    ).values_list('therapist_id').annotate(n=Count('id')).order_by()
+    loads.update(rows)
+    cache.set_many({load_key(therapist_id, day): n for therapist_id, n in loads.items()},
+                   settings.ASSIGNMENT_CACHE_SECONDS)
+    return loads
+
+
+def daily_loads(therapist_ids, day):
+    """Returns {therapist_id: live bookings on day}; cache misses are counted together."""
+    day = day_value(day)
+    keys = {load_key(therapist_id, day): therapist_id for therapist_id in therapist_ids}
+    cached = cache.get_many(keys)
+    loads = {keys[key]: n for key, n in cached.items()}
+
+    missing = [therapist_id for key, therapist_id in keys.items() if key not in cached]
+    if missing:
+        loads.update(_count_loads(missing, day))
+    return loads
+
+
+def refresh_load(therapist_id, day):
+    if therapist_id and day:
+        _count_loads([therapist_id], day_value(day))
+
+
+def refresh_appointments(appointment_ids):
+    # For set-based UPDATEs, which never fire post_save
+    pairs = set(Appointment.objects.filter(id__in=appointment_ids).values_list('therapist_id', 'date'))
+    for therapist_id, day in pairs:
+        _count_loads([therapist_id], day)
+
+
+# ---------------------------------------------
+# ROUTING
+# ---------------------------------------------
+def rank(service, day):
+    """Therapist ids for a service on a day, least loaded first (ties by id)."""
+    loads = daily_loads(pool(service), day)
+    return sorted(loads, key=lambda therapist_id: (loads[therapist_id], therapist_id))
+
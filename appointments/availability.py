@@ -0,0 +1,133 @@
+from datetime import date, datetime, timedelta
+import pytz
+from django.conf import settings
+from django.core.cache import cache
+from .models import Appointment
+
+
+NAIROBI_TZ = pytz.timezone('Africa/Nairobi')
+
+# Standardized 8am - 4pm sessions. A slot's position in this list is its
+# bit in a therapist's daily bitmap.
+SESSION_SLOTS = [
+    ('08:00', '08:00 AM - 09:00 AM'),
+    ('09:15', '09:15 AM - 10:15 AM'),
+    ('10:30', '10:30 AM - 11:30 AM'),
+    ('11:45', '11:45 AM - 12:45 PM'),
+    ('14:00', '02:00 PM - 03:00 PM'),
+    ('15:15', '03:15 PM - 04:15 PM'),
+]
+SLOT_LABELS = dict(SESSION_SLOTS)
+SLOT_BITS = {value: 1 << position for position, (value, _) in enumerate(SESSION_SLOTS)}
+
+ACTIVE_STATUSES = ('pending', 'confirmed')
+MAX_DAYS = 31
+
+
+def slot_value(value):
+    # Saved instances may still hold the form's 'HH:MM' string
+    return value.strftime('%H:%M') if hasattr(value, 'strftime') else str(value)[:5]
+
+
+def day_value(value):
+    return value if isinstance(value, date) else datetime.strptime(str(value), '%Y-%m-%d').date()
+
+
+def cache_key(therapist_id, day):
+    return f"availability:{therapist_id}:{day.isoformat()}"
+
+
+def local_now():
+    return datetime.now(NAIROBI_TZ)
+
+
+def slots_after(current_time):
+    """Session slots still ahead of an 'HH:MM' time today."""
+    return [(value, label) for value, label in SESSION_SLOTS if value > current_time]
+
+
+# ---------------------------------------------
+# BITMAPS
+# A set bit means the slot is held by a pending or confirmed appointment.
+# Times outside SESSION_SLOTS (e.g. USSD bookings) never block a slot.
+# ---------------------------------------------
+def _load_bitmaps(pairs):
+    """Builds and caches the bitmaps for (therapist_id, day) pairs in one query."""
+    bitmaps = dict.fromkeys(pairs, 0)
+    rows = Appointment.objects.filter(
+        therapist_id__in={therapist_id for therapist_id, _ in bitmaps},
+        date__in={day for _, day in bitmaps},
+        status__in=ACTIVE_STATUSES,
+    ).values_list('therapist_id', 'date', 'time')
+
+    for therapist_id, day, slot in rows:
+        if (therapist_id, day) in bitmaps:
+            bitmaps[(therapist_id, day)] |= SLOT_BITS.get(slot_value(slot), 0)
+
+    cache.set_many(
+        {cache_key(*pair): bits for pair, bits in bitmaps.items()},
+        settings.AVAILABILITY_CACHE_SECONDS
+    )
+    return bitmaps
+
+
+def booked_bitmaps(therapist_ids, days):
+    """Returns {(therapist_id, day): bitmap}; cache misses are filled together."""
+    keys = {cache_key(therapist_id, day): (therapist_id, day) for therapist_id in therapist_ids for day in days}
+    bitmaps = {keys[key]: bits for key, bits in cache.get_many(list(keys)).items()}
+
+    missing = [pair for pair in keys.values() if pair not in bitmaps]
+    if missing:
+        bitmaps.update(_load_bitmaps(missing))
+    return bitmaps
+
+
+def refresh_day(therapist_id, day):
+    if therapist_id and day:
+        _load_bitmaps([(therapist_id, day_value(day))])
+
+
+def refresh_appointments(appointment_ids):
+    # For set-based UPDATEs, which never fire post_save
+    pairs = set(Appointment.objects.filter(id__in=appointment_ids).values_list('therapist_id', 'date'))
+    if pairs:
+        _load_bitmaps(pairs)
+
+
+# ---------------------------------------------
+# LOOKUPS
+# ---------------------------------------------
+def is_slot_open(therapist_id, day, slot):
+    bit = SLOT_BITS.get(slot_value(slot), 0)
+    bits = booked_bitmaps([therapist_id], [day_value(day)])[(therapist_id, day_value(day))]
+    return not bits & bit
+
+
+def open_slots(therapist_ids, days):
+    """
+    Returns {therapist_id: {'YYYY-MM-DD': ['08:00', ...]}} for every
+    therapist and day, leaving out booked and already-started slots.
+    """
+    now = local_now()
+    today = now.date()
+    current_time = now.strftime('%H:%M')
+    bitmaps = booked_bitmaps(therapist_ids, days)
+
+    result = {}
+    for therapist_id in therapist_ids:
+        result[therapist_id] = {}
+        for day in days:
+            if day < today:
+                candidates = []
+            elif day == today:
+                candidates = slots_after(current_time)
+            else:
+                candidates = SESSION_SLOTS
+            bits = bitmaps[(therapist_id, day)]
+            result[therapist_id][day.isoformat()] = [value for value, _ in candidates if not bits & SLOT_BITS[value]]
+    return result
+
+
+def day_range(start, count):
+    count = max(1, min(count, MAX_DAYS))
+    return [start + timedelta(days=offset) for offset in range(count)]
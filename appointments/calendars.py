@@ -0,0 +1,115 @@
+import calendar
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from functools import lru_cache
+from django.utils import timezone
+from .models import Appointment
+
+
+# Longest range a feed returns in one call
+MAX_FEED_MONTHS = 12
+SESSION_LENGTH = timedelta(hours=1)
+ICS_STATUS = {'pending': 'TENTATIVE', 'confirmed': 'CONFIRMED', 'completed': 'CONFIRMED', 'cancelled': 'CANCELLED'}
+
+FIELDS = ('id', 'date', 'time', 'status', 'mode', 'therapist__last_name', 'therapist__username',
+          'patient__first_name', 'patient__username')
+
+
+# ---------------------------------------------
+# MONTH GRIDS
+# The weeks of a month never change, so each (year, month) is laid out
+# once per process. Weeks start on Sunday, with 0 for padding days.
+# ---------------------------------------------
+@lru_cache(maxsize=240)
+def month_grid(year, month):
+    return tuple(tuple(week) for week in calendar.Calendar(firstweekday=6).monthdayscalendar(year, month))
+
+
+def shift_month(year, month, offset):
+    index = year * 12 + month - 1 + offset
+    return index // 12, index % 12 + 1
+
+
+def month_span(year, month, months=1):
+    """First day of the month and first day after the last month in the span."""
+    end_year, end_month = shift_month(year, month, months)
+    return date(year, month, 1), date(end_year, end_month, 1)
+
+
+# ---------------------------------------------
+# DAY SUMMARIES
+# ---------------------------------------------
+def owner_filter(user):
+    # Therapists see the sessions they run, everyone else their bookings
+    return {'therapist': user} if user.role == 'therapist' else {'patient': user}
+
+
+def sessions(owner, start, end):
+    """Appointment rows in [start, end) as dicts, in one query joined to both users."""
+    return Appointment.objects.filter(date__gte=start, date__lt=end, **owner).order_by(
+        'date', 'time', 'id'
+    ).values(*FIELDS)
+
+
+def summarize(rows, counterpart='therapist'):
+    """{date: {count, by_status, earliest, names, sessions}} from rows ordered by date and time."""
+    days = {}
+    for row in rows:
+        summary = days.setdefault(row['date'], {
+            'count': 0, 'by_status': {}, 'earliest': row['time'], 'names': [], 'sessions': [],
+        })
+        if counterpart == 'therapist':
+            name = f"Dr. {row['therapist__last_name'] or row['therapist__username']}"
+        else:
+            name = row['patient__first_name'] or row['patient__username']
+
+        summary['count'] += 1
+        summary['by_status'][row['status']] = summary['by_status'].get(row['status'], 0) + 1
+        if name not in summary['names']:
+            summary['names'].append(name)
+        summary['sessions'].append({'id': row['id'], 'time': row['time'], 'status': row['status'],
+                                    'mode': row['mode'], 'with': name})
+    return days
+
+
+def month_weeks(year, month, days):
+    """The month grid with each day paired to its summary (or None)."""
+    return [
+        [(day, days.get(date(year, month, day)) if day else None) for day in week]
+        for week in month_grid(year, month)
+    ]
+
+
+# ---------------------------------------------
+# FEEDS
+# ---------------------------------------------
+def _ics_text(value):
+    return str(value).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def _ics_time(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def ics_feed(rows, name, counterpart='therapist'):
+    """An iCalendar document with one event per appointment row."""
+    stamp = _ics_time(timezone.now())
+    lines = [
+        'BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//CMHS//Appointments//EN', 'CALSCALE:GREGORIAN',
+        f"X-WR-CALNAME:{_ics_text(name)}",
+    ]
+    for day, summary in summarize(rows, counterpart).items():
+        for session in summary['sessions']:
+            start = timezone.make_aware(datetime.combine(day, session['time']))
+            lines += [
+                'BEGIN:VEVENT',
+                f"UID:appointment-{session['id']}@cmhs",
+                f"DTSTAMP:{stamp}",
+                f"DTSTART:{_ics_time(start)}",
+                f"DTEND:{_ics_time(start + SESSION_LENGTH)}",
+                f"SUMMARY:{_ics_text('Session with ' + session['with'])}",
+                f"DESCRIPTION:{_ics_text(session['mode'].title() + ' session')}",
+                f"STATUS:{ICS_STATUS.get(session['status'], 'TENTATIVE')}",
+                'END:VEVENT',
+            ]
+    lines.append('END:VCALENDAR')
+    return '\r\n'.join(lines) + '\r\n'
@@ -0,0 +1,184 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, Max, OuterRef, Q, Subquery, Sum, When, Window
+from django.db.models.functions import Coalesce, Greatest, RowNumber
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from cmhsApp.pagination import paginate
+from .models import Message, UnreadCounter
+
+
+DELETED_BODY = "This message was deleted"
+SUMMARY_PAGE_SIZE = 20
+HISTORY_PAGE_SIZE = 50
+PREVIEW_LENGTH = 60
+
+
+def conversation(user_id, partner_id):
+    # Both directions of a two-person thread
+    return Message.objects.filter(
+        Q(sender_id=user_id, recipient_id=partner_id) |
+        Q(sender_id=partner_id, recipient_id=user_id)
+    )
+
+
+def latest_change(user_id, partner_id):
+    """
+    Timestamp of the most recent create/edit/delete in the thread.
+    Used as both the sync cursor and the ETag seed.
+    """
+    return conversation(user_id, partner_id).aggregate(latest=Max('updated_at'))['latest']
+
+
+def conversation_etag(user_id, partner_id, latest):
+    stamp = latest.timestamp() if latest else 0
+    return f'W/"chat-{user_id}-{partner_id}-{stamp}"'
+
+
+def parse_cursor(value):
+    # Cursors are ISO timestamps handed out by serialize_cursor()
+    if not value:
+        return None
+    try:
+        return parse_datetime(value)
+    except ValueError:
+        return None
+
+
+def serialize_cursor(latest):
+    return latest.isoformat() if latest else None
+
+
+def history_page(user_id, partner_id, before=None):
+    # Newest HISTORY_PAGE_SIZE messages, or the ones older than `before`
+    messages = conversation(user_id, partner_id).only('id', 'sender_id', 'body', 'timestamp')
+    return paginate(messages, ('-timestamp', '-id'), before, HISTORY_PAGE_SIZE, param='before')
+
+
+def changed_since(user_id, partner_id, since=None):
+    messages = conversation(user_id, partner_id).only('id', 'sender_id', 'body', 'timestamp')
+    if since is not None:
+        # >= so rows sharing the cursor's timestamp are never skipped; the client merges by id
+        messages = messages.filter(updated_at__gte=since)
+    return messages.order_by('timestamp', 'id')
+
+
+def serialize_message(msg, viewer_id):
+    is_owner = (msg.sender_id == viewer_id)
+    is_deleted = (msg.body == DELETED_BODY)
+
+    return {
+        'id': msg.id,
+        'sender': 'me' if is_owner else 'partner',
+        'body': msg.body,
+        'timestamp': timezone.localtime(msg.timestamp).strftime("%H:%M"),
+        'can_edit': is_owner and not is_deleted,
+        'can_delete': is_owner and not is_deleted,
+        'is_deleted': is_deleted
+    }
+
+
+# ---------------------------------------------
+# CONVERSATION LIST
+# ---------------------------------------------
+def conversation_summaries(user_id, cursor=None, limit=SUMMARY_PAGE_SIZE):
+    """
+    One row per chat partner - their latest message, its time and the
+    unread count - newest first, in a single statement. ROW_NUMBER() picks
+    each thread's latest message; the keyset cursor is applied after that
+    pick. Returns (summaries, next_cursor).
+    """
+    partner = Case(When(sender_id=user_id, then=F('recipient_id')), default=F('sender_id'))
+
+    latest_ids = Message.objects.filter(Q(sender_id=user_id) | Q(recipient_id=user_id)).annotate(
+        position=Window(RowNumber(), partition_by=[partner], order_by=[F('timestamp').desc(), F('id').desc()])
+    ).filter(position=1).values('id')
+
+    rows = Message.objects.filter(id__in=latest_ids).annotate(
+        partner_id=partner,
+        partner_username=Case(
+            When(sender_id=user_id, then=F('recipient__username')), default=F('sender__username')
+        ),
+        unread=Coalesce(Subquery(
+            UnreadCounter.objects.filter(recipient_id=user_id, sender_id=OuterRef('partner_id')).values('count')[:1]
+        ), 0),
+    ).values('id', 'sender_id', 'body', 'timestamp', 'partner_id', 'partner_username', 'unread')
+
+    page = paginate(rows, ('-timestamp', '-id'), cursor, limit, param='before')
+    return [serialize_summary(row, user_id) for row in page], page.next_cursor
+
+
+def serialize_summary(row, viewer_id):
+    body = row['body']
+    return {
+        'id': row['partner_id'],
+        'username': row['partner_username'],
+        'last_message': body if len(body) <= PREVIEW_LENGTH else body[:PREVIEW_LENGTH - 1] + '…',
+        'last_from_me': row['sender_id'] == viewer_id,
+        'timestamp': row['timestamp'],
+        'unread': row['unread'],
+    }
+
+# ---------------------------------------------
+# UNREAD COUNTERS
+# Every write that changes Message.is_read adjusts UnreadCounter in the
+# same transaction, with F() so concurrent writers never lose an update.
+# ---------------------------------------------
+def send_message(sender_id, recipient_id, body):
+    with transaction.atomic(savepoint=False):
+        msg = Message.objects.create(sender_id=sender_id, recipient_id=recipient_id, body=body)
+        _bump_unread(recipient_id, sender_id)
+    return msg
+
+
+def _bump_unread(recipient_id, sender_id):
+    counter = UnreadCounter.objects.filter(recipient_id=recipient_id, sender_id=sender_id)
+    if counter.update(count=F('count') + 1):
+        return
+    try:
+        # First message of the pair; a concurrent first message may win the insert
+        with transaction.atomic():
+            UnreadCounter.objects.create(recipient_id=recipient_id, sender_id=sender_id, count=1)
+    except IntegrityError:
+        counter.update(count=F('count') + 1)
+
+
+def mark_read(recipient_id, sender_id):
+    """Marks the sender's messages read and returns how many flipped."""
+    with transaction.atomic(savepoint=False):
+        marked = Message.objects.filter(sender_id=sender_id, recipient_id=recipient_id, is_read=False).update(is_read=True)
+        if marked:
+            UnreadCounter.objects.filter(recipient_id=recipient_id, sender_id=sender_id).update(
+                count=Greatest(F('count') - marked, 0)
+            )
+    return marked
+
+
+def unread_total(user_id):
+    return UnreadCounter.objects.filter(recipient_id=user_id).aggregate(total=Sum('count'))['total'] or 0
+
+
+def unread_by_sender(user_id):
+    return dict(UnreadCounter.objects.filter(recipient_id=user_id, count__gt=0).values_list('sender_id', 'count'))
+
+
+def repair_unread_counters(batch_size=1000):
+    """
+    Recounts unread messages and corrects counters that drifted (e.g. after
+    messages were deleted outside the chat views). Returns (fixed, created).
+    """
+    actual = {
+        (recipient, sender): n for recipient, sender, n in
+        Message.objects.filter(is_read=False).values_list('recipient_id', 'sender_id').annotate(n=Count('id')).order_by()
+    }
+
+    drifted = []
+    for counter in UnreadCounter.objects.iterator(chunk_size=batch_size):
+        expected = actual.pop((counter.recipient_id, counter.sender_id), 0)
+        if counter.count != expected:
+            counter.count = expected
+            drifted.append(counter)
+    UnreadCounter.objects.bulk_update(drifted, ['count'], batch_size=batch_size)
+
+    missing = [UnreadCounter(recipient_id=recipient, sender_id=sender, count=n) for (recipient, sender), n in actual.items()]
+    UnreadCounter.objects.bulk_create(missing, batch_size=batch_size, ignore_conflicts=True)
+    return len(drifted), len(missing)
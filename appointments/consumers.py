@@ -0,0 +1,99 @@
+import asyncio
+import json
+from http.cookies import SimpleCookie
+from importlib import import_module
+from types import SimpleNamespace
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.db import close_old_connections
+from accounts import dashboards
+from . import chat
+from .realtime import get_broker, user_channel
+
+
+def _session_user(session_key):
+    close_old_connections()
+    try:
+        engine = import_module(settings.SESSION_ENGINE)
+        session = engine.SessionStore(session_key)
+        # get_user() only needs request.session to resolve and verify the login
+        return get_user(SimpleNamespace(session=session))
+    finally:
+        close_old_connections()
+
+
+async def get_scope_user(scope):
+    cookie = SimpleCookie()
+    for name, value in scope.get('headers', []):
+        if name == b'cookie':
+            cookie.load(value.decode('latin-1'))
+
+    morsel = cookie.get(settings.SESSION_COOKIE_NAME)
+    if morsel is None:
+        return None
+
+    user = await sync_to_async(_session_user, thread_sensitive=True)(morsel.value)
+    return user if user.is_authenticated else None
+
+
+def open_partner(scope):
+    # The inbox opens its socket with ?partner=<id> for the conversation on screen
+    values = parse_qs(scope.get('query_string', b'').decode('latin-1')).get('partner')
+    try:
+        return int(values[0]) if values else None
+    except ValueError:
+        return None
+
+
+def _mark_read(user_id, partner_id):
+    close_old_connections()
+    try:
+        if chat.mark_read(user_id, partner_id):
+            dashboards.invalidate(user_id)
+    finally:
+        close_old_connections()
+
+
+async def chat_socket(scope, receive, send):
+    """
+    Push channel for the inbox. Streams message create/edit/delete events
+    for the logged-in user; the inbox keeps a slow poll as a safety net.
+    """
+    event = await receive()
+    if event['type'] != 'websocket.connect':
+        return
+
+    user = await get_scope_user(scope)
+    if user is None:
+        await send({'type': 'websocket.close', 'code': 4401})
+        return
+
+    await send({'type': 'websocket.accept'})
+    partner_id = open_partner(scope)
+    subscription = get_broker().subscribe(user_channel(user.id))
+
+    async def read_until_disconnect():
+        while True:
+            incoming = await receive()
+            if incoming['type'] == 'websocket.disconnect':
+                return
+
+    async def forward_events():
+        while True:
+            payload = await subscription.get()
+            if (payload['event'] == 'message.created' and payload['partner_id'] == partner_id
+                    and payload['message']['sender'] == 'partner'):
+                # Shown in the open conversation, so read - as the next poll would mark it
+                await sync_to_async(_mark_read, thread_sensitive=True)(user.id, partner_id)
+            await send({'type': 'websocket.send', 'text': json.dumps(payload)})
+
+    reader = asyncio.ensure_future(read_until_disconnect())
+    writer = asyncio.ensure_future(forward_events())
+    try:
+        await asyncio.wait({reader, writer}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        subscription.close()
+        for task in (reader, writer):
+            task.cancel()
@@ -1,25 +1,16 @@
 from django import forms
 from .models import Appointment, SessionLog
+from . import assessments, availability
 from django.contrib.auth import get_user_model
+from django.urls import reverse
 from django.utils import timezone
-from datetime import datetime
-import pytz
 
 
 User = get_user_model()
 
 
 class BookingForm(forms.ModelForm):
-    # Standardized 8am - 4pm sessions
-    TIME_SLOTS = [
-        ('', '--- Select a Session ---'),
-        ('08:00', '08:00 AM - 09:00 AM'),
-        ('09:15', '09:15 AM - 10:15 AM'),
-        ('10:30', '10:30 AM - 11:30 AM'),
-        ('11:45', '11:45 AM - 12:45 PM'),
-        ('14:00', '02:00 PM - 03:00 PM'),
-        ('15:15', '03:15 PM - 04:15 PM'),
-    ]
+    TIME_SLOTS = [('', '--- Select a Session ---')] + availability.SESSION_SLOTS
 
     time = forms.ChoiceField(
         choices=TIME_SLOTS,
@@ -54,7 +45,7 @@ class BookingForm(forms.ModelForm):
         super(BookingForm, self).__init__(*args, **kwargs)
 
         # 1. Filter and Label Therapists with Specialization
-        self.fields['therapist'].queryset = User.objects.filter(role='therapist')
+        self.fields['therapist'].queryset = User.objects.filter(role='therapist').select_related('specialization')
         self.fields['therapist'].label_from_instance = lambda obj: (
             f"Dr. {obj.last_name} {obj.first_name} — ({obj.specialization.name})"
             if obj.last_name and obj.specialization
@@ -64,31 +55,24 @@ class BookingForm(forms.ModelForm):
 
 
         # 2. Get Current Nairobi Time
-        nairobi_tz = pytz.timezone('Africa/Nairobi')
-        now_nairobi = datetime.now(nairobi_tz)
+        now_nairobi = availability.local_now()
         today = now_nairobi.date()
 
         # Set min date in the picker to today
         self.fields['date'].widget.attrs['min'] = today.strftime('%Y-%m-%d')
+        # Booked slots are hidden client-side from this feed
+        self.fields['time'].widget.attrs['data-availability-url'] = reverse('therapist_availability')
 
 
         date_val = self.data.get('date') or self.initial.get('date')
 
         if date_val:
             try:
-                # Convert string date to object
-                if isinstance(date_val, str):
-                    selected_date = datetime.strptime(date_val, '%Y-%m-%d').date()
-                else:
-                    selected_date = date_val
+                selected_date = availability.day_value(date_val)
 
                 if selected_date == today:
-                    current_time_str = now_nairobi.strftime('%H:%M')
                     # Only keep slots that are in the future
-                    valid_slots = [('', '--- Select a Session ---')]
-                    for val, label in self.TIME_SLOTS[1:]:
-                        if val > current_time_str:
-                            valid_slots.append((val, label))
+                    valid_slots = [self.TIME_SLOTS[0]] + availability.slots_after(now_nairobi.strftime('%H:%M'))
 
                     self.fields['time'].choices = valid_slots
 
@@ -112,33 +96,20 @@ class SessionLogForm(forms.ModelForm):
             })
         }
 
-CHOICES_FREQ = [
-    ('0', 'Not at all'),
-    ('1', 'Several days'),
-    ('2', 'More than half the days'),
-    ('3', 'Nearly every day'),
-]
-
 TAILWIND_RADIO = forms.RadioSelect(attrs={'class': 'peer sr-only'})
 
-class DepressionAssessmentForm(forms.Form):
-    q1 = forms.ChoiceField(label="1. Little interest or pleasure in doing things?", choices=CHOICES_FREQ, widget=TAILWIND_RADIO)
-    q2 = forms.ChoiceField(label="2. Feeling down, depressed, or hopeless?", choices=CHOICES_FREQ, widget=TAILWIND_RADIO)
-    q3 = forms.ChoiceField(label="3. Trouble falling or staying asleep, or sleeping too much?", choices=CHOICES_FREQ, widget=TAILWIND_RADIO)
-    q4 = forms.ChoiceField(label="4. Feeling tired or having little energy?", choices=CHOICES_FREQ, widget=TAILWIND_RADIO)
-    q5 = forms.ChoiceField(label="5. Poor appetite or overeating?", choices=CHOICES_FREQ, widget=TAILWIND_RADIO)
-
-class AnxietyAssessmentForm(forms.Form):
-    q1 = forms.ChoiceField(label="1. Feeling nervous, anxious, or on edge?", choices=CHOICES_FREQ, widget=TAILWIND_RADIO)
-    q2 = forms.ChoiceField(label="2. Not being able to stop or control worrying?", choices=CHOICES_FREQ, widget=TAILWIND_RADIO)
-    q3 = forms.ChoiceField(label="3. Worrying too much about different things?", choices=CHOICES_FREQ, widget=TAILWIND_RADIO)
-    q4 = forms.ChoiceField(label="4. Trouble relaxing?", choices=CHOICES_FREQ, widget=TAILWIND_RADIO)
-    q5 = forms.ChoiceField(label="5. Being so restless that it is hard to sit still?", choices=CHOICES_FREQ, widget=TAILWIND_RADIO)
-
-class BipolarAssessmentForm(forms.Form):
-    CHOICES_YESNO = [('0', 'No'), ('1', 'Yes')]
-    q1 = forms.ChoiceField(label="1. Has there ever been a period where you felt so good/hyper that you got into trouble?", choices=CHOICES_YESNO, widget=TAILWIND_RADIO)
-    q2 = forms.ChoiceField(label="2. During this time, did you need less sleep than usual?", choices=CHOICES_YESNO, widget=TAILWIND_RADIO)
-    q3 = forms.ChoiceField(label="3. Were you more talkative or did you speak faster than usual?", choices=CHOICES_YESNO, widget=TAILWIND_RADIO)
-    q4 = forms.ChoiceField(label="4. Did you spend money purely on impulse?", choices=CHOICES_YESNO, widget=TAILWIND_RADIO)
-    q5 = forms.ChoiceField(label="5. Did you experience racing thoughts?", choices=CHOICES_YESNO, widget=TAILWIND_RADIO)
\ No newline at end of file
+
+def _assessment_form(instrument):
+    fields = {
+        question.id: forms.ChoiceField(label=question.label, choices=instrument.choices, widget=TAILWIND_RADIO)
+        for question in instrument.questions
+    }
+    return type(f"{instrument.key.title()}AssessmentForm", (forms.Form,), fields)
+
+
+# One form class per registered questionnaire, built once at import
+ASSESSMENT_FORMS = {key: _assessment_form(instrument) for key, instrument in assessments.REGISTRY.items()}
+
+DepressionAssessmentForm = ASSESSMENT_FORMS['depression']
+AnxietyAssessmentForm = ASSESSMENT_FORMS['anxiety']
+BipolarAssessmentForm = ASSESSMENT_FORMS['bipolar']
@@ -0,0 +1,156 @@
+import json
+import math
+import random
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+from urllib.request import urlopen
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+
+# ---------------------------------------------
+# SYNTHETIC SESSIONS
+# A session is the list of `text` values the gateway sends, one per hop,
+# e.g. ['', '1', '1*2', '1*2*3', ...]. Journeys are weighted roughly like
+# real traffic: mostly bookings, some account checks, a few mistakes.
+# ---------------------------------------------
+JOURNEYS = [
+    (70, lambda rng, n: ['1', str(rng.randint(1, 3)), str(rng.randint(1, 3)), str(rng.randint(1, 3)), f"Caller {n}"]),
+    (15, lambda rng, n: ['3']),
+    (10, lambda rng, n: ['2', 'Westlands']),
+    (5, lambda rng, n: ['1', '9']),
+]
+
+
+def synthetic_sessions(count, seed=0):
+    rng = random.Random(seed)
+    weights = [weight for weight, _ in JOURNEYS]
+    run = uuid.uuid4().hex[:8]
+    sessions = []
+    for n in range(count):
+        answers = rng.choices([journey for _, journey in JOURNEYS], weights)[0](rng, n)
+        texts = [''] + ['*'.join(answers[:hop]) for hop in range(1, len(answers) + 1)]
+        # Synthetic +2549... numbers cannot collide with real callers
+        sessions.append((f"bench-{run}-{n}", f"+2549{n:08d}", texts))
+    return sessions
+
+
+# ---------------------------------------------
+# RUNNERS
+# Both return [(hop number, seconds, queries or None), ...].
+# ---------------------------------------------
+def run_in_process(sessions, interleave=50):
+    """
+    Drives ussd_callback through the test client, `interleave` sessions at
+    a time, hop by hop, so session state is read back the way it would be
+    under concurrent callers. Queries are counted per hop.
+    """
+    client = Client()
+    url = reverse('ussd_callback')
+    samples = []
+    pending = list(reversed(sessions))
+    active = []
+
+    while pending or active:
+        while pending and len(active) < interleave:
+            active.append([*pending.pop(), 0])
+        for session in list(active):
+            session_id, phone, texts, hop = session
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                body = client.post(url, {'sessionId': session_id, 'phoneNumber': phone, 'text': texts[hop]}).content
+                elapsed = time.perf_counter() - started
+            samples.append((hop + 1, elapsed, len(queries)))
+
+            session[3] += 1
+            if session[3] == len(texts) or body.startswith(b'END'):
+                active.remove(session)
+    return samples
+
+
+def run_against_url(sessions, url, concurrency=20, timeout=10):
+    """Replays sessions against a running server (e.g. gunicorn), one thread per live session."""
+    def play(session):
+        session_id, phone, texts = session
+        timings = []
+        for hop, text in enumerate(texts, 1):
+            data = urlencode({'sessionId': session_id, 'phoneNumber': phone, 'text': text}).encode()
+            started = time.perf_counter()
+            with urlopen(url, data, timeout=timeout) as response:
+                body = response.read()
+            timings.append((hop, time.perf_counter() - started, None))
+            if body.startswith(b'END'):
+                break
+        return timings
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        return [sample for timings in pool.map(play, sessions) for sample in timings]
+
+
+# ---------------------------------------------
+# REPORT
+# ---------------------------------------------
+def percentile(values, pct):
+    # Nearest-rank on sorted values
+    return values[max(math.ceil(pct / 100 * len(values)) - 1, 0)]
+
+
+def summarize(samples, sessions, elapsed):
+    by_hop = defaultdict(list)
+    for hop, seconds, queries in samples:
+        by_hop[hop].append((seconds, queries))
+        by_hop['all'].append((seconds, queries))
+
+    hops = {}
+    for hop, rows in by_hop.items():
+        latencies = sorted(seconds * 1000 for seconds, _ in rows)
+        counts = [queries for _, queries in rows if queries is not None]
+        hops[str(hop)] = {
+            'requests': len(rows),
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'queries_avg': round(sum(counts) / len(counts), 2) if counts else None,
+            'queries_max': max(counts) if counts else None,
+        }
+    return {
+        'sessions': sessions,
+        'requests': len(samples),
+        'seconds': round(elapsed, 2),
+        'sessions_per_second': round(sessions / elapsed, 1) if elapsed else None,
+        'hops': dict(sorted(hops.items(), key=lambda item: (item[0] == 'all', item[0]))),
+    }
+
+
+def compare(report, baseline, tolerance):
+    """Returns regressions against a baseline report as readable lines."""
+    problems = []
+    for hop, stats in report['hops'].items():
+        before = baseline['hops'].get(hop)
+        if not before:
+            continue
+        if stats['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            problems.append(f"hop {hop}: p95 {stats['p95_ms']}ms vs baseline {before['p95_ms']}ms")
+        if stats['queries_max'] is not None and before['queries_max'] is not None \
+                and stats['queries_max'] > before['queries_max']:
+            problems.append(f"hop {hop}: up to {stats['queries_max']} queries vs baseline {before['queries_max']}")
+    return problems
+
+
+def load_baseline(path):
+    try:
+        with open(path) as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(path, report):
+    with open(path, 'w') as handle:
+        json.dump(report, handle, indent=2)
+        handle.write('\n')
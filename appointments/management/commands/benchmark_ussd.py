@@ -0,0 +1,94 @@
+import json
+import time
+from pathlib import Path
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from accounts.models import Specialization, User
+from appointments import loadtest
+
+
+BASELINE = Path(__file__).resolve().parents[2] / 'benchmarks' / 'ussd_baseline.json'
+STUB_PROVIDERS = {
+    'email': 'cmhsApp.notifications.StubProvider',
+    'sms': 'cmhsApp.notifications.StubProvider',
+}
+# Pools, load counters and versions from the throwaway database are keyed
+# by its ids, which collide with real ones; they must never reach the
+# shared cache the web process reads.
+BENCHMARK_CACHE = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmark-ussd'}
+
+
+class Command(BaseCommand):
+    help = "Replays synthetic multi-hop USSD sessions and reports per-hop latency, queries and sessions/second."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--concurrency', type=int, default=50,
+                            help="Sessions in flight: interleaved in-process, or client threads with --url.")
+        parser.add_argument('--therapists', type=int, default=12, help="Therapists seeded into the benchmark database.")
+        parser.add_argument('--url', help="Drive a running server's ussd_callback instead (its data is not cleaned up).")
+        parser.add_argument('--baseline', default=str(BASELINE))
+        parser.add_argument('--save-baseline', action='store_true', help="Store this run as the new baseline.")
+        parser.add_argument('--check', action='store_true', help="Exit with an error when the run regresses.")
+        parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed p95 slowdown (0.25 = 25%%).")
+        parser.add_argument('--keepdb', action='store_true', help="Reuse the benchmark database between runs.")
+
+    def handle(self, *args, **options):
+        sessions = loadtest.synthetic_sessions(options['sessions'], options['seed'])
+
+        if options['url']:
+            started = time.perf_counter()
+            samples = loadtest.run_against_url(sessions, options['url'], options['concurrency'])
+            elapsed = time.perf_counter() - started
+        else:
+            samples, elapsed = self.run_in_process(sessions, options)
+
+        report = loadtest.summarize(samples, len(sessions), elapsed)
+        report['mode'] = 'url' if options['url'] else f"in-process ({connection.vendor})"
+        self.stdout.write(json.dumps(report, indent=2))
+
+        baseline = loadtest.load_baseline(options['baseline'])
+        if options['save_baseline']:
+            loadtest.save_baseline(options['baseline'], report)
+            self.stdout.write(self.style.SUCCESS(f"Saved baseline to {options['baseline']}"))
+        elif baseline:
+            problems = loadtest.compare(report, baseline, options['tolerance'])
+            for problem in problems:
+                self.stdout.write(self.style.WARNING(f"Regression: {problem}"))
+            if problems and options['check']:
+                raise CommandError(f"{len(problems)} regression(s) against {options['baseline']}")
+            if not problems:
+                self.stdout.write(self.style.SUCCESS("No regressions against the baseline"))
+
+    def run_in_process(self, sessions, options):
+        # A throwaway test database, like the test runner's, so bookings never hit real data
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            with override_settings(NOTIFICATION_PROVIDERS=STUB_PROVIDERS,
+                                   CACHES={alias: BENCHMARK_CACHE for alias in settings.CACHES}):
+                try:
+                    self.seed_therapists(options['therapists'])
+                    started = time.perf_counter()
+                    samples = loadtest.run_in_process(sessions, options['concurrency'])
+                    return samples, time.perf_counter() - started
+                finally:
+                    for cache in caches.all():
+                        cache.clear()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+    def seed_therapists(self, count):
+        specializations = [
+            Specialization.objects.get_or_create(name=name)[0]
+            for name in ('Clinical Psychology', 'Anxiety & Stress', 'Addiction Counselling')
+        ]
+        for n in range(count):
+            User.objects.get_or_create(username=f'bench-therapist-{n}', defaults={
+                'role': 'therapist', 'specialization': specializations[n % len(specializations)],
+            })
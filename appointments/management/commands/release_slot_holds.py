@@ -0,0 +1,25 @@
+import time
+from django.core.management.base import BaseCommand
+from appointments import reservations
+from cmhsApp.workers import require_shared_cache
+
+
+class Command(BaseCommand):
+    help = "Frees slots held by bookings whose payment window has expired."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Release what has expired and exit instead of polling.")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--interval', type=float, default=30.0, help="Seconds to sleep when nothing has expired.")
+
+    def handle(self, *args, **options):
+        require_shared_cache()
+        while True:
+            released = reservations.release_expired_holds(options['batch_size'])
+            if released:
+                self.stdout.write(f"Released {released} expired slot hold(s)")
+                continue
+
+            if options['once']:
+                return
+            time.sleep(options['interval'])
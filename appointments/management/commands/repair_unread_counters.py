@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from appointments import chat
+
+
+class Command(BaseCommand):
+    help = "Recounts unread messages and corrects drifted unread counters."
+
+    def handle(self, *args, **options):
+        fixed, created = chat.repair_unread_counters()
+        self.stdout.write(self.style.SUCCESS(f"Corrected {fixed} counter(s), created {created}"))
@@ -0,0 +1,51 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from appointments import analytics, assessments
+
+
+class Command(BaseCommand):
+    help = "Re-bands stored assessment results with the current severity thresholds, resuming from --after-id."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--after-id', type=int, default=0,
+                            help="Only look at results with a higher id, e.g. the last id an interrupted run reported.")
+        parser.add_argument('--dry-run', action='store_true', help="Count what would change without writing.")
+
+    def handle(self, *args, **options):
+        after_id = options['after_id']
+        if after_id:
+            self.stdout.write(f"Resuming after result #{after_id}")
+
+        started = time.monotonic()
+        read = changed = 0
+        try:
+            while True:
+                # Each chunk commits on its own, so an interrupted run loses at most one chunk
+                with transaction.atomic():
+                    last_id, chunk_read, chunk_changed, chunk_patients = assessments.reband_chunk(
+                        after_id, options['chunk_size']
+                    )
+                    if options['dry_run']:
+                        transaction.set_rollback(True)
+                if last_id is None:
+                    break
+
+                after_id = last_id
+                read += chunk_read
+                changed += chunk_changed
+                if not options['dry_run']:
+                    for patient_id in chunk_patients - {None}:
+                        analytics.bump(patient_id)
+
+                elapsed = max(time.monotonic() - started, 1e-6)
+                self.stdout.write(f"#{after_id}: {read} read, {changed} changed ({read / elapsed:,.0f} rows/s)")
+        except KeyboardInterrupt:
+            raise CommandError(f"Interrupted; resume with --after-id {after_id}")
+
+        elapsed = max(time.monotonic() - started, 1e-6)
+        verb = "would change" if options['dry_run'] else "changed"
+        self.stdout.write(self.style.SUCCESS(
+            f"Read {read} result(s), {verb} {changed} in {elapsed:.1f}s ({read / elapsed:,.0f} rows/s)"
+        ))
@@ -0,0 +1,34 @@
+import time
+from django.core.management.base import BaseCommand
+from appointments import reports
+from cmhsApp.workers import require_shared_cache
+
+
+class Command(BaseCommand):
+    help = "Renders queued admin PDF reports off the request path."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Drain the queue and exit instead of polling.")
+        parser.add_argument('--interval', type=float, default=2.0, help="Seconds to sleep when the queue is empty.")
+
+    def handle(self, *args, **options):
+        require_shared_cache()
+        while True:
+            requeued = reports.requeue_stale_jobs()
+            if requeued:
+                self.stdout.write(f"Requeued {requeued} stale report job(s)")
+
+            job = reports.claim_next_job()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
+                continue
+
+            started = time.monotonic()
+            job = reports.run_job(job)
+            elapsed = time.monotonic() - started
+            if job.status == 'done':
+                self.stdout.write(self.style.SUCCESS(f"Rendered {job} in {elapsed:.1f}s"))
+            else:
+                self.stdout.write(self.style.ERROR(f"Report job {job.id} failed: {job.error}"))
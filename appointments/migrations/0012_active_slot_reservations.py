@@ -0,0 +1,52 @@
+# Generated by Django 6.0 on 2026-10-18 08:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.utils import timezone
+
+
+def cancel_double_bookings(apps, schema_editor):
+    # Keep one live booking per slot (confirmed first, then the earliest)
+    Appointment = apps.get_model('appointments', 'Appointment')
+    live = Appointment.objects.filter(status__in=['pending', 'confirmed'])
+    clashes = live.values('therapist_id', 'date', 'time').annotate(n=Count('id')).filter(n__gt=1)
+    for slot in clashes:
+        bookings = list(live.filter(
+            therapist_id=slot['therapist_id'], date=slot['date'], time=slot['time']
+        ).order_by('status', 'id').values_list('id', flat=True))
+        Appointment.objects.filter(id__in=bookings[1:]).update(status='cancelled', updated_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0011_report_jobs'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RunPython(cancel_double_bookings, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='appointment',
+            name='appt_active_slot_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'confirmed'])), fields=('therapist', 'date', 'time'), name='appt_active_slot_uniq'),
+        ),
+        migrations.AddField(
+            model_name='slothold',
+            name='appointment',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='hold', to='appointments.appointment'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 6.0 on 2026-10-18 08:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_unread(apps, schema_editor):
+    Message = apps.get_model('appointments', 'Message')
+    UnreadCounter = apps.get_model('appointments', 'UnreadCounter')
+    unread = Message.objects.filter(is_read=False).values_list('recipient_id', 'sender_id').annotate(n=Count('id')).order_by()
+    UnreadCounter.objects.bulk_create(
+        [UnreadCounter(recipient_id=recipient, sender_id=sender, count=n) for recipient, sender, n in unread],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0012_active_slot_reservations'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnreadCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='unread_counters', to=settings.AUTH_USER_MODEL)),
+                ('sender', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('recipient', 'sender'), name='unread_counter_pair_uniq')],
+            },
+        ),
+        migrations.RunPython(count_unread, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-18 08:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_ussd_bookings(apps, schema_editor):
+    # USSD intake was only recognisable by the notes it wrote
+    Appointment = apps.get_model('appointments', 'Appointment')
+    Appointment.objects.filter(notes__startswith='Branch: ').update(channel='ussd')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0014_journal_page_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='channel',
+            field=models.CharField(choices=[('web', 'Web'), ('ussd', 'USSD')], default='web', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['created_at'], name='appt_created_idx'),
+        ),
+        migrations.RunPython(mark_ussd_bookings, migrations.RunPython.noop),
+    ]
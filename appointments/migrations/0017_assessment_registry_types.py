@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 08:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0016_assessment_trend_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='assessmentresult',
+            name='test_type',
+            field=models.CharField(choices=[('general', 'General Check-in'), ('depression', 'Depression (PHQ-9)'), ('anxiety', 'Anxiety (GAD-7)'), ('bipolar', 'Bipolar Disorder'), ('substance', 'Substance Use (CAGE)'), ('ptsd', 'PTSD (PC-PTSD-5)')], default='depression', max_length=20),
+        ),
+    ]
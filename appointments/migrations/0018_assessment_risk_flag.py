@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 08:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0017_assessment_registry_types'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assessmentresult',
+            name='risk_flag',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -17,6 +17,11 @@ class Appointment(models.Model):
         ('physical', 'In-Person (Westlands Center)'),
     ]
 
+    CHANNEL_CHOICES = [
+        ('web', 'Web'),
+        ('ussd', 'USSD'),
+    ]
+
     patient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='patient_appointments')
     meeting_link = models.URLField(max_length=200, blank=True, null=True, help_text="Zoom/Google Meet link")
     therapist = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
@@ -29,13 +34,52 @@ class Appointment(models.Model):
     mode = models.CharField(max_length=10, choices=MODE_CHOICES, default='online')
 
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    # Where the booking came from, for intake reporting
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES, default='web')
     meeting_link = models.URLField(blank=True, null=True)
     notes = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped on every save; bulk .update() calls must set it explicitly
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # book_appointment slot check and therapist schedules
+            models.Index(fields=['therapist', 'date', 'time', 'status'], name='appt_therapist_slot_idx'),
+            # therapist_dashboard pending/confirmed lists
+            models.Index(fields=['therapist', 'status', 'date'], name='appt_therapist_status_idx'),
+            # patient_appointments, calendar_view
+            models.Index(fields=['patient', 'date', 'time'], name='appt_patient_date_idx'),
+            # therapist_patients: the distinct patient ids come from the index alone
+            models.Index(fields=['therapist', 'patient'], name='appt_therapist_patient_idx'),
+            # Recomputing one day's reporting rollup
+            models.Index(fields=['created_at'], name='appt_created_idx'),
+        ]
+        constraints = [
+            # Only live bookings can block a slot; the insert itself is the reservation
+            models.UniqueConstraint(
+                fields=['therapist', 'date', 'time'],
+                condition=models.Q(status__in=['pending', 'confirmed']),
+                name='appt_active_slot_uniq',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.patient.username} with {self.therapist.username} on {self.date}"
 
+
+class SlotHold(models.Model):
+    """
+    Short lease on a pending web booking while the patient pays.
+    Expired holds are released in bulk by `manage.py release_slot_holds`.
+    """
+    appointment = models.OneToOneField(Appointment, on_delete=models.CASCADE, related_name='hold')
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Hold on appointment {self.appointment_id} until {self.expires_at}"
+
 class SessionLog(models.Model):
     appointment = models.OneToOneField(Appointment, on_delete=models.CASCADE)
     therapist = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -61,6 +105,12 @@ class Payment(models.Model):
                               default='pending')
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # transaction_history session payments, newest first
+            models.Index(fields=['patient', 'timestamp'], name='payment_patient_ts_idx'),
+        ]
+
     def __str__(self):
         return f"Payment {self.transaction_code} for {self.patient.username}"
 
@@ -87,14 +137,47 @@ class Message(models.Model):
     recipient = models.ForeignKey(User, related_name="received_messages", on_delete=models.CASCADE)
     body = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
+    # Bumped on every edit/delete so chat polling can ask for changes only
+    updated_at = models.DateTimeField(auto_now=True)
     is_read = models.BooleanField(default=False)
 
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            # Conversation reads in both directions
+            models.Index(fields=['sender', 'recipient', 'timestamp'], name='msg_thread_ts_idx'),
+            # get_chat_messages change detection (MAX(updated_at))
+            models.Index(fields=['sender', 'recipient', 'updated_at'], name='msg_thread_updated_idx'),
+            # Unread badges and mark-as-read; read rows are the vast majority
+            models.Index(
+                fields=['recipient', 'sender'],
+                condition=models.Q(is_read=False),
+                name='msg_unread_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"From {self.sender} to {self.recipient}"
 
+
+class UnreadCounter(models.Model):
+    """
+    Unread messages from one sender to one recipient, kept in step with
+    Message.is_read by appointments.chat so badges never scan messages.
+    `manage.py repair_unread_counters` rebuilds it from the messages table.
+    """
+    recipient = models.ForeignKey(User, related_name='unread_counters', on_delete=models.CASCADE)
+    sender = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['recipient', 'sender'], name='unread_counter_pair_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.count} unread from {self.sender_id} to {self.recipient_id}"
+
 class AssessmentResult(models.Model):
     SEVERITY_CHOICES = [
         ('minimal', 'Minimal'),
@@ -105,18 +188,28 @@ class AssessmentResult(models.Model):
     ]
 
     TEST_TYPES = [
+        ('general', 'General Check-in'),
         ('depression', 'Depression (PHQ-9)'),
         ('anxiety', 'Anxiety (GAD-7)'),
         ('bipolar', 'Bipolar Disorder'),
-        ('substance', 'Substance Use'),
+        ('substance', 'Substance Use (CAGE)'),
+        ('ptsd', 'PTSD (PC-PTSD-5)'),
     ]
 
     patient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='assessments', null=True, blank=True)
     test_type = models.CharField(max_length=20, choices=TEST_TYPES, default='depression')
     score = models.IntegerField()
     severity = models.CharField(max_length=20, choices=SEVERITY_CHOICES)
+    # A risk item (e.g. PHQ-9 item 9) was answered above 0
+    risk_flag = models.BooleanField(default=False)
     date_taken = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Trend series per patient and caseload
+            models.Index(fields=['patient', 'date_taken'], name='assessment_patient_date_idx'),
+        ]
+
     def __str__(self):
         return f"{self.patient} - {self.test_type} ({self.score})"
 
@@ -129,5 +222,56 @@ class JournalEntry(models.Model):
         ('Great', 'Great'), ('Okay', 'Okay'), ('Low', 'Low'), ('Bad', 'Bad')
     ], default='Okay')
 
+    class Meta:
+        indexes = [
+            # journal_view pages (newest first)
+            models.Index(fields=['patient', 'created_at'], name='journal_patient_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.patient} - {self.created_at.date()}"
+
+
+class ReportJob(models.Model):
+    REPORT_CHOICES = [
+        ('appointments', 'Clinical Appointment Summary'),
+        ('payments', 'Financial Transaction Summary'),
+        ('customers', 'Patient Demographics Report'),
+    ]
+
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    report = models.CharField(max_length=20, choices=REPORT_CHOICES)
+    params = models.JSONField(default=dict, blank=True)
+    # Digest of (report, params); together with data_version it identifies a cached file
+    params_key = models.CharField(max_length=64)
+    data_version = models.CharField(max_length=64)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    progress = models.PositiveSmallIntegerField(default=0)
+    # Rendered into the default storage, which every web process shares
+    # with the worker. It holds patient data: the name is unguessable and
+    # it is only served through the staff-only download view.
+    output = models.FileField(upload_to='reports/', blank=True)
+    error = models.TextField(blank=True)
+
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Touched by the worker as it renders; a running job that stops beating was orphaned
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['params_key', 'data_version'], name='report_cache_idx'),
+            models.Index(fields=['status', 'created_at'], name='report_queue_idx'),
+        ]
+
     def __str__(self):
-        return f"{self.patient} - {self.created_at.date()}"
\ No newline at end of file
+        return f"{self.get_report_display()} ({self.status})"
@@ -0,0 +1,173 @@
+import asyncio
+import glob
+import json
+import logging
+import os
+import socket
+import threading
+from collections import defaultdict
+from django.conf import settings
+from django.utils.module_loading import import_string
+from . import chat
+
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------
+# SUBSCRIPTIONS
+# ---------------------------------------------
+class Subscription:
+    """
+    One open socket listening on one channel.
+    Events may be published from any thread; they are handed to the
+    socket's event loop and queued until the consumer picks them up.
+    """
+    MAX_PENDING = 100
+
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.MAX_PENDING)
+
+    def put(self, event):
+        self._loop.call_soon_threadsafe(self._offer, event)
+
+    def _offer(self, event):
+        # A stalled client should not grow memory; it will catch up by polling
+        if not self._queue.full():
+            self._queue.put_nowait(event)
+
+    async def get(self):
+        return await self._queue.get()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+# ---------------------------------------------
+# BROKERS
+# ---------------------------------------------
+class LocalBroker:
+    """
+    In-memory fan-out. Only reaches sockets served by this process,
+    which is enough for a single ASGI worker or local development.
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel)
+        with self._lock:
+            self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def publish(self, channel, event):
+        self._deliver(channel, event)
+
+    def _deliver(self, channel, event):
+        with self._lock:
+            targets = list(self._subscribers.get(channel, ()))
+        for subscription in targets:
+            subscription.put(event)
+
+
+class LocalSocketBroker(LocalBroker):
+    """
+    Fan-out across every worker process on the same host, with no Redis.
+    Each process holding open sockets binds a Unix datagram socket in
+    CHAT_SOCKET_DIR; publishing sends one datagram to each of them.
+    """
+    MAX_DATAGRAM = 65536
+
+    def __init__(self, directory=None):
+        super().__init__()
+        self.directory = directory or settings.CHAT_SOCKET_DIR
+        self._address = None
+        self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sender.setblocking(False)
+
+    def subscribe(self, channel):
+        self._ensure_listener()
+        return super().subscribe(channel)
+
+    def publish(self, channel, event):
+        payload = json.dumps({'channel': channel, 'event': event}).encode('utf-8')
+        for path in glob.glob(os.path.join(self.directory, '*.sock')):
+            try:
+                self._sender.sendto(payload, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Worker exited without cleaning up its socket file
+                if path != self._address:
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        pass
+            except OSError as e:
+                # Receiver buffer full; that client falls back to polling
+                logger.warning("Chat broker could not reach %s: %s", path, e)
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._address:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            address = os.path.join(self.directory, f"{os.getpid()}.sock")
+            if os.path.exists(address):
+                os.unlink(address)
+
+            listener = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            listener.bind(address)
+            threading.Thread(target=self._listen, args=(listener,), daemon=True).start()
+            self._address = address
+
+    def _listen(self, listener):
+        while True:
+            data = listener.recv(self.MAX_DATAGRAM)
+            try:
+                message = json.loads(data)
+                self._deliver(message['channel'], message['event'])
+            except (ValueError, KeyError) as e:
+                logger.warning("Chat broker dropped a malformed datagram: %s", e)
+
+
+_broker = None
+_broker_pid = None
+
+
+def get_broker():
+    # Built lazily and per process so forked workers never share sockets
+    global _broker, _broker_pid
+    if _broker is None or _broker_pid != os.getpid():
+        _broker = import_string(settings.CHAT_BROKER)()
+        _broker_pid = os.getpid()
+    return _broker
+
+
+# ---------------------------------------------
+# CHAT EVENTS
+# ---------------------------------------------
+def user_channel(user_id):
+    return f"user:{user_id}"
+
+
+def publish_message_event(msg, event_type):
+    # Each participant gets the message serialized from their own point of view
+    broker = get_broker()
+    for viewer_id, partner_id in ((msg.sender_id, msg.recipient_id), (msg.recipient_id, msg.sender_id)):
+        broker.publish(user_channel(viewer_id), {
+            'event': event_type,
+            'partner_id': partner_id,
+            'message': chat.serialize_message(msg, viewer_id),
+        })
@@ -0,0 +1,287 @@
+import hashlib
+import json
+import secrets
+import tempfile
+from datetime import timedelta
+from django.conf import settings
+from django.core.files import File
+from django.db.models import Count, Max
+from django.utils import timezone
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Frame, Paragraph, Table, TableStyle
+from accounts.models import User
+from payments.models import Transaction
+from .models import Appointment, ReportJob
+
+
+ROWS_PER_PAGE = 30
+# Rows given up on page one to make room for the report heading
+HEADING_ROWS = 6
+ITERATOR_CHUNK_SIZE = 2000
+# Longest a rendering worker goes without touching heartbeat_at
+HEARTBEAT_INTERVAL = timedelta(seconds=30)
+
+TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#00183E")),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+])
+
+
+# ---------------------------------------------
+# REPORT ROWS
+# ---------------------------------------------
+def appointment_report_rows():
+    rows = Appointment.objects.values_list(
+        'patient__username', 'therapist__username', 'date', 'status'
+    ).iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+    for patient, therapist, day, status in rows:
+        yield [patient, therapist, day.strftime('%Y-%m-%d'), status]
+
+
+def payment_report_rows():
+    rows = Transaction.objects.filter(status='completed').values_list(
+        'transaction_code', 'amount', 'timestamp'
+    ).iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+    for code, amount, stamp in rows:
+        yield [code, f"KES {amount}", stamp.strftime('%Y-%m-%d')]
+
+
+def customer_queryset(params):
+    return User.objects.filter(id__in=params.get('user_ids', [])).values_list(
+        'username', 'email', 'role', 'is_high_risk', 'is_premium'
+    ).order_by('id')
+
+
+def customer_report_rows(params):
+    for username, email, role, high_risk, premium in customer_queryset(params).iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+        yield [username, email, role, "Yes" if high_risk else "No", "Yes" if premium else "No"]
+
+
+# ---------------------------------------------
+# DATA VERSIONS
+# A version changes whenever the rows behind a report change,
+# which is what invalidates a cached PDF.
+# ---------------------------------------------
+def appointment_report_version(params):
+    stats = Appointment.objects.aggregate(total=Count('id'), latest=Max('updated_at'))
+    latest = stats['latest'].timestamp() if stats['latest'] else 0
+    return f"{stats['total']}:{latest}"
+
+
+def payment_report_version(params):
+    # Completed transactions are never edited, so count and newest id suffice
+    stats = Transaction.objects.filter(status='completed').aggregate(total=Count('id'), latest=Max('id'))
+    return f"{stats['total']}:{stats['latest'] or 0}"
+
+
+def customer_report_version(params):
+    # Users have no modification stamp; hashing the few selected rows is far
+    # cheaper than rendering them
+    digest = hashlib.sha256()
+    for row in customer_queryset(params).iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+        digest.update(repr(row).encode('utf-8'))
+    return digest.hexdigest()
+
+
+REPORTS = {
+    'appointments': {
+        'filename': 'Clinical_Report',
+        'title': 'Clinical Appointment Summary',
+        'headers': ['Patient', 'Therapist', 'Date', 'Status'],
+        'rows': lambda params: appointment_report_rows(),
+        'count': lambda params: Appointment.objects.count(),
+        'version': appointment_report_version,
+    },
+    'payments': {
+        'filename': 'Financial_Report',
+        'title': 'Financial Transaction Summary',
+        'headers': ['Transaction ID', 'Amount', 'Date'],
+        'rows': lambda params: payment_report_rows(),
+        'count': lambda params: Transaction.objects.filter(status='completed').count(),
+        'version': payment_report_version,
+    },
+    'customers': {
+        'filename': 'Customer_Demographics_Report',
+        'title': 'Patient Demographics Report',
+        'headers': ['Username', 'Email', 'Role', 'High Risk', 'Premium'],
+        'rows': customer_report_rows,
+        'count': lambda params: len(params.get('user_ids', [])),
+        'version': customer_report_version,
+    },
+}
+
+
+# ---------------------------------------------
+# PDF ENGINE
+# ---------------------------------------------
+def write_table_report(output, title, headers, rows, rows_per_page=ROWS_PER_PAGE, on_page=None):
+    """
+    Renders a titled table report into a binary file object.
+    Rows are consumed lazily and laid out one page-sized chunk at a time,
+    so only one chunk is ever built into a Table and measured. Memory is
+    not flat, though: reportlab keeps every finished page on the canvas
+    until save(), about 16 KB per page (some 16 MB for 1,000 pages).
+    on_page(pages_done, rows_done) is called after each page is written.
+    """
+    pdf = canvas.Canvas(output, pagesize=letter, pageCompression=1)
+    page_width, page_height = letter
+    margin = inch
+    frame_width = page_width - 2 * margin
+    frame_height = page_height - 2 * margin
+    col_widths = [frame_width / len(headers)] * len(headers)
+
+    styles = getSampleStyleSheet()
+    heading = [
+        Paragraph("Chiromo Mental Health System", styles['Title']),
+        Paragraph(title, styles['Heading2']),
+        Paragraph("<br/><br/>", styles['Normal']),
+    ]
+
+    pages = 0
+    rows_done = 0
+
+    def fill(frame, flowables):
+        """Draws flowables until the frame is full; returns how many were placed."""
+        placed = 0
+        while flowables:
+            if frame.add(flowables[0], pdf):
+                flowables.pop(0)
+                placed += 1
+                continue
+            parts = frame.split(flowables[0], pdf)
+            if len(parts) < 2:
+                break
+            flowables[0:1] = parts
+        return placed
+
+    def draw(flowables):
+        nonlocal pages
+        # A chunk that overflows (e.g. wrapped cells) continues on the next page
+        while flowables:
+            frame = Frame(margin, margin, frame_width, frame_height, leftPadding=0, rightPadding=0)
+            if not fill(frame, flowables):
+                raise ValueError("Report row is too tall to fit on a page")
+            pdf.showPage()
+            pages += 1
+
+    def chunk_table(chunk):
+        table = Table([headers] + chunk, colWidths=col_widths, repeatRows=1, hAlign='LEFT')
+        table.setStyle(TABLE_STYLE)
+        return table
+
+    chunk = []
+    first_page = True
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == (rows_per_page - HEADING_ROWS if first_page else rows_per_page):
+            rows_done += len(chunk)
+            draw((heading if first_page else []) + [chunk_table(chunk)])
+            first_page = False
+            chunk = []
+            if on_page:
+                on_page(pages, rows_done)
+
+    if chunk or first_page:
+        rows_done += len(chunk)
+        draw((heading if first_page else []) + [chunk_table(chunk)])
+        if on_page:
+            on_page(pages, rows_done)
+
+    pdf.save()
+    return pages
+
+
+# ---------------------------------------------
+# REPORT JOBS
+# ---------------------------------------------
+def params_key(report, params):
+    return hashlib.sha256(json.dumps([report, params], sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def request_report(report, params=None, user=None):
+    """
+    Returns the job for these filters at the current data version,
+    queueing a new one only if none exists (or the last one failed).
+    A 'done' job means the cached file can be served straight away.
+    """
+    params = params or {}
+    key = params_key(report, params)
+    version = REPORTS[report]['version'](params)
+
+    job = ReportJob.objects.filter(
+        params_key=key, data_version=version
+    ).exclude(status='failed').order_by('-created_at').first()
+    if job:
+        return job
+
+    return ReportJob.objects.create(
+        report=report, params=params, params_key=key, data_version=version, requested_by=user
+    )
+
+
+def claim_next_job():
+    # Conditional UPDATE as the claim, so several workers never take the same job
+    while True:
+        job_id = ReportJob.objects.filter(status='queued').order_by('created_at').values_list('id', flat=True).first()
+        if job_id is None:
+            return None
+        now = timezone.now()
+        claimed = ReportJob.objects.filter(id=job_id, status='queued').update(
+            status='running', started_at=now, heartbeat_at=now, progress=0
+        )
+        if claimed:
+            return ReportJob.objects.get(id=job_id)
+
+
+def requeue_stale_jobs():
+    # Only jobs whose worker stopped beating; a slow render keeps its claim
+    cutoff = timezone.now() - timedelta(seconds=settings.REPORT_JOB_TIMEOUT_SECONDS)
+    return ReportJob.objects.filter(status='running', heartbeat_at__lt=cutoff).update(status='queued', progress=0)
+
+
+def run_job(job):
+    spec = REPORTS[job.report]
+    total = max(spec['count'](job.params), 1)
+    last_progress, last_beat = 0, timezone.now()
+
+    def on_page(pages, rows_done):
+        nonlocal last_progress, last_beat
+        progress = min(99, rows_done * 100 // total)
+        now = timezone.now()
+        if progress != last_progress or now - last_beat >= HEARTBEAT_INTERVAL:
+            ReportJob.objects.filter(id=job.id).update(progress=progress, heartbeat_at=now)
+            last_progress, last_beat = progress, now
+
+    try:
+        with tempfile.TemporaryFile() as output:
+            write_table_report(output, spec['title'], spec['headers'], spec['rows'](job.params), on_page=on_page)
+            output.seek(0)
+            job.output.save(f"{spec['filename']}_{secrets.token_hex(16)}.pdf", File(output), save=False)
+    except Exception as e:
+        job.status = 'failed'
+        job.error = str(e)
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at'])
+        return job
+
+    job.status = 'done'
+    job.progress = 100
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'progress', 'output', 'finished_at'])
+    discard_superseded(job)
+    return job
+
+
+def discard_superseded(job):
+    # Older renders of the same filters can never be served again
+    stale = ReportJob.objects.filter(params_key=job.params_key, status='done').exclude(data_version=job.data_version)
+    for old in stale:
+        old.output.delete(save=False)
+    stale.delete()
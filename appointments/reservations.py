@@ -0,0 +1,72 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from .models import Appointment, Payment, SlotHold
+from .signals import notify_appointments_changed
+
+
+def hold_expiry():
+    return timezone.now() + timedelta(seconds=settings.SLOT_HOLD_SECONDS)
+
+
+def reserve(appointment):
+    """
+    Saves a new pending booking together with its hold. The partial unique
+    constraint on live (therapist, date, time) rows decides races, so there
+    is no separate availability check. Returns False if the slot is taken.
+    """
+    try:
+        with transaction.atomic():
+            appointment.save()
+            SlotHold.objects.create(appointment=appointment, expires_at=hold_expiry())
+    except IntegrityError:
+        appointment.pk = None
+        return False
+    return True
+
+
+def hold(appointment):
+    # Renewed when the patient reaches checkout and again when the STK push goes out
+    SlotHold.objects.update_or_create(appointment=appointment, defaults={'expires_at': hold_expiry()})
+
+
+def release_holds(appointment_ids):
+    # A paid booking keeps its slot for good
+    SlotHold.objects.filter(appointment_id__in=appointment_ids).delete()
+
+
+def release_expired_holds(batch_size=500):
+    """
+    Cancels the unpaid bookings behind up to batch_size expired holds with
+    one UPDATE and drops the holds. A booking whose STK push is still
+    awaiting its callback is not cancelled under a charge in flight: its
+    hold is extended instead, for up to SLOT_HOLD_PAYMENT_SECONDS after the
+    push. Returns the number of expired holds handled.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        expired = list(
+            SlotHold.objects.select_for_update(skip_locked=True)
+            .filter(expires_at__lte=now)
+            .values_list('id', 'appointment_id')[:batch_size]
+        )
+        if not expired:
+            return 0
+
+        in_flight = set(Payment.objects.filter(
+            appointment_id__in=[appointment_id for _, appointment_id in expired], status='pending',
+            timestamp__gte=now - timedelta(seconds=settings.SLOT_HOLD_PAYMENT_SECONDS),
+        ).values_list('appointment_id', flat=True))
+        SlotHold.objects.filter(appointment_id__in=in_flight).update(expires_at=hold_expiry())
+
+        released = [(hold_id, appointment_id) for hold_id, appointment_id in expired if appointment_id not in in_flight]
+        appointment_ids = [appointment_id for _, appointment_id in released]
+        # status='pending' is re-checked under the row lock, so a booking
+        # confirmed by a payment callback meanwhile is left alone
+        Appointment.objects.filter(id__in=appointment_ids, status='pending').update(
+            status='cancelled', updated_at=now
+        )
+        SlotHold.objects.filter(id__in=[hold_id for hold_id, _ in released]).delete()
+        notify_appointments_changed(appointment_ids)
+    return len(expired)
@@ -0,0 +1,108 @@
+import hashlib
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from .models import Appointment
+from . import calendars
+
+
+VIEWS = ('week', 'month')
+# Most therapists a coordinator can put on one board
+MAX_THERAPISTS = 50
+
+FIELDS = ('id', 'therapist_id', 'date', 'time', 'status', 'mode', 'channel',
+          'patient_id', 'patient__first_name', 'patient__last_name', 'patient__username')
+
+
+def span(day, view='week'):
+    """[start, end) of the week (from Monday) or month containing day."""
+    if view == 'month':
+        return calendars.month_span(day.year, day.month)
+    start = day - timedelta(days=day.weekday())
+    return start, start + timedelta(days=7)
+
+
+# ---------------------------------------------
+# STAMPS
+# Each therapist's range is stamped with the MAX(updated_at) and COUNT of
+# its appointments, read from the database like the chat ETags. Any write
+# from any process - the web, the callback worker, the hold sweeper -
+# moves the stamp (set-based UPDATEs set updated_at; deletes and
+# reassignments change the count), so ETags and cache keys never outlive
+# the rows they describe.
+# ---------------------------------------------
+def stamps(therapist_ids, start, end):
+    """{therapist_id: 'latest.count'} for [start, end), in one aggregate query."""
+    found = {therapist_id: '0.0' for therapist_id in therapist_ids}
+    rows = Appointment.objects.filter(
+        therapist_id__in=therapist_ids, date__gte=start, date__lt=end
+    ).order_by().values('therapist_id').annotate(latest=Max('updated_at'), total=Count('id'))
+    for row in rows:
+        found[row['therapist_id']] = f"{row['latest'].timestamp()}.{row['total']}"
+    return found
+
+
+def etag(therapist_ids, start, end, current):
+    seed = f"{start}:{end}:" + ",".join(f"{therapist_id}.{current[therapist_id]}" for therapist_id in sorted(therapist_ids))
+    return f'W/"schedule-{hashlib.md5(seed.encode()).hexdigest()}"'
+
+
+# ---------------------------------------------
+# SCHEDULES
+# Cached per therapist, range and stamp. Misses for any number of therapists are
+# filled by one range query on (therapist, date), which
+# appt_therapist_slot_idx answers in index order.
+# ---------------------------------------------
+def _serialize(row):
+    return {
+        'id': row['id'],
+        'date': row['date'].isoformat(),
+        'time': row['time'].strftime('%H:%M'),
+        'status': row['status'],
+        'mode': row['mode'],
+        'channel': row['channel'],
+        'patient_id': row['patient_id'],
+        'patient': ' '.join(filter(None, [row['patient__first_name'], row['patient__last_name']]))
+                   or row['patient__username'],
+    }
+
+
+def _fetch(therapist_ids, start, end):
+    schedules = {therapist_id: [] for therapist_id in therapist_ids}
+    rows = Appointment.objects.filter(
+        therapist_id__in=therapist_ids, date__gte=start, date__lt=end
+    ).order_by('therapist_id', 'date', 'time', 'id').values(*FIELDS)
+    for row in rows:
+        schedules[row['therapist_id']].append(_serialize(row))
+    return schedules
+
+
+def schedules(therapist_ids, start, end, current=None):
+    """{therapist_id: [appointment dicts in date/time order]} for [start, end)."""
+    current = current or stamps(therapist_ids, start, end)
+    keys = {
+        f"schedule:{therapist_id}:{start}:{end}:{current[therapist_id]}": therapist_id
+        for therapist_id in therapist_ids
+    }
+    found = {keys[key]: rows for key, rows in cache.get_many(keys).items()}
+
+    missing = [therapist_id for therapist_id in therapist_ids if therapist_id not in found]
+    if missing:
+        fetched = _fetch(missing, start, end)
+        cache.set_many({key: fetched[therapist_id] for key, therapist_id in keys.items() if therapist_id in fetched},
+                       settings.SCHEDULE_CACHE_SECONDS)
+        found.update(fetched)
+    return {therapist_id: found[therapist_id] for therapist_id in therapist_ids}
+
+
+def board_rows(therapists, start, end, found):
+    """One row per therapist with a list of (day, appointments) cells."""
+    days = [start + timedelta(days=offset) for offset in range((end - start).days)]
+    rows = []
+    for therapist in therapists:
+        by_day = {}
+        for appointment in found.get(therapist.id, []):
+            by_day.setdefault(appointment['date'], []).append(appointment)
+        rows.append({'therapist': therapist, 'cells': [(day, by_day.get(day.isoformat(), [])) for day in days]})
+    return days, rows
@@ -0,0 +1,81 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import Signal, receiver
+from .models import Appointment, AssessmentResult, Message, MoodEntry
+from . import analytics, assignment, availability, chat, realtime
+
+
+# Sent after a set-based UPDATE on appointments (which skips post_save)
+# commits. Receivers get the affected ids as `appointment_ids`.
+appointments_changed = Signal()
+
+
+def notify_appointments_changed(appointment_ids):
+    appointment_ids = list(appointment_ids)
+    if appointment_ids:
+        transaction.on_commit(
+            lambda: appointments_changed.send(sender=Appointment, appointment_ids=appointment_ids)
+        )
+
+
+@receiver(post_save, sender=Message)
+def push_message_event(sender, instance, created, **kwargs):
+    if created:
+        event_type = 'message.created'
+    elif instance.body == chat.DELETED_BODY:
+        event_type = 'message.deleted'
+    else:
+        event_type = 'message.edited'
+
+    # Only announce rows other connections can actually read
+    transaction.on_commit(lambda: realtime.publish_message_event(instance, event_type))
+
+
+# ---------------------------------------------
+# AVAILABILITY BITMAPS AND DAILY LOADS
+# ---------------------------------------------
+@receiver(post_init, sender=Appointment)
+def remember_slot_day(sender, instance, **kwargs):
+    # A rescheduled appointment also frees its old day
+    instance._loaded_slot_day = (instance.therapist_id, instance.date)
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def refresh_availability(sender, instance, **kwargs):
+    days = {(instance.therapist_id, instance.date), getattr(instance, '_loaded_slot_day', (None, None))}
+
+    def refresh():
+        for therapist_id, day in days:
+            availability.refresh_day(therapist_id, day)
+            assignment.refresh_load(therapist_id, day)
+    transaction.on_commit(refresh)
+
+
+@receiver(appointments_changed)
+def refresh_availability_in_bulk(sender, appointment_ids, **kwargs):
+    availability.refresh_appointments(appointment_ids)
+    assignment.refresh_appointments(appointment_ids)
+
+
+# ---------------------------------------------
+# ANALYTICS SERIES
+# ---------------------------------------------
+@receiver(post_save, sender=MoodEntry)
+@receiver(post_delete, sender=MoodEntry)
+@receiver(post_save, sender=AssessmentResult)
+@receiver(post_delete, sender=AssessmentResult)
+def bump_analytics(sender, instance, **kwargs):
+    patient_id = instance.patient_id
+    if patient_id:
+        transaction.on_commit(lambda: analytics.bump(patient_id))
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def bump_caseload_analytics(sender, instance, created=True, **kwargs):
+    # Only a new or removed booking, or a reassignment, can change who is on a caseload
+    previous_therapist_id = getattr(instance, '_loaded_slot_day', (None, None))[0]
+    if created or previous_therapist_id != instance.therapist_id:
+        patient_id, therapist_ids = instance.patient_id, {instance.therapist_id, previous_therapist_id}
+        transaction.on_commit(lambda: analytics.bump(patient_id, *therapist_ids))
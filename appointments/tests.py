@@ -1,3 +1,770 @@
-from django.test import TestCase
+import asyncio
+import os
+import socket
+import tempfile
+import unittest
+from datetime import date, time, timedelta
+from io import BytesIO, StringIO
+from asgiref.sync import sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, Q
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse
+from accounts.models import Specialization, User
+from CMHS.asgi import application
+from cmhsApp.testing import QueryBudgetMixin
+from payments.models import Transaction
+from . import assessments, assignment, calendars, chat, loadtest, realtime, reports, reservations, schedule
+from .models import Appointment, AssessmentResult, Message, MoodEntry, Payment, ReportJob, SlotHold, UnreadCounter
 
-# Create your tests here.
+
+class HotPathIndexTests(TestCase):
+    """
+    The queries hot views actually run must use the composite indexes added
+    for them, not just any index (every FK already has a single-column one).
+    On PostgreSQL sequential scans are disabled so the planner reports an
+    index path whenever one exists, however small the test tables are.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = User.objects.create_user('patient', password='pw')
+        cls.therapist = User.objects.create_user('therapist', password='pw', role='therapist')
+        Appointment.objects.create(patient=cls.patient, therapist=cls.therapist, date=date.today(), time=time(8))
+        Message.objects.create(sender=cls.therapist, recipient=cls.patient, body='Hello')
+        Transaction.objects.create(user=cls.patient, phone_number='254700000001', amount=1, status='completed')
+
+    def setUp(self):
+        cache.clear()
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute("SET LOCAL enable_seqscan = off")
+                cursor.execute("EXPLAIN " + sql)
+            else:
+                cursor.execute("EXPLAIN QUERY PLAN " + sql)
+            return "\n".join(str(row[-1]) for row in cursor.fetchall())
+
+    def assertUsesIndex(self, run, table, indexes, verb='SELECT'):
+        """Runs `run` and checks the first `verb` statement on `table` uses one of `indexes`."""
+        with CaptureQueriesContext(connection) as queries:
+            run()
+        statements = [query['sql'] for query in queries if f'"{table}"' in query['sql'] and verb in query['sql']]
+        self.assertTrue(statements, f"No {verb} on {table}")
+        # Server-side cursors wrap the SELECT in a DECLARE
+        sql = statements[0][statements[0].index(verb):]
+        plan = self.explain(sql)
+        self.assertTrue(any(index in plan for index in indexes), f"{indexes} not used:\n{plan}")
+
+    def get(self, user, url_name, *args, **params):
+        self.client.force_login(user)
+        return lambda: self.assertEqual(self.client.get(reverse(url_name, args=args), params).status_code, 200)
+
+    def test_slot_availability(self):
+        self.assertUsesIndex(self.get(self.patient, 'therapist_availability', days=7), 'appointments_appointment',
+                             ['appt_therapist_slot_idx', 'appt_active_slot_uniq'])
+
+    def test_therapist_dashboard_pending_requests(self):
+        # ORDER BY date, time lets the planner take the slot index instead and skip the sort
+        self.assertUsesIndex(self.get(self.therapist, 'therapist_dashboard'), 'appointments_appointment',
+                             ['appt_therapist_status_idx', 'appt_therapist_slot_idx'])
+
+    def test_patient_appointments(self):
+        self.assertUsesIndex(self.get(self.patient, 'patient_appointments'), 'appointments_appointment',
+                             ['appt_patient_date_idx'])
+
+    def test_chat_change_detection(self):
+        self.assertUsesIndex(self.get(self.patient, 'get_chat_messages', self.therapist.id), 'appointments_message',
+                             ['msg_thread_updated_idx'])
+
+    def test_mark_read(self):
+        self.assertUsesIndex(self.get(self.patient, 'get_chat_messages', self.therapist.id), 'appointments_message',
+                             ['msg_unread_idx'], verb='UPDATE')
+
+    def test_transaction_history(self):
+        self.assertUsesIndex(self.get(self.patient, 'transaction_history'), 'payments_transaction', ['tx_user_ts_idx'])
+
+    def test_financial_report(self):
+        self.assertUsesIndex(lambda: list(reports.payment_report_rows()), 'payments_transaction', ['tx_status_ts_idx'])
+
+
+class ViewQueryBudgetTests(QueryBudgetMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = User.objects.create_user('patient', password='pw', is_premium=True)
+        cls.therapists = [User.objects.create_user(f'therapist{i}', password='pw', role='therapist')
+                          for i in range(5)]
+        for i, therapist in enumerate(cls.therapists):
+            Appointment.objects.create(patient=cls.patient, therapist=therapist, date=date.today(),
+                                       time=time(8 + i))
+            Message.objects.create(sender=therapist, recipient=cls.patient, body='Hello')
+            Message.objects.create(sender=cls.patient, recipient=therapist, body='Hi')
+
+    def setUp(self):
+        self.client.force_login(self.patient)
+
+    def test_patient_appointments(self):
+        with self.assertQueryBudget('patient_appointments'):
+            response = self.client.get(reverse('patient_appointments'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_calendar(self):
+        with self.assertQueryBudget('calendar'):
+            response = self.client.get(reverse('calendar'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_inbox(self):
+        with self.assertQueryBudget('inbox_with_id'):
+            response = self.client.get(reverse('inbox_with_id', args=[self.therapists[0].id]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_conversation_list(self):
+        with self.assertQueryBudget('conversation_list'):
+            response = self.client.get(reverse('conversation_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['conversations']), len(self.therapists))
+
+    def test_get_chat_messages(self):
+        with self.assertQueryBudget('get_chat_messages'):
+            response = self.client.get(reverse('get_chat_messages', args=[self.therapists[0].id]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_journal(self):
+        with self.assertQueryBudget('journal'):
+            response = self.client.get(reverse('journal'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_transaction_history(self):
+        with self.assertQueryBudget('transaction_history'):
+            response = self.client.get(reverse('transaction_history'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_therapist_availability(self):
+        # Cold cache: every therapist-day bitmap is filled by one query
+        cache.clear()
+        with self.assertQueryBudget('therapist_availability'):
+            response = self.client.get(reverse('therapist_availability'), {'days': 14})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['availability']), len(self.therapists))
+
+    def test_analytics_trends(self):
+        cache.clear()
+        with self.assertQueryBudget('analytics_trends'):
+            response = self.client.get(reverse('analytics_trends'), {'bucket': 'month'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_therapist_schedule(self):
+        # A coordinator's cold board: one range query for every therapist
+        cache.clear()
+        self.client.force_login(User.objects.create_user('coordinator', is_staff=True))
+        with self.assertQueryBudget('therapist_schedule'):
+            response = self.client.get(reverse('therapist_schedule'), {'view': 'month'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['therapists']), len(self.therapists))
+
+    def test_schedule_board(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_user('coordinator', is_staff=True))
+        with self.assertQueryBudget('schedule_board'):
+            response = self.client.get(reverse('schedule_board'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_preview_appointments_report(self):
+        with self.assertQueryBudget('preview_appointments_report'):
+            response = self.client.get(reverse('preview_appointments_report'))
+        self.assertEqual(response.status_code, 200)
+
+
+class ReservationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = User.objects.create_user('patient')
+        cls.therapist = User.objects.create_user('therapist', role='therapist')
+
+    def booking(self, hour=9):
+        return Appointment(patient=self.patient, therapist=self.therapist, date=date(2026, 1, 5), time=time(hour))
+
+    def expire(self, appointment):
+        SlotHold.objects.filter(appointment=appointment).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+    def test_one_live_booking_per_slot(self):
+        self.assertTrue(reservations.reserve(self.booking()))
+        self.assertFalse(reservations.reserve(self.booking()))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Appointment.objects.create(patient=self.patient, therapist=self.therapist, date=date(2026, 1, 5),
+                                       time=time(9), status='confirmed')
+
+        # Cancelled rows sit outside the partial constraint
+        Appointment.objects.update(status='cancelled')
+        self.assertTrue(reservations.reserve(self.booking()))
+        self.assertEqual(SlotHold.objects.count(), 2)
+
+    def test_expired_unpaid_booking_is_cancelled(self):
+        expired, live = self.booking(), self.booking(10)
+        reservations.reserve(expired)
+        reservations.reserve(live)
+        self.expire(expired)
+
+        self.assertEqual(reservations.release_expired_holds(), 1)
+        self.assertEqual(dict(Appointment.objects.values_list('id', 'status')),
+                         {expired.id: 'cancelled', live.id: 'pending'})
+        self.assertEqual(list(SlotHold.objects.values_list('appointment_id', flat=True)), [live.id])
+
+    def test_hold_with_payment_in_flight_is_extended(self):
+        appointment = self.booking()
+        reservations.reserve(appointment)
+        payment = Payment.objects.create(patient=self.patient, appointment=appointment, amount=1,
+                                         transaction_code='ws_CO_1', status='pending')
+        self.expire(appointment)
+
+        reservations.release_expired_holds()
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.status, 'pending')
+        self.assertGreater(SlotHold.objects.get().expires_at, timezone.now())
+
+        # Once the push has failed the next sweep releases the slot
+        Payment.objects.filter(id=payment.id).update(status='failed')
+        self.expire(appointment)
+        reservations.release_expired_holds()
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.status, 'cancelled')
+
+
+class ReportJobTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', is_staff=True)
+        patient = User.objects.create_user('patient')
+        therapist = User.objects.create_user('therapist', role='therapist')
+        Appointment.objects.create(patient=patient, therapist=therapist, date=date(2026, 1, 5), time=time(9))
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = self.settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_each_job_is_claimed_once(self):
+        first = reports.request_report('appointments')
+        self.assertEqual(reports.request_report('appointments').id, first.id)
+        self.assertEqual(reports.claim_next_job().id, first.id)
+        self.assertIsNone(reports.claim_next_job())
+
+    def test_only_jobs_without_a_heartbeat_are_requeued(self):
+        job = reports.request_report('appointments')
+        reports.claim_next_job()
+        # Long-running but still beating
+        ReportJob.objects.filter(id=job.id).update(started_at=timezone.now() - timedelta(hours=2))
+        self.assertEqual(reports.requeue_stale_jobs(), 0)
+
+        ReportJob.objects.filter(id=job.id).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(reports.requeue_stale_jobs(), 1)
+        self.assertEqual(reports.claim_next_job().id, job.id)
+
+    def test_rendered_report_downloads_from_storage(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('export_appointments_pdf'))
+        job = ReportJob.objects.get()
+        self.assertRedirects(response, reverse('report_job', args=[job.id]))
+
+        job = reports.run_job(reports.claim_next_job())
+        self.assertEqual(job.status, 'done')
+        response = self.client.get(reverse('download_report_job', args=[job.id]))
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+        # The same filters at the same data version are served straight away
+        response = self.client.get(reverse('export_appointments_pdf'))
+        self.assertRedirects(response, reverse('download_report_job', args=[job.id]), fetch_redirect_response=False)
+
+
+    def test_superseded_renders_are_deleted_with_their_files(self):
+        reports.request_report('appointments')
+        old = reports.run_job(reports.claim_next_job())
+        name = old.output.name
+        self.assertTrue(default_storage.exists(name))
+
+        Appointment.objects.update(updated_at=timezone.now() + timedelta(minutes=1))
+        reports.request_report('appointments')
+        reports.run_job(reports.claim_next_job())
+        self.assertFalse(ReportJob.objects.filter(id=old.id).exists())
+        self.assertFalse(default_storage.exists(name))
+
+class TableReportTests(SimpleTestCase):
+
+    def test_overflowing_pages_continue_on_the_next(self):
+        # Three-line cells: each page-sized chunk spills onto a second page
+        pages = []
+        rows = ([i, 'line\nline\nline'] for i in range(100))
+        total = reports.write_table_report(BytesIO(), 'Report', ['#', 'Notes'], rows,
+                                           on_page=lambda done, rows_done: pages.append((done, rows_done)))
+        self.assertEqual(pages[-1], (total, 100))
+        self.assertGreater(total, len(pages))
+
+    def test_rows_are_read_one_page_ahead_at_most(self):
+        produced = []
+
+        def rows():
+            for i in range(200):
+                produced.append(i)
+                yield [i, 'row']
+
+        def on_page(pages, rows_done):
+            self.assertLessEqual(len(produced) - rows_done, reports.ROWS_PER_PAGE)
+
+        reports.write_table_report(BytesIO(), 'Report', ['#', 'Notes'], rows(), on_page=on_page)
+        self.assertEqual(len(produced), 200)
+
+    def test_row_taller_than_a_page_is_rejected(self):
+        with self.assertRaisesMessage(ValueError, "too tall"):
+            reports.write_table_report(BytesIO(), 'Report', ['#', 'Notes'], [[1, 'line\n' * 80]])
+
+
+class UnreadCounterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = User.objects.create_user('patient', password='pw', is_premium=True)
+        cls.therapist = User.objects.create_user('therapist', password='pw', role='therapist')
+
+    def send(self, sender, recipient, body='Hello'):
+        self.client.force_login(sender)
+        self.client.post(reverse('send_chat_message'), {'recipient_id': recipient.id, 'body': body},
+                         content_type='application/json')
+
+    def test_counters_follow_sends_and_reads(self):
+        self.send(self.therapist, self.patient)
+        self.send(self.therapist, self.patient)
+        self.send(self.patient, self.therapist)
+        self.assertEqual(chat.unread_total(self.patient.id), 2)
+        self.assertEqual(chat.unread_by_sender(self.therapist.id), {self.patient.id: 1})
+
+        self.client.force_login(self.patient)
+        self.client.get(reverse('get_chat_messages', args=[self.therapist.id]))
+        self.assertEqual(chat.unread_total(self.patient.id), 0)
+        self.assertEqual(chat.unread_total(self.therapist.id), 1)
+
+    def test_repair_recounts_from_messages(self):
+        self.send(self.therapist, self.patient)
+        Message.objects.create(sender=self.therapist, recipient=self.patient, body='Not counted')
+        UnreadCounter.objects.filter(recipient=self.therapist).delete()
+        Message.objects.create(sender=self.patient, recipient=self.therapist, body='Not counted either')
+
+        self.assertEqual(chat.repair_unread_counters(), (1, 1))
+        self.assertEqual(chat.unread_total(self.patient.id), 2)
+        self.assertEqual(chat.unread_total(self.therapist.id), 1)
+
+
+@override_settings(CHAT_BROKER='appointments.realtime.LocalBroker')
+class ChatSocketTests(TransactionTestCase):
+
+    def setUp(self):
+        realtime._broker = None
+        self.patient = User.objects.create_user('patient', password='pw')
+        self.therapist = User.objects.create_user('therapist', password='pw', role='therapist')
+        self.other = User.objects.create_user('other', password='pw', role='therapist')
+        self.client.force_login(self.patient)
+
+    def tearDown(self):
+        realtime._broker = None
+
+    def socket(self, path='/ws/chat/', origin=b'http://127.0.0.1:8000', session=True):
+        headers = [(b'origin', origin)]
+        if session:
+            headers.append((b'cookie', f"sessionid={self.client.cookies['sessionid'].value}".encode()))
+        return WebsocketCommunicator(application, path, headers)
+
+    async def test_cross_site_and_anonymous_sockets_are_refused(self):
+        connected, _ = await self.socket(origin=b'https://evil.example').connect()
+        self.assertFalse(connected)
+
+        connected, code = await self.socket(session=False).connect()
+        self.assertEqual((connected, code), (False, 4401))
+
+    async def test_messages_in_the_open_conversation_are_read(self):
+        socket = self.socket(f'/ws/chat/?partner={self.therapist.id}')
+        connected, _ = await socket.connect()
+        self.assertTrue(connected)
+
+        message = await sync_to_async(Message.objects.create)(sender=self.therapist, recipient=self.patient, body='Hi')
+        event = await socket.receive_json_from()
+        self.assertEqual((event['event'], event['partner_id'], event['message']['id']),
+                         ('message.created', self.therapist.id, message.id))
+        await sync_to_async(message.refresh_from_db)()
+        self.assertTrue(message.is_read)
+
+        # Another conversation is delivered but stays unread
+        other = await sync_to_async(Message.objects.create)(sender=self.other, recipient=self.patient, body='Hello')
+        self.assertEqual((await socket.receive_json_from())['partner_id'], self.other.id)
+        await sync_to_async(other.refresh_from_db)()
+        self.assertFalse(other.is_read)
+        await socket.disconnect()
+
+
+class LocalSocketBrokerTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    async def test_events_reach_other_processes(self):
+        # Two brokers on one directory stand in for two worker processes
+        subscription = realtime.LocalSocketBroker(self.directory).subscribe('user:1')
+        realtime.LocalSocketBroker(self.directory).publish('user:1', {'event': 'message.created'})
+        self.assertEqual(await asyncio.wait_for(subscription.get(), 2), {'event': 'message.created'})
+        subscription.close()
+
+    def test_sockets_of_exited_workers_are_removed(self):
+        dead = f"{self.directory}/dead.sock"
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        listener.bind(dead)
+        listener.close()
+
+        realtime.LocalSocketBroker(self.directory).publish('user:1', {})
+        self.assertFalse(os.path.exists(dead))
+
+
+class AnalyticsTrendTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = User.objects.create_user('patient', password='pw')
+        cls.therapist = User.objects.create_user('therapist', password='pw', role='therapist')
+        cls.stranger = User.objects.create_user('stranger', password='pw', role='therapist')
+        Appointment.objects.create(patient=cls.patient, therapist=cls.therapist, date=date.today(), time=time(8))
+        # Two entries in the week of Monday 2026-01-05, one in the next
+        for day, mood in [(5, 'low'), (7, 'okay'), (12, 'great')]:
+            entry = MoodEntry.objects.create(patient=cls.patient, mood=mood)
+            MoodEntry.objects.filter(id=entry.id).update(created_at=date(2026, 1, day))
+
+    def setUp(self):
+        cache.clear()
+
+    def trends(self, user, **params):
+        self.client.force_login(user)
+        params = dict({'start': '2026-01-01', 'end': '2026-01-31'}, **params)
+        return self.client.get(reverse('analytics_trends'), params)
+
+    def test_moods_are_bucketed_by_week(self):
+        moods = self.trends(self.therapist, patient=self.patient.id).json()['moods']
+        self.assertEqual([(point['period'], point['total']) for point in moods], [('2026-01-05', 2), ('2026-01-12', 1)])
+        self.assertEqual((moods[0]['low'], moods[0]['okay'], moods[0]['great']), (1, 1, 0))
+
+    def test_new_entries_invalidate_the_caseload_series(self):
+        self.assertEqual(len(self.trends(self.therapist, bucket='month').json()['moods']), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            entry = MoodEntry.objects.create(patient=self.patient, mood='bad')
+        MoodEntry.objects.filter(id=entry.id).update(created_at=date(2026, 1, 20))
+        # Cached series are keyed by version, not by content
+        self.assertEqual(self.trends(self.therapist, bucket='month').json()['moods'][0]['bad'], 1)
+
+    def test_reassignment_invalidates_both_caseloads(self):
+        self.assertEqual(self.trends(self.stranger, bucket='month').json()['moods'], [])
+        self.assertEqual(len(self.trends(self.therapist, bucket='month').json()['moods']), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = Appointment.objects.get(patient=self.patient)
+            appointment.therapist = self.stranger
+            appointment.save()
+        self.assertEqual(self.trends(self.stranger, bucket='month').json()['moods'][0]['total'], 3)
+        self.assertEqual(self.trends(self.therapist, bucket='month').json()['moods'], [])
+
+    def test_patients_off_the_caseload_are_forbidden(self):
+        self.assertEqual(self.trends(self.stranger, patient=self.patient.id).status_code, 403)
+        self.assertEqual(self.trends(self.patient, therapist=self.therapist.id).status_code, 403)
+        self.assertEqual(self.trends(self.patient, bucket='year').status_code, 400)
+
+
+class AssessmentRegistryTests(TestCase):
+
+    def answers(self, key, *values):
+        return {question.id: value for question, value in zip(assessments.REGISTRY[key].questions, values)}
+
+    def test_scores_fall_into_instrument_bands(self):
+        phq9 = [self.answers('depression', *['0'] * 9), self.answers('depression', *['1'] * 9),
+                self.answers('depression', *['3'] * 9)]
+        scored = assessments.score_many('depression', phq9)
+        self.assertEqual([(score, band.severity) for score, band, _ in scored],
+                         [(0, 'minimal'), (9, 'mild'), (27, 'severe')])
+        cage = assessments.score_many('substance', [self.answers('substance', '1', '1', '0', '0')])
+        self.assertEqual(cage[0][1].severity, 'moderate')
+
+    def test_invalid_answers_are_rejected(self):
+        with self.assertRaises(KeyError):
+            assessments.REGISTRY['ptsd'].score(self.answers('ptsd', '3', '0', '0', '0', '0'))
+
+    def test_submission_is_scored_and_saved(self):
+        patient = User.objects.create_user('patient', password='pw')
+        self.client.force_login(patient)
+        response = self.client.post(reverse('take_assessment') + '?type=anxiety',
+                                    self.answers('anxiety', *['2'] * 7))
+        self.assertContains(response, 'Moderate Symptoms')
+        result = AssessmentResult.objects.get()
+        self.assertEqual((result.patient, result.test_type, result.score, result.severity),
+                         (patient, 'anxiety', 14, 'moderate'))
+
+    def test_self_harm_item_is_flagged_whatever_the_total(self):
+        patient = User.objects.create_user('patient', password='pw')
+        self.client.force_login(patient)
+        response = self.client.post(reverse('take_assessment') + '?type=depression',
+                                    self.answers('depression', *['0'] * 8, '1'))
+        self.assertContains(response, 'Minimal Symptoms')
+        self.assertContains(response, 'call 999 or 112')
+        result = AssessmentResult.objects.get()
+        self.assertEqual((result.score, result.risk_flag), (1, True))
+        patient.refresh_from_db()
+        self.assertTrue(patient.is_high_risk)
+
+        # Anonymous screenings keep the flag on the stored result
+        self.client.logout()
+        self.client.post(reverse('take_assessment') + '?type=depression', self.answers('depression', *['0'] * 8, '2'))
+        self.assertTrue(AssessmentResult.objects.get(patient=None).risk_flag)
+        response = self.client.post(reverse('take_assessment') + '?type=depression', self.answers('depression', *['1'] * 8, '0'))
+        self.assertNotContains(response, 'call 999 or 112')
+
+    def test_rescore_command_rebands_stale_rows_after_an_id(self):
+        stale = [AssessmentResult.objects.create(test_type='depression', score=score, severity='minimal')
+                 for score in (3, 12, 22)]
+
+        call_command('rescore_assessments', chunk_size=2, stdout=StringIO())
+        self.assertEqual([result.severity for result in AssessmentResult.objects.order_by('id')],
+                         ['minimal', 'moderate', 'severe'])
+
+        # A resumed run only looks past the id it is given
+        AssessmentResult.objects.filter(id__in=[stale[0].id, stale[1].id]).update(severity='severe')
+        call_command('rescore_assessments', after_id=stale[0].id, stdout=StringIO())
+        self.assertEqual([result.severity for result in AssessmentResult.objects.order_by('id')],
+                         ['severe', 'moderate', 'severe'])
+
+
+class UssdSessionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.therapist = User.objects.create_user('therapist', role='therapist', is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def dial(self, text, session='ATUid_1'):
+        response = self.client.post(reverse('ussd_callback'),
+                                    {'sessionId': session, 'phoneNumber': '+254700000001', 'text': text})
+        return response.content.decode()
+
+    def test_menu_hops_never_touch_the_database(self):
+        with self.assertNumQueries(0):
+            self.assertTrue(self.dial('').startswith('CON Welcome to CMHS'))
+            self.assertTrue(self.dial('1').startswith('CON Select Service'))
+            self.assertTrue(self.dial('1*2').startswith('CON Select Time'))
+            self.assertTrue(self.dial('1*2*2').startswith('CON Select Branch'))
+            self.assertTrue(self.dial('1*2*2*1').startswith('CON Enter your Full Name'))
+
+        self.assertTrue(self.dial('1*2*2*1*Jane Doe').startswith('END Thank you Jane Doe!'))
+        appointment = Appointment.objects.get()
+        self.assertEqual((appointment.channel, appointment.patient.phone_number, appointment.therapist),
+                         ('ussd', '+254700000001', self.therapist))
+        self.assertEqual(appointment.notes, "Branch: Chiromo Lane. Service: Anxiety & Stress")
+
+    def test_lost_session_is_rebuilt_from_the_text(self):
+        self.dial('')
+        self.dial('1')
+        cache.clear()
+        self.assertTrue(self.dial('1*1*3*2*Jane*Doe').startswith('END Thank you Jane*Doe!'))
+
+    def test_invalid_choice_ends_the_session(self):
+        self.assertEqual(self.dial('9'), 'END Invalid choice.')
+        self.assertEqual(self.dial('1*4', session='ATUid_2'), 'END Invalid choice.')
+
+    def test_resent_final_hop_returns_the_stored_end(self):
+        User.objects.create_user('second', role='therapist', is_staff=True)
+        first = self.dial('1*2*2*1*Jane Doe')
+        self.assertTrue(first.startswith('END Thank you Jane Doe!'))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.dial('1*2*2*1*Jane Doe'), first)
+        self.assertEqual(Appointment.objects.count(), 1)
+
+
+class TherapistAssignmentTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        clinical = Specialization.objects.create(name='Clinical Psychology')
+        addiction = Specialization.objects.create(name='Addiction Counselling')
+        cls.clinical = [User.objects.create_user(f'clinical{i}', role='therapist', specialization=clinical)
+                        for i in range(3)]
+        cls.addiction = User.objects.create_user('addiction', role='therapist', specialization=addiction)
+
+    def setUp(self):
+        cache.clear()
+
+    def book(self, text, phone):
+        self.client.post(reverse('ussd_callback'), {'sessionId': phone, 'phoneNumber': phone, 'text': text})
+
+    def test_bookings_spread_over_the_matching_therapists(self):
+        # Same day, same slot: each booking must go to a different therapist
+        for caller in range(3):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.book(f'1*1*2*1*Caller {caller}', f'+2547000000{caller:02d}')
+
+        loads = Appointment.objects.values_list('therapist').annotate(n=Count('id')).order_by('therapist')
+        self.assertEqual(list(loads), [(therapist.id, 1) for therapist in self.clinical])
+
+        # Pools and counters were warmed and refreshed by the bookings themselves
+        with self.assertNumQueries(0):
+            self.assertEqual(len(assignment.rank('depression', date.today() + timedelta(days=1))), 3)
+
+    def test_unmatched_service_falls_back_to_every_therapist(self):
+        self.clinical[0].specialization = None
+        with self.captureOnCommitCallbacks(execute=True):
+            self.clinical[0].save()
+        self.assertEqual(len(assignment.rank('anxiety', date.today())), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            Specialization.objects.all().delete()
+        self.assertEqual(len(assignment.rank('anxiety', date.today())), 4)
+
+
+class AssignmentLoadCommitTests(TransactionTestCase):
+
+    def test_load_counter_matches_committed_bookings(self):
+        # Real commits, so the post-commit recount runs where it would in production
+        cache.clear()
+        therapist = User.objects.create_user('therapist', role='therapist')
+        self.client.post(reverse('ussd_callback'), {'sessionId': 's1', 'phoneNumber': '+254700000001',
+                                                    'text': '1*1*2*1*Caller'})
+        day = date.today() + timedelta(days=1)
+        self.assertEqual(Appointment.objects.filter(therapist=therapist, date=day).count(), 1)
+        self.assertEqual(assignment.daily_loads([therapist.id], day), {therapist.id: 1})
+
+
+class UssdLoadTestTests(TestCase):
+
+    def test_harness_reports_per_hop_latency_and_queries(self):
+        cache.clear()
+        User.objects.create_user('therapist', role='therapist')
+        sessions = loadtest.synthetic_sessions(20, seed=1)
+        samples = loadtest.run_in_process(sessions, interleave=5)
+        report = loadtest.summarize(samples, len(sessions), 1.0)
+
+        self.assertEqual(report['hops']['1']['requests'], 20)
+        # Only the final hop of a session may query
+        self.assertEqual(report['hops']['3']['queries_max'], 0)
+        self.assertEqual(loadtest.compare(report, report, 0.25), [])
+
+
+class CalendarFeedTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = User.objects.create_user('patient', password='pw')
+        cls.therapist = User.objects.create_user('therapist', password='pw', role='therapist', last_name='Otieno')
+        for day, hour, status in [(5, 8, 'confirmed'), (5, 10, 'cancelled'), (20, 9, 'pending')]:
+            Appointment.objects.create(patient=cls.patient, therapist=cls.therapist, date=date(2026, 1, day),
+                                       time=time(hour), status=status)
+        Appointment.objects.create(patient=cls.patient, therapist=cls.therapist, date=date(2026, 3, 2), time=time(8))
+
+    def test_month_grid_is_laid_out_once(self):
+        calendars.month_grid.cache_clear()
+        calendars.month_grid(2026, 1)
+        calendars.month_grid(2026, 1)
+        self.assertEqual(calendars.month_grid.cache_info().hits, 1)
+        self.assertEqual(calendars.month_grid(2026, 2)[0], (1, 2, 3, 4, 5, 6, 7))
+
+    def test_feed_summarizes_several_months_in_one_query(self):
+        self.client.force_login(self.patient)
+        self.client.get(reverse('calendar'))
+        with self.assertNumQueries(3):
+            days = self.client.get(reverse('calendar_feed'), {'start': '2026-01', 'months': 3}).json()['days']
+
+        self.assertEqual(list(days), ['2026-01-05', '2026-01-20', '2026-03-02'])
+        self.assertEqual(days['2026-01-05']['by_status'], {'confirmed': 1, 'cancelled': 1})
+        self.assertEqual((days['2026-01-05']['earliest'], days['2026-01-05']['names']), ('08:00:00', ['Dr. Otieno']))
+
+    def test_therapist_ics_lists_their_sessions(self):
+        self.client.force_login(self.therapist)
+        body = self.client.get(reverse('calendar_ics'), {'start': '2026-01'}).content.decode()
+        self.assertEqual(body.count('BEGIN:VEVENT'), 3)
+        # 08:00 in Nairobi is 05:00 UTC
+        self.assertIn('DTSTART:20260105T050000Z', body)
+        self.assertIn('STATUS:CANCELLED', body)
+
+
+class TherapistScheduleTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = User.objects.create_user('patient', first_name='Amina')
+        cls.therapist = User.objects.create_user('therapist', role='therapist')
+        cls.other = User.objects.create_user('other', role='therapist')
+        # Monday 5 January 2026 starts the week
+        cls.appointment = Appointment.objects.create(patient=cls.patient, therapist=cls.therapist,
+                                                     date=date(2026, 1, 6), time=time(9))
+        Appointment.objects.create(patient=cls.patient, therapist=cls.other, date=date(2026, 1, 7), time=time(9))
+        Appointment.objects.create(patient=cls.patient, therapist=cls.therapist, date=date(2026, 1, 12), time=time(9))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_week_of_own_appointments(self):
+        self.client.force_login(self.therapist)
+        data = self.client.get(reverse('therapist_schedule'), {'start': '2026-01-08'}).json()
+        self.assertEqual((data['start'], data['end']), ('2026-01-05', '2026-01-12'))
+        self.assertEqual(list(data['therapists']), [str(self.therapist.id)])
+        self.assertEqual([(row['date'], row['time'], row['patient']) for row in data['therapists'][str(self.therapist.id)]],
+                         [('2026-01-06', '09:00', 'Amina')])
+
+    def test_only_coordinators_see_other_therapists(self):
+        self.client.force_login(self.therapist)
+        response = self.client.get(reverse('therapist_schedule'), {'therapist': self.other.id})
+        self.assertEqual(response.status_code, 403)
+
+        self.client.force_login(User.objects.create_user('coordinator', is_staff=True))
+        data = self.client.get(reverse('therapist_schedule'), {
+            'therapist': f"{self.therapist.id},{self.other.id}", 'start': '2026-01-01', 'view': 'month',
+        }).json()
+        self.assertEqual([len(rows) for rows in data['therapists'].values()], [2, 1])
+
+    def test_conditional_get_until_an_appointment_changes(self):
+        self.client.force_login(self.therapist)
+        params = {'start': '2026-01-05'}
+        etag = self.client.get(reverse('therapist_schedule'), params)['ETag']
+
+        # Unchanged: one aggregate query and no rows
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('therapist_schedule'), params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.appointment.status = 'confirmed'
+            self.appointment.save()
+        response = self.client.get(reverse('therapist_schedule'), params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['therapists'][str(self.therapist.id)][0]['status'], 'confirmed')
+
+        # Set-based writes from the workers fire no signal but still move the stamp
+        etag = response['ETag']
+        Appointment.objects.filter(id=self.appointment.id).update(status='cancelled', updated_at=timezone.now())
+        response = self.client.get(reverse('therapist_schedule'), params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json()['therapists'][str(self.therapist.id)][0]['status'], 'cancelled')
+
+    def test_reassignment_refreshes_both_therapists(self):
+        start, end = schedule.span(date(2026, 1, 6))
+        before = schedule.stamps([self.therapist.id, self.other.id], start, end)
+        appointment = Appointment.objects.get(id=self.appointment.id)
+        appointment.therapist = self.other
+        appointment.save()
+        after = schedule.stamps([self.therapist.id, self.other.id], start, end)
+        self.assertTrue(all(after[tid] != before[tid] for tid in before))
+        self.assertEqual([len(rows) for rows in schedule.schedules([self.therapist.id, self.other.id], start, end).values()],
+                         [0, 2])
@@ -3,7 +3,13 @@ from . import views
 
 urlpatterns = [
     path('calendar/', views.calendar_view, name='calendar'),
+    path('api/calendar/', views.calendar_feed, name='calendar_feed'),
+    path('calendar.ics', views.calendar_ics, name='calendar_ics'),
     path('book/', views.book_appointment, name='book_appointment'),
+    path('api/availability/', views.therapist_availability, name='therapist_availability'),
+    path('api/analytics/trends/', views.analytics_trends, name='analytics_trends'),
+    path('api/schedule/', views.therapist_schedule, name='therapist_schedule'),
+    path('schedule/', views.schedule_board, name='schedule_board'),
     path('session/log/<int:appointment_id>/', views.log_session, name='log_session'),
     path('patient/resources/', views.patient_resources, name='patient_resources'),
     path('mood/log/<str:mood_value>/', views.log_mood, name='log_mood'),
@@ -15,6 +21,7 @@ urlpatterns = [
     path('cancel/<int:id>/', views.cancel_appointment, name='cancel_appointment'),
     path('assessment/', views.assessment_hub, name='assessment_hub'),
     path('take_assessment/', views.take_assessment, name='take_assessment'),
+    path('api/conversations/', views.conversation_list, name='conversation_list'),
     path('api/get-messages/<int:partner_id>/', views.get_chat_messages, name='get_chat_messages'),
     path('api/send-message/', views.send_chat_message, name='send_chat_message'),
     path('journal/', views.journal_view, name='journal'),
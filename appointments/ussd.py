@@ -0,0 +1,267 @@
+import logging
+from datetime import date, time, timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, transaction
+from accounts.models import User
+from cmhsApp import notifications
+from .models import Appointment
+from . import assignment
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------
+# MENU TREE
+# Each screen either offers numbered options (each stores a value under
+# `store` and moves to its own next screen) or asks for free text (stored
+# under `input`). A screen with an `action` ends the session by running it.
+# ---------------------------------------------
+MENU = {
+    'root': {
+        'prompt': "Welcome to CMHS",
+        'options': [
+            ('book', "Book Therapy", 'service'),
+            ('emergency', "Emergency Help", 'emergency'),
+            ('account', "My Account", 'account'),
+        ],
+    },
+    'service': {
+        'prompt': "Select Service:",
+        'store': 'service',
+        'options': [
+            ('depression', "Depression Support", 'slot'),
+            ('anxiety', "Anxiety & Stress", 'slot'),
+            ('addiction', "Addiction Recovery", 'slot'),
+        ],
+    },
+    'slot': {
+        'prompt': "Select Time:",
+        'store': 'slot',
+        'options': [
+            ('today', "Today 2:00 PM", 'branch'),
+            ('tomorrow', "Tomorrow 10:00 AM", 'branch'),
+            ('later', "Monday 9:00 AM", 'branch'),
+        ],
+    },
+    'branch': {
+        'prompt': "Select Branch:",
+        'store': 'branch',
+        'options': [
+            ('Chiromo Lane', "Chiromo Lane (Main)", 'name'),
+            ('Bustani', "Bustani (Lavington)", 'name'),
+            ('Braeside', "Braeside Clinic", 'name'),
+        ],
+    },
+    'name': {
+        'prompt': "Enter your Full Name to confirm:",
+        'input': 'name',
+        'action': 'book',
+    },
+    'emergency': {
+        'prompt': "EMERGENCY\nEnter your location:",
+        'input': 'location',
+        'action': 'emergency',
+    },
+    'account': {
+        'action': 'account',
+    },
+}
+
+# slot value -> (days from today, session start)
+SLOT_TIMES = {
+    'today': (0, time(14, 0)),
+    'tomorrow': (1, time(10, 0)),
+    'later': (2, time(9, 0)),
+}
+
+INVALID = "END Invalid choice."
+FAILED = "END Sorry, an error occurred. Please try again."
+SLOT_TAKEN = "END Sorry, that time was just booked. Please dial again and pick another time."
+NO_THERAPIST = "END Sorry, no therapist is available for that service. Please try again later."
+
+
+class Screen:
+
+    def __init__(self, name, prompt=None, options=(), store=None, input=None, action=None):
+        self.name = name
+        self.store = store
+        self.input = input
+        self.action = action
+        # "1" -> (value, next screen), looked up directly on each hop
+        self.choices = {str(position): (value, target) for position, (value, _, target) in enumerate(options, 1)}
+        self.labels = {value: label for value, label, _ in options}
+        lines = [prompt] + [f"{position}. {label}" for position, (_, label, _) in enumerate(options, 1)]
+        self.response = "CON " + "\n".join(lines) if prompt else None
+
+
+def compile_menu(menu):
+    screens = {name: Screen(name, **spec) for name, spec in menu.items()}
+    for screen in screens.values():
+        for _, target in screen.choices.values():
+            if target not in screens:
+                raise ImproperlyConfigured(f"USSD screen '{screen.name}' leads to unknown screen '{target}'")
+        if screen.action and screen.action not in ACTIONS:
+            raise ImproperlyConfigured(f"USSD screen '{screen.name}' runs unknown action '{screen.action}'")
+    return screens
+
+
+# ---------------------------------------------
+# ACTIONS
+# The only code that touches the database, once per session.
+# ---------------------------------------------
+def book(phone_number, data):
+    days, start = SLOT_TIMES[data['slot']]
+    day = date.today() + timedelta(days=days)
+    name = data['name']
+
+    # Least-loaded matching therapists; the next one is tried if a slot is taken
+    candidates = assignment.rank(data['service'], day)[:settings.ASSIGNMENT_ATTEMPTS]
+    if not candidates:
+        return NO_THERAPIST
+
+    with transaction.atomic():
+        patient = User.objects.filter(phone_number=phone_number).first()
+        if patient is None:
+            patient = User.objects.create(username=phone_number, first_name=name, phone_number=phone_number)
+        elif patient.first_name != name:
+            User.objects.filter(id=patient.id).update(first_name=name)
+
+        for therapist_id in candidates:
+            try:
+                with transaction.atomic():
+                    Appointment.objects.create(
+                        patient=patient,
+                        therapist_id=therapist_id,
+                        date=day,
+                        time=start,
+                        mode='physical',
+                        status='pending',
+                        channel='ussd',
+                        notes=f"Branch: {data['branch']}. Service: {SCREENS['service'].labels[data['service']]}"
+                    )
+                break
+            except IntegrityError:
+                continue
+        else:
+            return SLOT_TAKEN
+
+    # Queued; the worker sends it after the gateway has its answer
+    sms_text = f"Thank you {name}! Your session at {data['branch']} is confirmed for {day} at {start}."
+    notifications.enqueue_sms(phone_number, sms_text)
+    return f"END {sms_text}"
+
+
+def emergency(phone_number, data):
+    return "END If you are in immediate danger, call 999 or 112 now. Our crisis team is available at any CMHS branch."
+
+
+def account(phone_number, data):
+    upcoming = Appointment.objects.filter(
+        patient__phone_number=phone_number, status__in=['pending', 'confirmed'], date__gte=date.today()
+    ).order_by('date', 'time').values_list('date', 'time', 'status').first()
+    if upcoming is None:
+        return "END You have no upcoming sessions."
+    day, start, status = upcoming
+    return f"END Next session: {day} at {start.strftime('%H:%M')} ({status})."
+
+
+ACTIONS = {
+    'book': book,
+    'emergency': emergency,
+    'account': account,
+}
+
+
+SCREENS = compile_menu(MENU)
+
+
+# ---------------------------------------------
+# SESSIONS
+# The gateway resends everything typed so far ("1*2*3") on every hop.
+# The cache remembers where that text left the caller, so a hop only
+# reads its own new answer. A missing or out-of-step session is rebuilt
+# by replaying the text, which never touches the database either.
+# ---------------------------------------------
+def session_key(session_id):
+    return f"ussd:session:{session_id}"
+
+
+def ended_key(session_id):
+    return f"ussd:ended:{session_id}"
+
+
+def _new_state():
+    return {'screen': 'root', 'text': '', 'data': {}}
+
+
+def _answer(state, answer, phone_number):
+    """Applies one answer to the session and returns the next response."""
+    screen = SCREENS[state['screen']]
+
+    if screen.input:
+        if not answer.strip():
+            return INVALID
+        state['data'][screen.input] = answer.strip()
+        return _run(screen, state, phone_number)
+
+    if answer not in screen.choices:
+        return INVALID
+    value, target = screen.choices[answer]
+    if screen.store:
+        state['data'][screen.store] = value
+    state['screen'] = target
+
+    target = SCREENS[target]
+    return target.response if target.response else _run(target, state, phone_number)
+
+
+def _run(screen, state, phone_number):
+    try:
+        return ACTIONS[screen.action](phone_number, state['data'])
+    except Exception:
+        logger.exception("USSD action %s failed", screen.action)
+        return FAILED
+
+
+def _replay(text, phone_number):
+    state, remaining = _new_state(), text
+    while True:
+        if SCREENS[state['screen']].input:
+            # Free text may itself contain '*'
+            answer, remaining = remaining, ''
+        else:
+            answer, _, remaining = remaining.partition('*')
+        response = _answer(state, answer, phone_number)
+        if response.startswith('END') or not remaining:
+            return state, response
+
+
+def handle(session_id, phone_number, text):
+    """Returns the CON/END response for one gateway hop."""
+    key = session_key(session_id)
+    if text:
+        # A resent final hop gets the END it was already given; replaying
+        # it would run the action (and book) a second time.
+        ended = cache.get(ended_key(session_id))
+        if ended is not None:
+            return ended
+
+    if not text:
+        state, response = _new_state(), SCREENS['root'].response
+    else:
+        state = cache.get(key)
+        if state and (not state['text'] or text.startswith(state['text'] + '*')):
+            answer = text[len(state['text']) + 1:] if state['text'] else text
+            response = _answer(state, answer, phone_number)
+        else:
+            state, response = _replay(text, phone_number)
+
+    if response.startswith('END'):
+        cache.delete(key)
+        cache.set(ended_key(session_id), response, settings.USSD_ENDED_SECONDS)
+    else:
+        state['text'] = text
+        cache.set(key, state, settings.USSD_SESSION_SECONDS)
+    return response
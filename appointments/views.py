@@ -1,29 +1,27 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 import calendar
-from datetime import date, time, timedelta
-from datetime import datetime
+from datetime import datetime, timedelta
 from django.utils import timezone
 from django.contrib import messages
+from django.db import transaction
 from django.db.models import Q
-from .forms import BookingForm, SessionLogForm
+from .forms import ASSESSMENT_FORMS, BookingForm, SessionLogForm
 from .models import Appointment, SessionLog, MoodEntry, Message
-from django.core.mail import send_mail
 from accounts.models import User
+from accounts import dashboards
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 import json
 from cmhsApp.decorators import premium_required
-from .models import JournalEntry
-from payments.sms_service import send_ussd_sms
+from .models import JournalEntry, ReportJob
+from . import analytics, assessments, assignment, availability, calendars, chat, reports, reservations, schedule, ussd
+from cmhsApp import notifications
+from cmhsApp.pagination import paginate_request
 import uuid
-from django.http import HttpResponse
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
-from reportlab.lib.styles import getSampleStyleSheet
+from django.http import HttpResponse, HttpResponseNotModified, FileResponse
+from django.urls import reverse
+from django.contrib.admin.views.decorators import staff_member_required
 from payments.models import Transaction
 from django.contrib.auth import get_user_model
 
@@ -31,12 +29,17 @@ from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
+# Admin previews show a page of rows; the PDF export has them all
+PREVIEW_PAGE_SIZE = 50
+
 
 # ---------------------------------------------
 # ADMIN SIDE VIEWS (PDF GENERATION)
 # ---------------------------------------------
 def preview_appointments_report(request):
-    data = Appointment.objects.all().order_by('-date')
+    data = paginate_request(
+        request, Appointment.objects.select_related('patient', 'therapist'), ('-date', '-id'), page_size=PREVIEW_PAGE_SIZE
+    )
     return render(request, 'admin/report_preview.html', {
         'title': 'Clinical Appointment Summary',
         'data': data,
@@ -45,7 +48,9 @@ def preview_appointments_report(request):
     })
 
 def preview_payments_report(request):
-    data = Transaction.objects.filter(status='completed').order_by('-timestamp')
+    data = paginate_request(
+        request, Transaction.objects.filter(status='completed'), ('-timestamp', '-id'), page_size=PREVIEW_PAGE_SIZE
+    )
     return render(request, 'admin/report_preview.html', {
         'title': 'Financial Transaction Summary',
         'data': data,
@@ -53,41 +58,40 @@ def preview_payments_report(request):
         'export_url': 'export_payments_pdf'
     })
 
-def generate_pdf(filename, title, headers, data):
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="{filename}.pdf"'
-
-    doc = SimpleDocTemplate(response, pagesize=letter)
-    elements = []
-    styles = getSampleStyleSheet()
-
-    elements.append(Paragraph("Chiromo Mental Health System", styles['Title']))
-    elements.append(Paragraph(title, styles['Heading2']))
-    elements.append(Paragraph("<br/><br/>", styles['Normal']))
-
-    table_data = [headers] + data
-    table = Table(table_data, hAlign='LEFT')
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#00183E")),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-    ]))
-    elements.append(table)
-    doc.build(elements)
-    return response
-
+@staff_member_required
 def export_appointments_pdf(request):
-    apps = Appointment.objects.all()
-    data = [[a.patient.username, a.therapist.username, a.date.strftime('%Y-%m-%d'), a.status] for a in apps]
-    return generate_pdf("Clinical_Report", "Clinical Appointment Summary", ['Patient', 'Therapist', 'Date', 'Status'],
-                        data)
+    job = reports.request_report('appointments', user=request.user)
+    if job.status == 'done':
+        return redirect('download_report_job', job_id=job.id)
+    return redirect('report_job', job_id=job.id)
 
+@staff_member_required
 def export_payments_pdf(request):
-    trans = Transaction.objects.filter(status='completed')
-    data = [[t.transaction_id, f"KES {t.amount}", t.timestamp.strftime('%Y-%m-%d')] for t in trans]
-    return generate_pdf("Financial_Report", "Financial Transaction Summary", ['Transaction ID', 'Amount', 'Date'], data)
+    job = reports.request_report('payments', user=request.user)
+    if job.status == 'done':
+        return redirect('download_report_job', job_id=job.id)
+    return redirect('report_job', job_id=job.id)
+
+@staff_member_required
+def report_job(request, job_id):
+    job = get_object_or_404(ReportJob, id=job_id)
+    return render(request, 'admin/report_job.html', {'job': job, 'title': job.get_report_display()})
+
+@staff_member_required
+def report_job_status(request, job_id):
+    job = get_object_or_404(ReportJob, id=job_id)
+    return JsonResponse({
+        'status': job.status,
+        'progress': job.progress,
+        'error': job.error,
+        'download_url': reverse('download_report_job', args=[job.id]) if job.status == 'done' else None,
+    })
+
+@staff_member_required
+def download_report_job(request, job_id):
+    job = get_object_or_404(ReportJob, id=job_id, status='done')
+    filename = f"{reports.REPORTS[job.report]['filename']}.pdf"
+    return FileResponse(job.output.open('rb'), as_attachment=True, filename=filename, content_type='application/pdf')
 
 # ---------------------------------------------
 #   CLIENT SIDE VIEWS
@@ -99,40 +103,17 @@ def calendar_view(request):
     year = int(request.GET.get('year', today.year))
     month = int(request.GET.get('month', today.month))
 
-    cal = calendar.Calendar(firstweekday=6)
-    month_days = cal.monthdayscalendar(year, month)
-
-    appointments = Appointment.objects.filter(
-        patient=request.user,
-        date__year=year,
-        date__month=month
-    )
-
-    appointments_by_day = {}
-    for appt in appointments:
-        day = appt.date.day
-        if day not in appointments_by_day:
-            appointments_by_day[day] = []
-        appointments_by_day[day].append(appt)
-
-    if month == 1:
-        prev_month, prev_year = 12, year - 1
-    else:
-        prev_month, prev_year = month - 1, year
-
-    if month == 12:
-        next_month, next_year = 1, year + 1
-    else:
-        next_month, next_year = month + 1, year
+    start, end = calendars.month_span(year, month)
+    days = calendars.summarize(calendars.sessions({'patient': request.user}, start, end))
 
-    month_name = calendar.month_name[month]
+    prev_year, prev_month = calendars.shift_month(year, month, -1)
+    next_year, next_month = calendars.shift_month(year, month, 1)
 
     context = {
         'year': year,
         'month': month,
-        'month_name': month_name,
-        'month_days': month_days,
-        'appointments_by_day': appointments_by_day,
+        'month_name': calendar.month_name[month],
+        'weeks': calendars.month_weeks(year, month, days),
         'prev_year': prev_year,
         'prev_month': prev_month,
         'next_year': next_year,
@@ -142,6 +123,45 @@ def calendar_view(request):
 
     return render(request, 'appointments/calendar.html', context)
 
+def _feed_range(request):
+    """(start, end) from ?start=YYYY-MM&months=N, capped at MAX_FEED_MONTHS."""
+    today = timezone.localdate()
+    year, month = (int(part) for part in request.GET.get('start', f"{today.year}-{today.month}").split('-'))
+    months = min(max(int(request.GET.get('months', 1)), 1), calendars.MAX_FEED_MONTHS)
+    return calendars.month_span(year, month, months)
+
+@login_required
+def calendar_feed(request):
+    """Per-day summaries for one or more months: ?start=YYYY-MM&months=3."""
+    try:
+        start, end = _feed_range(request)
+    except ValueError:
+        return JsonResponse({'status': 'error'}, status=400)
+
+    owner = calendars.owner_filter(request.user)
+    counterpart = 'patient' if 'therapist' in owner else 'therapist'
+    days = calendars.summarize(calendars.sessions(owner, start, end), counterpart)
+    return JsonResponse({
+        'start': start,
+        'end': end,
+        'days': {day.isoformat(): summary for day, summary in days.items()},
+    })
+
+@login_required
+def calendar_ics(request):
+    """The same range as an iCalendar file for calendar apps."""
+    try:
+        start, end = _feed_range(request)
+    except ValueError:
+        return HttpResponse(status=400)
+
+    owner = calendars.owner_filter(request.user)
+    counterpart = 'patient' if 'therapist' in owner else 'therapist'
+    body = calendars.ics_feed(calendars.sessions(owner, start, end), "CMHS Sessions", counterpart)
+    response = HttpResponse(body, content_type='text/calendar; charset=utf-8')
+    response['Content-Disposition'] = 'inline; filename="cmhs-sessions.ics"'
+    return response
+
 @login_required
 def book_appointment(request):
     if request.method == 'POST':
@@ -149,20 +169,28 @@ def book_appointment(request):
         if form.is_valid():
             appointment = form.save(commit=False)
 
-            # Therapist Availability Check
-            is_busy = Appointment.objects.filter(
-                therapist=appointment.therapist,
-                date=appointment.date,
-                time=appointment.time,
-                status__in=['pending', 'confirmed']
-            ).exists()
-
-            if is_busy:
-                # Get the human-readable time from the choices for the error message
-                time_display = dict(form.fields['time'].choices).get(appointment.time, appointment.time)
+            appointment.patient = request.user
+            appointment.status = 'pending'
+
+            if appointment.mode == 'online':
+                date_str = appointment.date.strftime('%Y%m%d')
+                appointment.meeting_link = f"https://8x8.vc/vpaas-magic-cookie-chiromo-demo/CMHS-Therapy-{request.user.id}-{date_str}"
+
+            time_label = dict(form.fields['time'].choices).get(appointment.time, appointment.time)
+
+            # Saving is the availability check: a second live booking for the slot is rejected by the database.
+            # The confirmation e-mail is queued in the same transaction, so it exists exactly when the booking does
+            with transaction.atomic():
+                reserved = reservations.reserve(appointment)
+                if reserved:
+                    subject = 'Appointment Initiated - Chiromo Hospital'
+                    message = f"Dear {request.user.first_name},\n\nYour appointment for Dr. {appointment.therapist.last_name} at {time_label} has been received. Please complete the M-Pesa payment.\n\nRecovery in Dignity."
+                    notifications.enqueue_email(subject, message, request.user.email)
+
+            if not reserved:
                 messages.error(
                     request,
-                    f"Dr. {appointment.therapist.last_name} is already booked for the {time_display} slot. Please select another time or therapist."
+                    f"Dr. {appointment.therapist.last_name} is already booked for the {time_label} slot. Please select another time or therapist."
                 )
                 therapists = User.objects.filter(role='therapist')
                 return render(request, 'appointments/book_appointment.html', {
@@ -171,21 +199,6 @@ def book_appointment(request):
                     'selected_therapist_id': str(appointment.therapist.id)  # Keep doctor selected on error
                 })
 
-            appointment.patient = request.user
-            appointment.status = 'pending'
-
-            if appointment.mode == 'online':
-                date_str = appointment.date.strftime('%Y%m%d')
-                appointment.meeting_link = f"https://8x8.vc/vpaas-magic-cookie-chiromo-demo/CMHS-Therapy-{request.user.id}-{date_str}"
-
-            appointment.save()
-
-            # Email Logic
-            time_label = dict(form.fields['time'].choices).get(appointment.time, appointment.time)
-            subject = 'Appointment Initiated - Chiromo Hospital'
-            message = f"Dear {request.user.first_name},\n\nYour appointment for Dr. {appointment.therapist.last_name} at {time_label} has been received. Please complete the M-Pesa payment.\n\nRecovery in Dignity."
-            send_mail(subject, message, 'noreply@chiromo.com', [request.user.email], fail_silently=True)
-
             messages.success(request, 'Slot reserved! Please complete the M-Pesa payment.')
             return redirect('initiate_payment', appointment_id=appointment.id)
     else:
@@ -194,6 +207,135 @@ def book_appointment(request):
     therapists = User.objects.filter(role='therapist')
     return render(request, 'appointments/book_appointment.html', {'form': form, 'therapists': therapists})
 
+@login_required
+def therapist_availability(request):
+    """
+    Open session slots for many therapists over a run of days, in one call:
+    ?therapist=1,2&start=YYYY-MM-DD&days=7 (all therapists / today / 7 by default).
+    """
+    try:
+        therapist_ids = [int(v) for raw in request.GET.getlist('therapist') for v in raw.split(',') if v]
+        start = availability.day_value(request.GET['start']) if request.GET.get('start') else availability.local_now().date()
+        days = availability.day_range(start, int(request.GET.get('days', 7)))
+    except ValueError:
+        return JsonResponse({'status': 'error'}, status=400)
+
+    if not therapist_ids:
+        therapist_ids = list(User.objects.filter(role='therapist').values_list('id', flat=True))
+
+    return JsonResponse({
+        'slots': [{'value': value, 'label': label} for value, label in availability.SESSION_SLOTS],
+        'availability': availability.open_slots(therapist_ids, days),
+    })
+
+@login_required
+def analytics_trends(request):
+    """
+    Bucketed mood and assessment series for charts:
+    ?patient=<id> or ?therapist=<id> (the caseload), &bucket=week|month,
+    &start=/&end=YYYY-MM-DD, &type=<test type>. Defaults to your own data.
+    """
+    user = request.user
+    bucket = request.GET.get('bucket', 'week')
+    try:
+        if bucket not in analytics.BUCKETS:
+            raise ValueError(bucket)
+        start = availability.day_value(request.GET['start']) if request.GET.get('start') else None
+        end = availability.day_value(request.GET['end']) if request.GET.get('end') else None
+        if request.GET.get('patient'):
+            scope, owner_id = 'patient', int(request.GET['patient'])
+        elif request.GET.get('therapist'):
+            scope, owner_id = 'therapist', int(request.GET['therapist'])
+        else:
+            scope, owner_id = ('therapist' if user.role == 'therapist' else 'patient'), user.id
+    except ValueError:
+        return JsonResponse({'status': 'error'}, status=400)
+
+    # Your own series, your caseload, or a patient on it; staff see everything
+    if not user.is_staff and owner_id != user.id:
+        if scope == 'therapist' or user.role != 'therapist' or not analytics.on_caseload(user.id, owner_id):
+            return JsonResponse({'status': 'forbidden'}, status=403)
+
+    return JsonResponse(analytics.trends(scope, owner_id, bucket, start, end, request.GET.get('type')))
+
+def _schedule_request(request):
+    """
+    (therapist ids, start, end, view) from ?therapist=1,2&start=YYYY-MM-DD&view=week|month.
+    Raises ValueError on bad parameters; ids are None when the user may not see them.
+    """
+    user = request.user
+    view = request.GET.get('view', 'week')
+    if view not in schedule.VIEWS:
+        raise ValueError(view)
+    day = availability.day_value(request.GET['start']) if request.GET.get('start') else timezone.localdate()
+    start, end = schedule.span(day, view)
+
+    if request.GET.get('therapist'):
+        therapist_ids = sorted({int(part) for part in request.GET['therapist'].split(',')})
+    elif user.is_staff:
+        # Coordinators get every active therapist by default
+        therapist_ids = assignment.pool()
+    else:
+        therapist_ids = [user.id]
+
+    # Therapists see their own schedule; staff can put anyone on the board
+    if not user.is_staff and (user.role != 'therapist' or therapist_ids != [user.id]):
+        therapist_ids = None
+    return (therapist_ids[:schedule.MAX_THERAPISTS] if therapist_ids else therapist_ids), start, end, view
+
+@login_required
+def therapist_schedule(request):
+    """A week or month of appointments per therapist, with an ETag for conditional GETs."""
+    try:
+        therapist_ids, start, end, view = _schedule_request(request)
+    except ValueError:
+        return JsonResponse({'status': 'error'}, status=400)
+    if therapist_ids is None:
+        return JsonResponse({'status': 'forbidden'}, status=403)
+
+    # One aggregate query stamps every therapist's range, whichever process wrote it
+    current = schedule.stamps(therapist_ids, start, end)
+    etag = schedule.etag(therapist_ids, start, end, current)
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    found = schedule.schedules(therapist_ids, start, end, current)
+    response = JsonResponse({
+        'view': view,
+        'start': start,
+        'end': end,
+        'therapists': {str(therapist_id): rows for therapist_id, rows in found.items()},
+    })
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+@login_required
+def schedule_board(request):
+    """Therapists down the side, days across the top."""
+    try:
+        therapist_ids, start, end, view = _schedule_request(request)
+    except ValueError:
+        therapist_ids, start, end, view = None, None, None, None
+    if therapist_ids is None:
+        return redirect('dashboard')
+
+    therapists = User.objects.filter(id__in=therapist_ids).order_by('last_name', 'username')
+    days, rows = schedule.board_rows(therapists, start, end, schedule.schedules(therapist_ids, start, end))
+    return render(request, 'appointments/schedule_board.html', {
+        'view': view,
+        'start': start,
+        'end': end,
+        'days': days,
+        'rows': rows,
+        # Any day inside the neighbouring week or month selects it
+        'previous': (start - timedelta(days=1)).isoformat(),
+        'next': end.isoformat(),
+        'therapist': request.GET.get('therapist', ''),
+    })
+
 @login_required
 def log_session(request, appointment_id):
     appointment = get_object_or_404(Appointment, id=appointment_id)
@@ -234,7 +376,7 @@ def patient_resources(request):
 
     resources = SessionLog.objects.filter(
         patient=request.user
-    ).exclude(resources='').order_by('-session_date')
+    ).exclude(resources='').select_related('therapist').order_by('-session_date')
 
     # Public Resources
     public_resources = [
@@ -298,7 +440,9 @@ def patient_resources(request):
 @login_required
 def patient_appointments(request):
     # all appointments for the patients are fetched
-    appointments = Appointment.objects.filter(patient=request.user).order_by('-date', '-time')
+    appointments = paginate_request(
+        request, Appointment.objects.filter(patient=request.user).select_related('therapist'), ('-date', '-time', '-id')
+    )
 
     return render(request, 'appointments/patient_appointments.html', {'appointments': appointments})
 
@@ -340,11 +484,8 @@ def inbox(request, id=None):
     if id:
         chat_partner = get_object_or_404(User, id=id)
 
-    # RECENT CONTACTS
-    sent_ids = Message.objects.filter(sender=user).values_list('recipient', flat=True)
-    received_ids = Message.objects.filter(recipient=user).values_list('sender', flat=True)
-    contact_ids = set(list(sent_ids) + list(received_ids))
-    recent_contacts = User.objects.filter(id__in=contact_ids).exclude(id=user.id)
+    # RECENT CONTACTS (latest message and unread count per partner, one query)
+    recent_contacts, next_cursor = chat.conversation_summaries(user.id, request.GET.get('before'))
 
 
     # Using 'therapist_appointments' and 'patient_appointments'
@@ -362,38 +503,56 @@ def inbox(request, id=None):
     return render(request, 'appointments/inbox.html', {
         'chat_partner': chat_partner,
         'recent_contacts': recent_contacts,
+        'next_cursor': next_cursor,
         'my_contacts': my_contacts,
     })
 
+@login_required
+@premium_required
+def conversation_list(request):
+    # Next page of the inbox sidebar: ?before=<cursor from the previous page>
+    summaries, next_cursor = chat.conversation_summaries(request.user.id, request.GET.get('before'))
+    for summary in summaries:
+        summary['timestamp'] = timezone.localtime(summary['timestamp']).strftime("%d %b %H:%M")
+    return JsonResponse({'conversations': summaries, 'next_cursor': next_cursor})
+
 @login_required
 def get_chat_messages(request, partner_id):
+    # Cheap check first: one indexed MAX() tells us whether anything changed
+    latest = chat.latest_change(request.user.id, partner_id)
+    etag = chat.conversation_etag(request.user.id, partner_id, latest)
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
     partner = get_object_or_404(User, id=partner_id)
+    since = chat.parse_cursor(request.GET.get('since'))
 
-    # Fetch and sort
-    messages = Message.objects.filter(
-        Q(sender=request.user, recipient=partner) |
-        Q(sender=partner, recipient=request.user)
-    ).order_by('timestamp')
+    if since is not None:
+        # Only new or edited messages when the client passes its last cursor
+        messages = chat.changed_since(request.user.id, partner.id, since)
+        older = None
+    else:
+        # Otherwise the newest page (or the page before ?before=), oldest first
+        page = chat.history_page(request.user.id, partner.id, request.GET.get('before'))
+        messages = reversed(page.object_list)
+        older = page.next_cursor
 
     # Mark as read
-    Message.objects.filter(sender=partner, recipient=request.user, is_read=False).update(is_read=True)
-
-    data = []
-    for msg in messages:
-        is_owner = (msg.sender == request.user)
-        is_deleted = (msg.body == "This message was deleted")
-
-        data.append({
-            'id': msg.id,
-            'sender': 'me' if is_owner else 'partner',
-            'body': msg.body,
-            'timestamp': timezone.localtime(msg.timestamp).strftime("%H:%M"),
-            'can_edit': is_owner and not is_deleted,
-            'can_delete': is_owner and not is_deleted,
-            'is_deleted': is_deleted
-        })
+    if chat.mark_read(request.user.id, partner.id):
+        dashboards.invalidate(request.user.id)
 
-    return JsonResponse({'messages': data})
+    data = [chat.serialize_message(msg, request.user.id) for msg in messages]
+
+    response = JsonResponse({
+        'messages': data,
+        'cursor': chat.serialize_cursor(latest),
+        'full': since is None and not request.GET.get('before'),
+        'older': older,
+    })
+    response['ETag'] = etag
+    return response
 
 @login_required
 def delete_message(request, msg_id):
@@ -401,7 +560,7 @@ def delete_message(request, msg_id):
     message = get_object_or_404(Message, id=msg_id, sender=request.user)
 
     # Delete
-    message.body = "This message was deleted"
+    message.body = chat.DELETED_BODY
     message.save()
 
     if request.headers.get('x-requested-with') == 'XMLHttpRequest':
@@ -440,11 +599,7 @@ def send_chat_message(request):
 
         recipient = get_object_or_404(User, id=recipient_id)
 
-        Message.objects.create(
-            sender=request.user,
-            recipient=recipient,
-            body=body
-        )
+        chat.send_message(request.user.id, recipient.id, body)
         return JsonResponse({'status': 'success'})
 
     return JsonResponse({'status': 'error'}, status=400)
@@ -457,101 +612,29 @@ def assessment_hub(request):
     return render(request, 'appointments/assessment_hub.html')
 
 def take_assessment(request):
-    disorder_type = request.GET.get('type', 'general')
-
-    # Define the questions and scoring thresholds for each test
-    assessment_data = {
-        'general': {
-            'title': 'General Mental Health Check-in',
-            'theme_color': 'chiromo-navy',
-            'questions': [
-                {'id': 'q_dep', 'label': 'Little interest or pleasure in doing things? (Mood)'},
-                {'id': 'q_anx', 'label': 'Feeling nervous, anxious or on edge? (Anxiety)'},
-                {'id': 'q_sub', 'label': 'Have you felt you ought to cut down on your drinking or drug use? (Habits)'},
-                {'id': 'q_slp', 'label': 'Trouble falling or staying asleep, or sleeping too much? (Sleep)'},
-            ]
-        },
-        'depression': {
-            'title': 'Depression Screening (PHQ-9)',
-            'theme_color': 'purple',
-            'questions': [
-                {'id': 'q1', 'label': 'Little interest or pleasure in doing things'},
-                {'id': 'q2', 'label': 'Feeling down, depressed, or hopeless'},
-                {'id': 'q3', 'label': 'Trouble falling or staying asleep, or sleeping too much'},
-                {'id': 'q4', 'label': 'Feeling tired or having little energy'},
-                {'id': 'q5', 'label': 'Poor appetite or overeating'}
-            ]
-        },
-        'anxiety': {
-            'title': 'Anxiety Screening (GAD-7)',
-            'theme_color': 'blue',
-            'questions': [
-                {'id': 'q1', 'label': 'Feeling nervous, anxious or on edge'},
-                {'id': 'q2', 'label': 'Not being able to stop or control worrying'},
-                {'id': 'q3', 'label': 'Worrying too much about different things'},
-                {'id': 'q4', 'label': 'Trouble relaxing'},
-                {'id': 'q5', 'label': 'Being so restless that it is hard to sit still'}
-            ]
-        },
-        'substance': {
-            'title': 'Substance Use Screening (CAGE)',
-            'theme_color': 'orange',
-            'questions': [
-                {'id': 'q1', 'label': 'Have you ever felt you ought to cut down on your drinking or drug use?'},
-                {'id': 'q2', 'label': 'Have people annoyed you by criticizing your drinking or drug use?'},
-                {'id': 'q3', 'label': 'Have you ever felt bad or guilty about your drinking or drug use?'}
-            ]
-        },
-        'ptsd': {
-            'title': 'PTSD Screening (PC-PTSD-5)',
-            'theme_color': 'indigo',
-            'questions': [
-                {'id': 'q1', 'label': 'Have you had nightmares about the event or thought about it when you did not want to?'},
-                {'id': 'q2', 'label': 'Tried hard not to think about the event or went out of your way to avoid situations that reminded you of it?'},
-                {'id': 'q3', 'label': 'Were you constantly on guard, watchful, or easily startled?'}
-            ]
-        },
-        'bipolar': {
-            'title': 'Bipolar Screening',
-            'theme_color': 'pink',
-            'questions': [
-                {'id': 'q1', 'label': 'Has there ever been a period where you felt so good/hyper that you got into trouble?'},
-                {'id': 'q2', 'label': 'During this time, did you need less sleep than usual?'},
-                {'id': 'q3', 'label': 'Were you more talkative or did you speak faster than usual?'},
-                {'id': 'q4', 'label': 'Did you spend money purely on impulse?'},
-                {'id': 'q5', 'label': 'Did you experience racing thoughts?'}
-            ]
-        }
-    }
-
-    context = assessment_data.get(disorder_type, assessment_data['general'])
+    instrument = assessments.get_instrument(request.GET.get('type', assessments.DEFAULT_INSTRUMENT))
+    form = ASSESSMENT_FORMS[instrument.key](request.POST or None)
 
-    if request.method == 'POST':
-        # Collect all numerical values from the radio buttons
-        total_score = 0
-        for q in context['questions']:
-            value = request.POST.get(q['id'], 0)
-            total_score += int(value)
-
-        # 2. Dynamic Logic Gate
-        if total_score >= 12:
-            severity = "Severe Symptoms"
-            desc = "Your responses suggest a high level of symptoms. We strongly recommend scheduling a comprehensive clinical evaluation with a psychiatrist."
-        elif total_score >= 6:
-            severity = "Moderate Symptoms"
-            desc = "Your responses suggest moderate symptoms. Speaking with a therapist or counselor would be a helpful next step."
-        else:
-            severity = "Minimal Symptoms"
-            desc = "Your responses suggest minimal symptoms at this time. Continue prioritizing your wellness and check back if anything changes."
+    if request.method == 'POST' and form.is_valid():
+        patient_id = request.user.id if request.user.is_authenticated else None
+        result, = assessments.save_results([(patient_id, instrument.key, form.cleaned_data)])
+        band = instrument.band(result.score)
 
         return render(request, 'appointments/public_result.html', {
-            'result_title': f"Analysis: {severity}",
-            'result_desc': desc,
-            'score': total_score,
-            'specialty': 'clinical' if disorder_type in ['depression', 'anxiety', 'ptsd', 'bipolar'] else 'addiction'
+            'result_title': f"Analysis: {band.title}",
+            'result_desc': band.description,
+            'score': result.score,
+            'specialty': instrument.specialty,
+            'risk_flag': result.risk_flag,
         })
 
-    return render(request, 'appointments/take_assessment.html', context)
+    return render(request, 'appointments/take_assessment.html', {
+        'title': instrument.title,
+        'theme_color': instrument.theme_color,
+        'questions': instrument.questions,
+        'choices': instrument.choices,
+        'form': form,
+    })
 
 # ---------------------------------------------
 # JOURNAL RELATED VIEWS
@@ -572,7 +655,7 @@ def journal_view(request):
         messages.success(request, "Journal entry saved.")
         return redirect('journal')
 
-    entries = JournalEntry.objects.filter(patient=request.user).order_by('-created_at')
+    entries = paginate_request(request, JournalEntry.objects.filter(patient=request.user), ('-created_at', '-id'))
     return render(request, 'appointments/journal.html', {'entries': entries})
 
 @login_required
@@ -600,86 +683,13 @@ def edit_journal(request, pk):
 @csrf_exempt
 def ussd_callback(request):
     if request.method == 'POST':
-        text = request.POST.get("text", "").strip()
-        phone_number = request.POST.get("phoneNumber")
-
-        text_parts = text.split('*') if text else []
-        level = len(text_parts)
-        response = ""
-
-        # LEVEL 0 to 4
-        if text == "":
-            response = "CON Welcome to CMHS\n1. Book Therapy\n2. Emergency Help\n3. My Account"
-        elif level == 1:
-            if text_parts[0] == "1":
-                response = "CON Select Service:\n1. Depression Support\n2. Anxiety & Stress\n3. Addiction Recovery"
-            elif text_parts[0] == "2":
-                response = "CON EMERGENCY\nEnter your location:"
-            else:
-                response = "END Invalid choice."
-        elif level == 2:
-            response = "CON Select Time:\n1. Today 2:00 PM\n2. Tomorrow 10:00 AM\n3. Monday 9:00 AM"
-        elif level == 3:
-            response = "CON Select Branch:\n1. Chiromo Lane (Main)\n2. Bustani (Lavington)\n3. Braeside Clinic"
-        elif level == 4:
-            response = "CON Enter your Full Name to confirm:"
-
-        elif level == 5:
-            try:
-                service_choice = text_parts[1]
-                time_choice = text_parts[2]
-                branch_choice = text_parts[3]
-                user_name = text_parts[4]
-
-                curr_date = date.today()
-
-                if time_choice == "1":
-                    d, t = curr_date, time(14, 0)
-                elif time_choice == "2":
-                    d, t = curr_date + timedelta(days=1), time(10, 0)
-                else:
-                    d, t = curr_date + timedelta(days=2), time(9, 0)
-
-                branches = {"1": "Chiromo Lane", "2": "Bustani", "3": "Braeside"}
-                selected_branch = branches.get(branch_choice, "Main Branch")
-
-                # Handle User lookup/creation
-                patient = User.objects.filter(phone_number=phone_number).first()
-                if not patient:
-                    patient = User.objects.create(
-                        username=phone_number,
-                        first_name=user_name,
-                        phone_number=phone_number
-                    )
-                else:
-                    patient.first_name = user_name
-                    patient.save()
-
-                # Assign Therapist
-                therapist = User.objects.filter(is_staff=True).first()
-
-                # --- SAVE THE APPOINTMENT ---
-                Appointment.objects.create(
-                    patient=patient,
-                    therapist=therapist,
-                    date=d,
-                    time=t,
-                    mode='physical',
-                    status='pending',
-                    notes=f"Branch: {selected_branch}. Service: {service_choice}"
-                )
-
-                # SEND SMS
-                sms_text = f"Thank you {user_name}! Your session at {selected_branch} is confirmed for {d} at {t}."
-                send_ussd_sms(phone_number, sms_text)
-
-                response = f"END {sms_text}"
-
-            except Exception as e:
-                print(f"USSD Final Level Error: {e}")
-                response = "END Sorry, an error occurred. Please try again."
-
+        response = ussd.handle(
+            request.POST.get("sessionId", ""),
+            request.POST.get("phoneNumber"),
+            request.POST.get("text", "").strip(),
+        )
         return HttpResponse(response, content_type='text/plain')
+
 def ussd_simulator(request):
     return render(request, 'ussd_simulator.html')
 
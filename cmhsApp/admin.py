@@ -1,3 +1,17 @@
 from django.contrib import admin
+from .models import DailyRollup, OutboundNotification
 
-# Register your models here.
+
+@admin.register(OutboundNotification)
+class OutboundNotificationAdmin(admin.ModelAdmin):
+    list_display = ('channel', 'recipient', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('channel', 'status')
+    search_fields = ('recipient', 'subject')
+    readonly_fields = ('created_at', 'sent_at', 'last_error')
+
+
+@admin.register(DailyRollup)
+class DailyRollupAdmin(admin.ModelAdmin):
+    list_display = ('day', 'kind', 'status', 'channel', 'payment_type', 'count', 'amount')
+    list_filter = ('kind', 'status', 'channel')
+    date_hierarchy = 'day'
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class CmhsappConfig(AppConfig):
     name = 'cmhsApp'
+
+    def ready(self):
+        from . import signals  # noqa: F401
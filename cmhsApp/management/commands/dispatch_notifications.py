@@ -0,0 +1,34 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from cmhsApp import notifications, workers
+
+
+class Command(BaseCommand):
+    help = "Delivers queued e-mail and SMS notifications in batches, with retries."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Drain what is due and exit instead of polling.")
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--interval', type=float, default=2.0, help="Seconds to sleep when nothing is due.")
+
+    def handle(self, *args, **options):
+        workers.require_shared_cache()
+        # One limiter per channel for the life of the worker
+        limiters = {
+            channel: notifications.RateLimiter(settings.NOTIFICATION_RATE_LIMITS.get(channel))
+            for channel in settings.NOTIFICATION_PROVIDERS
+        }
+
+        while True:
+            busy = False
+            for channel, limiter in limiters.items():
+                sent, failed = notifications.dispatch_channel(channel, options['batch_size'], limiter)
+                if sent or failed:
+                    busy = True
+                    self.stdout.write(f"{channel}: {sent} sent, {failed} failed")
+
+            if not busy:
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
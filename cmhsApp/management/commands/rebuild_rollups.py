@@ -0,0 +1,21 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from cmhsApp import reporting
+
+
+class Command(BaseCommand):
+    help = "Recomputes the daily reporting rollups from the appointment and transaction tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="Only rebuild days from this date (YYYY-MM-DD) on.")
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError("--since must be a date like 2025-01-31")
+
+        written = reporting.rebuild(since)
+        self.stdout.write(f"Wrote {written} rollup bucket(s)")
@@ -0,0 +1,107 @@
+import logging
+import re
+import time
+from collections import Counter
+from django.conf import settings
+from django.db import connection
+
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------
+# QUERY RECORDING
+# ---------------------------------------------
+# Collapse "IN (%s, %s, %s)" so batches of different sizes share one shape
+_IN_LIST = re.compile(r"IN \((?:%s, )*%s\)")
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+def sql_shape(sql):
+    """
+    Normalises a statement so that queries differing only in their
+    parameters compare equal - the signature of an N+1 loop.
+    """
+    shape = _LITERAL.sub('?', sql)
+    return _IN_LIST.sub('IN (...)', shape)
+
+
+class QueryRecorder:
+    """
+    Context manager that records every SQL statement run on the default
+    connection, with its wall time. Works with DEBUG off.
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+    def __enter__(self):
+        self._wrapper = connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_time(self):
+        return sum(duration for _, duration in self.queries)
+
+    def repeated_shapes(self, threshold=None):
+        threshold = threshold or settings.QUERY_REPEAT_THRESHOLD
+        shapes = Counter(sql_shape(sql) for sql, _ in self.queries)
+        return {shape: hits for shape, hits in shapes.items() if hits >= threshold}
+
+
+def budget_for(url_name):
+    return settings.QUERY_BUDGETS.get(url_name)
+
+
+# ---------------------------------------------
+# MIDDLEWARE
+# ---------------------------------------------
+class QueryBudgetMiddleware:
+    """
+    Records query count and DB time per request, reports them in a
+    Server-Timing header and prints a warning when a view repeats the same
+    SQL shape (N+1) or goes over its QUERY_BUDGETS entry.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.QUERY_INSPECTOR_ENABLED:
+            return self.get_response(request)
+
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+
+        # Streaming responses may still run queries; those are not counted
+        response['Server-Timing'] = (
+            f'db;dur={recorder.total_time * 1000:.1f};desc="{recorder.count} queries"'
+        )
+
+        match = request.resolver_match
+        url_name = match.url_name if match else None
+        budget = budget_for(url_name)
+
+        if budget is not None and recorder.count > budget:
+            logger.warning("Query budget exceeded: %s (%s) ran %d queries, budget is %d",
+                           request.path, url_name, recorder.count, budget)
+
+        for shape, hits in recorder.repeated_shapes().items():
+            logger.warning("N+1: %s repeated %dx: %s", request.path, hits, shape[:200])
+
+        return response
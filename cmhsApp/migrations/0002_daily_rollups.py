@@ -0,0 +1,57 @@
+# Generated by Django 6.0 on 2026-10-18 08:31
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def build_rollups(apps, schema_editor):
+    Appointment = apps.get_model('appointments', 'Appointment')
+    Transaction = apps.get_model('payments', 'Transaction')
+    DailyRollup = apps.get_model('cmhsApp', 'DailyRollup')
+
+    appointments = Appointment.objects.annotate(day=TruncDate('created_at')).values(
+        'day', 'status', 'channel'
+    ).annotate(n=Count('id')).order_by()
+    transactions = Transaction.objects.annotate(day=TruncDate('timestamp')).values(
+        'day', 'status', 'payment_type'
+    ).annotate(n=Count('id'), total=Sum('amount')).order_by()
+
+    rows = [
+        DailyRollup(day=row['day'], kind='appointment', status=row['status'], channel=row['channel'], count=row['n'])
+        for row in appointments
+    ] + [
+        DailyRollup(day=row['day'], kind='transaction', status=row['status'], payment_type=row['payment_type'],
+                    count=row['n'], amount=row['total'] or 0)
+        for row in transactions
+    ]
+    DailyRollup.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cmhsApp', '0001_outbound_notification'),
+        ('appointments', '0015_appointment_channel'),
+        ('payments', '0007_rollup_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('kind', models.CharField(choices=[('appointment', 'Appointment'), ('transaction', 'Transaction')], max_length=20)),
+                ('status', models.CharField(max_length=20)),
+                ('channel', models.CharField(blank=True, default='', max_length=10)),
+                ('payment_type', models.CharField(blank=True, default='', max_length=20)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'kind', 'status', 'channel', 'payment_type'), name='rollup_bucket_uniq')],
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
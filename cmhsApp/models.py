@@ -1,3 +1,77 @@
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class OutboundNotification(models.Model):
+    """
+    Transactional outbox for e-mail and SMS. Views insert a row (in the same
+    transaction as the change that triggered it) and the dispatch_notifications
+    worker delivers it, retrying with backoff.
+    """
+    CHANNEL_CHOICES = [
+        ('email', 'E-mail'),
+        ('sms', 'SMS'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES)
+    recipient = models.CharField(max_length=254)
+    subject = models.CharField(max_length=200, blank=True)
+    body = models.TextField()
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Due time for the next delivery attempt; also pushed forward while a worker holds the row
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['channel', 'next_attempt_at'],
+                condition=models.Q(status='pending'),
+                name='outbox_due_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.channel} to {self.recipient} ({self.status})"
+
+
+class DailyRollup(models.Model):
+    """
+    Pre-aggregated counts and amounts for one day and one combination of
+    status with channel (appointments) or payment type (transactions).
+    Kept current by cmhsApp.reporting; rebuilt by `manage.py rebuild_rollups`.
+    """
+    KIND_CHOICES = [
+        ('appointment', 'Appointment'),
+        ('transaction', 'Transaction'),
+    ]
+
+    day = models.DateField()
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    status = models.CharField(max_length=20)
+    # Appointment booking channel; blank for transactions
+    channel = models.CharField(max_length=10, blank=True, default='')
+    # Transaction payment type; blank for appointments
+    payment_type = models.CharField(max_length=20, blank=True, default='')
+    count = models.PositiveIntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'kind', 'status', 'channel', 'payment_type'], name='rollup_bucket_uniq'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.kind} {self.status}: {self.count}"
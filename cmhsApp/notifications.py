@@ -0,0 +1,180 @@
+import logging
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import OutboundNotification
+
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------
+# ENQUEUEING
+# One INSERT each. Called inside a transaction, the row only becomes
+# visible to the dispatcher once the surrounding change commits.
+# ---------------------------------------------
+def enqueue_email(subject, message, recipient):
+    if not recipient:
+        return None
+    return OutboundNotification.objects.create(channel='email', recipient=recipient, subject=subject, body=message)
+
+
+def enqueue_sms(phone_number, message):
+    if not phone_number:
+        return None
+    return OutboundNotification.objects.create(channel='sms', recipient=phone_number, body=message)
+
+
+# ---------------------------------------------
+# PROVIDERS
+# A provider delivers one notification per send() call and raises on
+# failure. open()/close() bracket a batch so connections are reused.
+# ---------------------------------------------
+class EmailProvider:
+    def open(self):
+        self.connection = get_connection()
+        self.connection.open()
+
+    def send(self, notification):
+        EmailMessage(
+            notification.subject, notification.body, settings.NOTIFICATION_FROM_EMAIL,
+            [notification.recipient], connection=self.connection
+        ).send()
+
+    def close(self):
+        self.connection.close()
+
+
+class AfricasTalkingSMSProvider:
+    def open(self):
+        pass
+
+    def send(self, notification):
+        from payments.sms_service import sms
+        response = sms.send(notification.body, [notification.recipient])
+        recipients = response.get('SMSMessageData', {}).get('Recipients', [])
+        failed = [r for r in recipients if r.get('status') != 'Success']
+        if failed or not recipients:
+            raise RuntimeError(f"SMS rejected: {response}")
+
+    def close(self):
+        pass
+
+
+class StubProvider:
+    """
+    Offline provider for development and tests. Deliveries are kept in
+    StubProvider.outbox instead of leaving the machine.
+    """
+    outbox = []
+
+    def open(self):
+        pass
+
+    def send(self, notification):
+        StubProvider.outbox.append({
+            'channel': notification.channel,
+            'recipient': notification.recipient,
+            'subject': notification.subject,
+            'body': notification.body,
+        })
+
+    def close(self):
+        pass
+
+
+def get_provider(channel):
+    return import_string(settings.NOTIFICATION_PROVIDERS[channel])()
+
+
+# ---------------------------------------------
+# DISPATCH
+# ---------------------------------------------
+class RateLimiter:
+    """Spaces out calls to at most `rate` per second."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.next_slot = 0.0
+
+    def wait(self):
+        now = time.monotonic()
+        if self.next_slot > now:
+            time.sleep(self.next_slot - now)
+        self.next_slot = max(now, self.next_slot) + self.interval
+
+
+def retry_delay(attempts):
+    # 30s, 60s, 120s ... capped at an hour
+    return timedelta(seconds=min(settings.NOTIFICATION_RETRY_BASE_SECONDS * 2 ** (attempts - 1), 3600))
+
+
+def claim_batch(channel, batch_size):
+    """
+    Leases up to batch_size due notifications by pushing their due time past
+    the lease. A worker that dies mid-batch simply lets the lease expire.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            OutboundNotification.objects.select_for_update(skip_locked=True)
+            .filter(channel=channel, status='pending', next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        if batch:
+            OutboundNotification.objects.filter(id__in=[n.id for n in batch]).update(
+                next_attempt_at=now + timedelta(seconds=settings.NOTIFICATION_LEASE_SECONDS)
+            )
+    return batch
+
+
+def _record_failure(notification, error):
+    notification.last_error = str(error)[:1000]
+    if notification.attempts >= settings.NOTIFICATION_MAX_ATTEMPTS:
+        notification.status = 'failed'
+    else:
+        notification.next_attempt_at = timezone.now() + retry_delay(notification.attempts)
+
+
+def dispatch_channel(channel, batch_size=100, limiter=None):
+    batch = claim_batch(channel, batch_size)
+    if not batch:
+        return 0, 0
+
+    provider = get_provider(channel)
+    limiter = limiter or RateLimiter(settings.NOTIFICATION_RATE_LIMITS.get(channel))
+    sent, failed = [], []
+
+    try:
+        provider.open()
+    except Exception as e:
+        # e.g. the SMTP server is down: the whole batch counts as one failed attempt
+        logger.warning("%s provider unavailable: %s", channel, e)
+        for notification in batch:
+            notification.attempts += 1
+            _record_failure(notification, e)
+        failed = batch
+    else:
+        try:
+            for notification in batch:
+                limiter.wait()
+                notification.attempts += 1
+                try:
+                    provider.send(notification)
+                except Exception as e:
+                    _record_failure(notification, e)
+                    failed.append(notification)
+                else:
+                    notification.status = 'sent'
+                    notification.sent_at = timezone.now()
+                    sent.append(notification)
+        finally:
+            provider.close()
+
+    OutboundNotification.objects.bulk_update(sent, ['status', 'attempts', 'sent_at'])
+    OutboundNotification.objects.bulk_update(failed, ['status', 'attempts', 'next_attempt_at', 'last_error'])
+    return len(sent), len(failed)
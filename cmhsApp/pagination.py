@@ -0,0 +1,139 @@
+import base64
+import json
+from datetime import datetime
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import QueryDict
+
+
+DEFAULT_PAGE_SIZE = 20
+
+
+# ---------------------------------------------
+# CURSORS
+# A cursor is the sort-key values of the last row on a page, as URL-safe
+# base64 JSON. Rows are then sought with WHERE (keys) past that row, so a
+# page costs the same however deep into the history it is.
+# ---------------------------------------------
+class CursorEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder keeps milliseconds only; a truncated key would skip rows
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, cls=CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(model, ordering, cursor):
+    """Returns the key values in a cursor, or None if it is missing or malformed."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(ordering):
+            return None
+        return [model._meta.get_field(key.lstrip('-')).to_python(value) for key, value in zip(ordering, values)]
+    except (ValueError, TypeError, ValidationError, FieldDoesNotExist):
+        return None
+
+
+def row_key(row, ordering):
+    # Works for model instances and .values() dicts alike
+    names = [key.lstrip('-') for key in ordering]
+    if isinstance(row, dict):
+        return [row[name] for name in names]
+    return [getattr(row, name) for name in names]
+
+
+def seek_filter(ordering, values):
+    """
+    Rows strictly after `values` in `ordering`, e.g. for ('-date', '-id'):
+    date <= d AND (date < d OR (date = d AND id < i)).
+    The leading bound lets the database range-scan an index on the keys.
+    """
+    first = ordering[0]
+    bound = Q(**{f"{first.lstrip('-')}__{'lte' if first.startswith('-') else 'gte'}": values[0]})
+
+    after = Q()
+    for position, key in enumerate(ordering):
+        lookup = 'lt' if key.startswith('-') else 'gt'
+        clause = Q(**{f"{key.lstrip('-')}__{lookup}": values[position]})
+        for equal_key, equal_value in zip(ordering[:position], values[:position]):
+            clause &= Q(**{equal_key.lstrip('-'): equal_value})
+        after |= clause
+    return bound & after
+
+
+# ---------------------------------------------
+# PAGES
+# ---------------------------------------------
+class KeysetPage:
+    """
+    One page of rows plus the cursor for the next one. Iterates like the
+    row list, so templates can keep using {% for %} / {% empty %}.
+    """
+
+    def __init__(self, object_list, cursor=None, next_cursor=None, params=None, param='after'):
+        self.object_list = object_list
+        self.cursor = cursor
+        self.next_cursor = next_cursor
+        self.params = params if params is not None else QueryDict()
+        self.param = param
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def is_first(self):
+        return self.cursor is None
+
+    @property
+    def next_query(self):
+        # Current query string with the cursor swapped, for "?{{ page.next_query }}"
+        params = self.params.copy()
+        params[self.param] = self.next_cursor
+        return params.urlencode()
+
+    @property
+    def first_query(self):
+        params = self.params.copy()
+        params.pop(self.param, None)
+        return params.urlencode()
+
+
+def paginate(queryset, ordering, cursor=None, page_size=DEFAULT_PAGE_SIZE, params=None, param='after'):
+    """
+    Fetches the page after `cursor` with a single LIMIT query. `ordering`
+    must end in a unique key (normally id) so the sort is total.
+    """
+    ordering = tuple(ordering)
+    values = decode_cursor(queryset.model, ordering, cursor)
+    if values is not None:
+        queryset = queryset.filter(seek_filter(ordering, values))
+    else:
+        cursor = None
+
+    # One extra row tells us whether a next page exists without a COUNT
+    rows = list(queryset.order_by(*ordering)[:page_size + 1])
+    next_cursor = encode_cursor(row_key(rows[page_size - 1], ordering)) if len(rows) > page_size else None
+    return KeysetPage(rows[:page_size], cursor, next_cursor, params, param)
+
+
+def paginate_request(request, queryset, ordering, page_size=DEFAULT_PAGE_SIZE, param='after'):
+    return paginate(queryset, ordering, request.GET.get(param), page_size, request.GET, param)
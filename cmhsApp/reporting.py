@@ -0,0 +1,141 @@
+from datetime import datetime, time, timedelta
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from appointments.models import Appointment
+from payments.models import Transaction
+from .models import DailyRollup
+
+
+# ---------------------------------------------
+# ROLLUP SOURCES
+# Each kind groups its rows by local calendar day plus its dimensions.
+# Appointments are counted on the day they were booked, transactions on
+# the day they were started.
+# ---------------------------------------------
+def _appointment_buckets(queryset):
+    rows = queryset.annotate(day=TruncDate('created_at')).values('day', 'status', 'channel').annotate(
+        n=Count('id')
+    ).order_by()
+    return {(row['day'], row['status'], row['channel'], ''): (row['n'], 0) for row in rows}
+
+
+def _transaction_buckets(queryset):
+    rows = queryset.annotate(day=TruncDate('timestamp')).values('day', 'status', 'payment_type').annotate(
+        n=Count('id'), total=Sum('amount')
+    ).order_by()
+    return {(row['day'], row['status'], '', row['payment_type']): (row['n'], row['total'] or 0) for row in rows}
+
+
+SOURCES = {
+    'appointment': (Appointment, 'created_at', _appointment_buckets),
+    'transaction': (Transaction, 'timestamp', _transaction_buckets),
+}
+
+
+def day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def local_day(value):
+    return timezone.localtime(value).date()
+
+
+# ---------------------------------------------
+# INCREMENTAL REFRESH
+# A write recomputes only the day it touched, with one GROUP BY over that
+# day's rows (range scan on the created_at / timestamp index).
+# ---------------------------------------------
+def _store(kind, buckets, days):
+    """Upserts the buckets and clears buckets of `days` that no longer have rows."""
+    with transaction.atomic():
+        DailyRollup.objects.bulk_create(
+            [
+                DailyRollup(day=day, kind=kind, status=status, channel=channel, payment_type=payment_type,
+                            count=count, amount=amount)
+                for (day, status, channel, payment_type), (count, amount) in buckets.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['day', 'kind', 'status', 'channel', 'payment_type'],
+            update_fields=['count', 'amount'],
+            batch_size=1000,
+        )
+        if not days:
+            return
+        # A day holds a handful of buckets, so they are compared here and
+        # the leftovers removed by id in one statement
+        stale = [
+            pk for pk, *key in DailyRollup.objects.filter(kind=kind, day__in=days).values_list(
+                'id', 'day', 'status', 'channel', 'payment_type'
+            )
+            if tuple(key) not in buckets
+        ]
+        if stale:
+            DailyRollup.objects.filter(id__in=stale).delete()
+
+
+def _lock_day(kind, day):
+    # Held until the transaction ends. Taken before the read, so of two
+    # recomputes of one day the one that writes last also read last.
+    # SQLite (development) already runs one writer at a time.
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s, %s)", [list(SOURCES).index(kind), day.toordinal()])
+
+
+def refresh_day(kind, day):
+    model, stamp_field, buckets = SOURCES[kind]
+    start, end = day_bounds(day)
+    with transaction.atomic():
+        _lock_day(kind, day)
+        rows = model.objects.filter(**{f'{stamp_field}__gte': start, f'{stamp_field}__lt': end})
+        _store(kind, buckets(rows), [day])
+
+
+def refresh_days(kind, stamps):
+    for day in {local_day(stamp) for stamp in stamps if stamp}:
+        refresh_day(kind, day)
+
+
+def refresh_rows(kind, queryset):
+    """Refreshes the days of rows changed by a set-based UPDATE."""
+    stamp_field = SOURCES[kind][1]
+    refresh_days(kind, queryset.values_list(stamp_field, flat=True))
+
+
+# ---------------------------------------------
+# FULL REBUILD
+# ---------------------------------------------
+def rebuild(since=None):
+    """Recomputes every rollup (or those from `since` on). Returns rows written."""
+    written = 0
+    with transaction.atomic():
+        for kind, (model, stamp_field, buckets) in SOURCES.items():
+            rows = model.objects.all()
+            existing = DailyRollup.objects.filter(kind=kind)
+            if since:
+                rows = rows.filter(**{f'{stamp_field}__gte': day_bounds(since)[0]})
+                existing = existing.filter(day__gte=since)
+            existing.delete()
+
+            computed = buckets(rows)
+            _store(kind, computed, [])
+            written += len(computed)
+    return written
+
+
+# ---------------------------------------------
+# KPIs
+# ---------------------------------------------
+def admin_kpis():
+    """Admin home totals from the rollups: one query over days, not rows."""
+    appointments = Q(kind='appointment')
+    totals = DailyRollup.objects.aggregate(
+        total_appointments=Sum('count', filter=appointments),
+        pending=Sum('count', filter=appointments & Q(status='pending')),
+        ussd=Sum('count', filter=appointments & Q(channel='ussd')),
+        revenue=Sum('amount', filter=Q(kind='transaction', status='completed')),
+    )
+    return {key: value or 0 for key, value in totals.items()}
@@ -0,0 +1,31 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from appointments.models import Appointment
+from appointments.signals import appointments_changed
+from payments.models import Transaction
+from . import reporting
+
+
+# ---------------------------------------------
+# REPORTING ROLLUPS
+# Recompute the day a row belongs to once its write has committed.
+# ---------------------------------------------
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def refresh_appointment_rollup(sender, instance, **kwargs):
+    stamp = instance.created_at
+    transaction.on_commit(lambda: reporting.refresh_days('appointment', [stamp]))
+
+
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+def refresh_transaction_rollup(sender, instance, **kwargs):
+    stamp = instance.timestamp
+    transaction.on_commit(lambda: reporting.refresh_days('transaction', [stamp]))
+
+
+@receiver(appointments_changed)
+def refresh_appointment_rollups_in_bulk(sender, appointment_ids, **kwargs):
+    # Already sent after commit
+    reporting.refresh_rows('appointment', Appointment.objects.filter(id__in=appointment_ids))
@@ -0,0 +1,64 @@
+import tempfile
+from contextlib import contextmanager
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+from .middleware import QueryRecorder, budget_for
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin that fails when a request goes over its QUERY_BUDGETS
+    entry or runs the same SQL shape repeatedly (an N+1 loop).
+
+        with self.assertQueryBudget('dashboard'):
+            self.client.get(reverse('dashboard'))
+    """
+
+    @contextmanager
+    def assertQueryBudget(self, url_name, budget=None):
+        budget = budget if budget is not None else budget_for(url_name)
+        if budget is None:
+            self.fail(f"No query budget configured for '{url_name}'")
+
+        with QueryRecorder() as recorder:
+            yield recorder
+
+        executed = "\n".join(f"  {sql}" for sql, _ in recorder.queries)
+        self.assertLessEqual(
+            recorder.count, budget,
+            f"'{url_name}' ran {recorder.count} queries, budget is {budget}:\n{executed}"
+        )
+
+        repeated = recorder.repeated_shapes()
+        self.assertFalse(
+            repeated,
+            f"'{url_name}' repeats queries (N+1):\n" +
+            "\n".join(f"  {hits}x {shape}" for shape, hits in repeated.items())
+        )
+
+
+@contextmanager
+def shared_cache():
+    """A file-based default cache, for running worker commands in tests."""
+    with tempfile.TemporaryDirectory() as directory, override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory},
+    }):
+        yield
+
+class TestRunner(DiscoverRunner):
+    """
+    Runs the suite on a memory cache: the tests are one process, and
+    query budgets should count the view's SQL, not the DatabaseCache's.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._cache_settings = override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'cmhs-tests'},
+            'mpesa': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'mpesa-tests'},
+        })
+        self._cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._cache_settings.disable()
+        super().teardown_test_environment(**kwargs)
@@ -1,3 +1,193 @@
-from django.test import TestCase
+from datetime import date, time, timedelta
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from accounts.models import User
+from appointments.models import Appointment
+from appointments.signals import notify_appointments_changed
+from payments.models import Transaction
+from . import notifications, reporting
+from .models import DailyRollup, OutboundNotification
+from .pagination import paginate
+from .testing import shared_cache
 
-# Create your tests here.
+
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        patient = User.objects.create_user('patient')
+        therapists = [User.objects.create_user(f'therapist{i}', role='therapist') for i in range(3)]
+        # Repeated (date, time) pairs so pages have to break ties on id
+        for day in range(4):
+            for therapist in therapists:
+                for hour in (8, 9):
+                    Appointment.objects.create(patient=patient, therapist=therapist,
+                                               date=date(2026, 1, 1) + timedelta(days=day), time=time(hour))
+        cls.ordering = ('-date', '-time', '-id')
+
+    def test_pages_walk_the_full_ordering_once(self):
+        expected = list(Appointment.objects.order_by(*self.ordering).values_list('id', flat=True))
+        seen, cursor = [], None
+        while True:
+            page = paginate(Appointment.objects.all(), self.ordering, cursor, page_size=5)
+            seen += [appointment.id for appointment in page]
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, expected)
+
+    def test_page_is_one_limited_query(self):
+        first = paginate(Appointment.objects.all(), self.ordering, page_size=5)
+        with self.assertNumQueries(1):
+            page = paginate(Appointment.objects.all(), self.ordering, first.next_cursor, page_size=5)
+        self.assertEqual(len(page), 5)
+        self.assertFalse(page.is_first)
+
+    def test_malformed_cursor_falls_back_to_first_page(self):
+        page = paginate(Appointment.objects.all(), self.ordering, 'not-a-cursor', page_size=5)
+        self.assertTrue(page.is_first)
+        self.assertEqual(page.object_list[0].id, Appointment.objects.order_by(*self.ordering).first().id)
+
+
+class DailyRollupTests(TestCase):
+
+    def setUp(self):
+        self.patient = User.objects.create_user('patient')
+        self.therapist = User.objects.create_user('therapist', role='therapist')
+
+    def book(self, hour, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Appointment.objects.create(patient=self.patient, therapist=self.therapist,
+                                              date=date(2026, 1, 5), time=time(hour), **fields)
+
+    def test_writes_keep_the_kpis_current(self):
+        self.book(8)
+        self.book(9, channel='ussd')
+        moved = self.book(10)
+        with self.captureOnCommitCallbacks(execute=True):
+            Transaction.objects.create(user=self.patient, phone_number='254700000000', amount='1500.00',
+                                       checkout_request_id='ws_1', status='completed')
+            Transaction.objects.create(user=self.patient, phone_number='254700000000', amount='900.00',
+                                       checkout_request_id='ws_2')
+
+        # Set-based updates report through appointments_changed
+        with self.captureOnCommitCallbacks(execute=True):
+            Appointment.objects.filter(id=moved.id).update(status='confirmed')
+            notify_appointments_changed([moved.id])
+
+        with self.assertNumQueries(1):
+            kpis = reporting.admin_kpis()
+        self.assertEqual(kpis['total_appointments'], 3)
+        self.assertEqual(kpis['pending'], 2)
+        self.assertEqual(kpis['ussd'], 1)
+        self.assertEqual(kpis['revenue'], 1500)
+
+    def test_rebuild_matches_incremental_rollups(self):
+        self.book(8)
+        self.book(9, channel='ussd')
+        incremental = set(DailyRollup.objects.values_list('day', 'kind', 'status', 'channel', 'count'))
+
+        DailyRollup.objects.all().delete()
+        reporting.rebuild()
+        self.assertEqual(set(DailyRollup.objects.values_list('day', 'kind', 'status', 'channel', 'count')),
+                         incremental)
+
+
+    def test_rebuild_cost_does_not_grow_with_buckets(self):
+        for day in range(1, 29):
+            appointment = Appointment.objects.create(patient=self.patient, therapist=self.therapist,
+                                                     date=date(2026, 2, day), time=time(9))
+            Appointment.objects.filter(id=appointment.id).update(created_at=timezone.now() - timedelta(days=day))
+        # Delete, GROUP BY and one batched upsert per kind (plus savepoints), whatever the history
+        with self.assertNumQueries(11):
+            self.assertEqual(reporting.rebuild(), 28)
+
+    def test_recompute_drops_buckets_left_empty(self):
+        appointment = self.book(8)
+        with self.captureOnCommitCallbacks(execute=True):
+            Appointment.objects.filter(id=appointment.id).update(status='confirmed')
+            notify_appointments_changed([appointment.id])
+        self.assertEqual(list(DailyRollup.objects.values_list('status', 'count')), [('confirmed', 1)])
+
+class RejectingProvider(notifications.StubProvider):
+    def send(self, notification):
+        raise RuntimeError("rejected")
+
+
+class UnreachableProvider(notifications.StubProvider):
+    def open(self):
+        raise ConnectionRefusedError("SMTP server down")
+
+
+@override_settings(NOTIFICATION_MAX_ATTEMPTS=3, NOTIFICATION_RETRY_BASE_SECONDS=30,
+                   NOTIFICATION_RATE_LIMITS={}, NOTIFICATION_PROVIDERS={'email': 'cmhsApp.notifications.StubProvider'})
+class OutboundNotificationTests(TestCase):
+
+    def setUp(self):
+        notifications.StubProvider.outbox.clear()
+
+    def make_due(self):
+        OutboundNotification.objects.update(next_attempt_at=timezone.now())
+
+    def test_booking_queues_its_email_in_the_same_transaction(self):
+        patient = User.objects.create_user('patient', email='patient@example.com')
+        therapist = User.objects.create_user('therapist', role='therapist')
+        self.client.force_login(patient)
+        booking = {'therapist': therapist.id, 'date': '2030-01-07', 'time': '09:15', 'mode': 'physical'}
+
+        self.client.post(reverse('book_appointment'), booking)
+        self.client.post(reverse('book_appointment'), booking)
+        # The second booking lost the slot, so only one e-mail exists
+        self.assertEqual(list(OutboundNotification.objects.values_list('recipient', flat=True)), ['patient@example.com'])
+
+        with transaction.atomic():
+            sid = transaction.savepoint()
+            notifications.enqueue_email('Hi', 'Body', 'other@example.com')
+            transaction.savepoint_rollback(sid)
+        self.assertEqual(OutboundNotification.objects.count(), 1)
+
+    def test_sent_once(self):
+        notifications.enqueue_email('Hi', 'Body', 'patient@example.com')
+        self.assertEqual(notifications.dispatch_channel('email'), (1, 0))
+        self.assertEqual(notifications.dispatch_channel('email'), (0, 0))
+        self.assertEqual(len(notifications.StubProvider.outbox), 1)
+
+    @override_settings(NOTIFICATION_PROVIDERS={'email': 'cmhsApp.tests.RejectingProvider'})
+    def test_failures_back_off_until_max_attempts(self):
+        notification = notifications.enqueue_email('Hi', 'Body', 'patient@example.com')
+        delays = []
+        for _ in range(3):
+            before = timezone.now()
+            self.assertEqual(notifications.dispatch_channel('email'), (0, 1))
+            notification.refresh_from_db()
+            delays.append(round((notification.next_attempt_at - before).total_seconds() / 30))
+            self.make_due()
+
+        self.assertEqual(delays[:2], [1, 2])
+        self.assertEqual((notification.status, notification.attempts, notification.last_error), ('failed', 3, 'rejected'))
+        self.assertEqual(notifications.dispatch_channel('email'), (0, 0))
+
+    @override_settings(NOTIFICATION_PROVIDERS={'email': 'cmhsApp.tests.UnreachableProvider'})
+    def test_unreachable_provider_fails_the_batch_with_backoff(self):
+        for n in range(2):
+            notifications.enqueue_email('Hi', 'Body', f'patient{n}@example.com')
+        self.assertEqual(notifications.dispatch_channel('email'), (0, 2))
+        self.assertEqual(set(OutboundNotification.objects.values_list('status', 'attempts')), {('pending', 1)})
+        self.assertFalse(OutboundNotification.objects.filter(next_attempt_at__lte=timezone.now()).exists())
+
+
+class WorkerCacheTests(TestCase):
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_workers_refuse_a_per_process_cache(self):
+        for command in ('run_report_worker', 'dispatch_notifications', 'process_mpesa_callbacks', 'release_slot_holds'):
+            with self.subTest(command), self.assertRaisesMessage(CommandError, "private to this process"):
+                call_command(command, once=True)
+
+    def test_workers_run_on_a_shared_cache(self):
+        with shared_cache():
+            call_command('release_slot_holds', once=True)
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import CommandError
+
+
+# Backends whose writes never leave the process that made them
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def require_shared_cache():
+    """
+    Workers bump versions and invalidate entries the web process reads;
+    on a per-process cache those writes would silently never reach it.
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    if backend in PROCESS_LOCAL_CACHES:
+        raise CommandError(
+            f"The default cache ({backend}) is private to this process. "
+            "Set REDIS_URL or use DatabaseCache before running workers."
+        )
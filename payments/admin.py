@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Transaction
+from .models import Transaction, MpesaCallback
 
 
 @admin.register(Transaction)
@@ -10,4 +10,14 @@ class TransactionAdmin(admin.ModelAdmin):
     search_fields = ('transaction_code', 'phone_number', 'user__username')
     readonly_fields = ('timestamp', 'transaction_code', 'checkout_request_id')
 
-    ordering = ('-timestamp',)
\ No newline at end of file
+    ordering = ('-timestamp',)
+
+
+@admin.register(MpesaCallback)
+class MpesaCallbackAdmin(admin.ModelAdmin):
+    # Raw callback audit log; read-only by design
+    list_display = ('checkout_request_id', 'status', 'attempts', 'received_at', 'processed_at')
+    list_filter = ('status', 'received_at')
+    search_fields = ('checkout_request_id',)
+    readonly_fields = ('body', 'checkout_request_id', 'status', 'attempts', 'error', 'received_at', 'processed_at')
+    ordering = ('-received_at',)
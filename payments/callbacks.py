@@ -0,0 +1,133 @@
+import json
+from django.db import transaction
+from django.utils import timezone
+from accounts.models import User
+from appointments import reservations
+from appointments.models import Appointment, Payment
+from appointments.signals import notify_appointments_changed
+from cmhsApp import reporting
+from .models import Transaction, MpesaCallback
+
+
+def parse_stk_callback(data):
+    stk = data.get('Body', {}).get('stkCallback', {})
+    metadata = stk.get('CallbackMetadata', {}).get('Item', [])
+    values = {item.get('Name'): item.get('Value') for item in metadata}
+
+    return {
+        'checkout_id': stk.get('CheckoutRequestID'),
+        'result_code': stk.get('ResultCode'),
+        'mpesa_code': values.get('MpesaReceiptNumber'),
+        'amount': values.get('Amount'),
+        'phone': values.get('PhoneNumber'),
+    }
+
+
+def _refresh_rollup(checkout_id):
+    # The claim is a set-based UPDATE, so post_save never fires for it
+    transaction.on_commit(lambda: reporting.refresh_rows(
+        'transaction', Transaction.objects.filter(checkout_request_id=checkout_id)
+    ))
+
+
+def _unclaimed(checkout_id):
+    # A replay of a callback we already applied, or one for a push we never sent
+    return 'duplicate' if Transaction.objects.filter(checkout_request_id=checkout_id).exists() else 'unknown'
+
+
+def apply_stk_callback(data):
+    """
+    Applies one Safaricom STK callback as a single atomic unit.
+
+    The Transaction row is claimed with UPDATE ... WHERE status='pending',
+    so a retried or concurrent duplicate matches nothing and returns
+    'duplicate' without touching anything else ('unknown' if no such
+    checkout exists at all). Linked rows are then updated with set-based
+    UPDATEs rather than fetched and saved.
+    """
+    callback = parse_stk_callback(data)
+    checkout_id = callback['checkout_id']
+    if not checkout_id:
+        return 'ignored'
+
+    with transaction.atomic():
+        if callback['result_code'] != 0:
+            # Cancelled / timed out on the handset
+            claimed = Transaction.objects.filter(checkout_request_id=checkout_id, status='pending').update(status='failed')
+            if claimed:
+                _refresh_rollup(checkout_id)
+                Payment.objects.filter(transaction_code=checkout_id, status='pending').update(status='failed')
+            return 'failed' if claimed else _unclaimed(checkout_id)
+
+        claimed = Transaction.objects.filter(checkout_request_id=checkout_id, status='pending').update(
+            status='completed', transaction_code=callback['mpesa_code']
+        )
+        if not claimed:
+            return _unclaimed(checkout_id)
+        _refresh_rollup(checkout_id)
+
+        # Update User Status
+        User.objects.filter(transaction__checkout_request_id=checkout_id).update(is_premium=True)
+
+        # Confirm the booked session before its Payment loses the checkout id
+        appointment_ids = list(Appointment.objects.filter(
+            payment__transaction_code=checkout_id, payment__status='pending'
+        ).values_list('id', flat=True))
+        # Holds are extended while the push is in flight, so only a callback
+        # arriving after SLOT_HOLD_PAYMENT_SECONDS finds its booking cancelled
+        Appointment.objects.filter(id__in=appointment_ids, status='pending').update(
+            status='confirmed', updated_at=timezone.now()
+        )
+        reservations.release_holds(appointment_ids)
+        notify_appointments_changed(appointment_ids)
+
+        Payment.objects.filter(transaction_code=checkout_id, status='pending').update(
+            status='completed', transaction_code=callback['mpesa_code']
+        )
+
+    return 'applied'
+
+
+# ---------------------------------------------
+# CALLBACK INBOX
+# ---------------------------------------------
+def ingest_callback(raw_body):
+    """
+    Stores the callback exactly as received. This is the only work done
+    while Safaricom waits, so it must not fail on a malformed body.
+    """
+    body = raw_body.decode('utf-8', 'replace')
+    try:
+        checkout_id = parse_stk_callback(json.loads(body))['checkout_id'] or ''
+    except (ValueError, AttributeError):
+        checkout_id = ''
+    return MpesaCallback.objects.create(body=body, checkout_request_id=str(checkout_id)[:100])
+
+
+def process_inbox(batch_size=100, statuses=('pending',), checkout_id=None, after_id=0, received_after=None):
+    """
+    Applies a batch of inbox rows in arrival order. Rows are locked with
+    SKIP LOCKED so parallel workers split the backlog, and each row runs in
+    its own savepoint so one bad payload does not roll back the batch.
+    """
+    with transaction.atomic():
+        rows = MpesaCallback.objects.select_for_update(skip_locked=True).filter(status__in=statuses, id__gt=after_id)
+        if checkout_id:
+            rows = rows.filter(checkout_request_id=checkout_id)
+        if received_after:
+            rows = rows.filter(received_at__gte=received_after)
+        rows = list(rows.order_by('id')[:batch_size])
+
+        for row in rows:
+            row.attempts += 1
+            row.processed_at = timezone.now()
+            try:
+                with transaction.atomic():
+                    row.status = apply_stk_callback(json.loads(row.body))
+                row.error = ''
+            except Exception as e:
+                row.status = 'error'
+                row.error = str(e)[:1000]
+
+        MpesaCallback.objects.bulk_update(rows, ['status', 'attempts', 'error', 'processed_at'])
+    return rows
@@ -0,0 +1,49 @@
+import time
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from payments.callbacks import process_inbox
+from cmhsApp.workers import require_shared_cache
+
+
+class Command(BaseCommand):
+    help = "Applies M-Pesa callbacks stored in the inbox, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Drain the inbox and exit instead of polling.")
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds to sleep when the inbox is empty.")
+        parser.add_argument('--replay-failed', action='store_true',
+                            help="Re-apply rows that errored, and recent rows with an unknown checkout, then exit.")
+
+    def handle(self, *args, **options):
+        require_shared_cache()
+        if options['replay_failed']:
+            # Single pass over rows that errored so far, then over recent rows whose
+            # checkout id was not saved yet when they arrived; re-failures are not retried again
+            cutoff = timezone.now() - timedelta(seconds=settings.MPESA_UNKNOWN_REPLAY_SECONDS)
+            for statuses, received_after in ((('error',), None), (('unknown',), cutoff)):
+                last_id = 0
+                while True:
+                    rows = process_inbox(options['batch_size'], statuses=statuses, after_id=last_id,
+                                         received_after=received_after)
+                    if not rows:
+                        break
+                    self.report(rows)
+                    last_id = rows[-1].id
+            return
+
+        while True:
+            rows = process_inbox(options['batch_size'])
+            if rows:
+                self.report(rows)
+                continue
+            if options['once']:
+                return
+            time.sleep(options['interval'])
+
+    def report(self, rows):
+        outcomes = Counter(row.status for row in rows)
+        self.stdout.write(", ".join(f"{count} {status}" for status, count in sorted(outcomes.items())))
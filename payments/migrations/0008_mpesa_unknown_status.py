@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0007_rollup_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mpesacallback',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('applied', 'Applied'), ('duplicate', 'Duplicate'), ('unknown', 'Unknown Checkout'), ('failed', 'Payment Failed'), ('ignored', 'Ignored'), ('error', 'Processing Error')], default='pending', max_length=10),
+        ),
+    ]
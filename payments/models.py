@@ -22,7 +22,51 @@ class Transaction(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # transaction_history
+            models.Index(fields=['user', 'timestamp'], name='tx_user_ts_idx'),
+            # Financial report and admin revenue totals
+            models.Index(fields=['status', 'timestamp'], name='tx_status_ts_idx'),
+            # Recomputing one day's reporting rollup
+            models.Index(fields=['timestamp'], name='tx_ts_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.transaction_code or 'PENDING'}"
 
 
+
+
+class MpesaCallback(models.Model):
+    """
+    Append-only inbox of raw Safaricom callbacks. The endpoint only inserts
+    here; `manage.py process_mpesa_callbacks` applies rows in order. Rows are
+    never deleted so the table doubles as the reconciliation audit log.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('applied', 'Applied'),
+        ('duplicate', 'Duplicate'),
+        # No Transaction has this checkout id: forged or misrouted
+        ('unknown', 'Unknown Checkout'),
+        ('failed', 'Payment Failed'),
+        ('ignored', 'Ignored'),
+        ('error', 'Processing Error'),
+    )
+
+    body = models.TextField()
+    checkout_request_id = models.CharField(max_length=100, blank=True, db_index=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='mpesa_inbox_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.checkout_request_id or 'unknown'} ({self.status})"
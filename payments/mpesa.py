@@ -1,20 +1,105 @@
 import requests
-import json
+import threading
 import base64
 from datetime import datetime
 from django.conf import settings
+from django.core.cache import caches
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 
-def get_access_token():
-    consumer_key = settings.MPESA_CONSUMER_KEY
-    consumer_secret = settings.MPESA_CONSUMER_SECRET
-    api_url = "https://sandbox.safaricom.co.ke/oauth/v1/generate?grant_type=client_credentials"
+API_HOSTS = {
+    'sandbox': "https://sandbox.safaricom.co.ke",
+    'production': "https://api.safaricom.co.ke",
+}
+
+TOKEN_CACHE_KEY = 'mpesa:access_token'
+# Refresh this many seconds before Safaricom says the token expires
+TOKEN_EXPIRY_MARGIN = 60
+
+
+class MpesaClient:
+    """
+    Daraja API client holding one pooled keep-alive session per process.
+    The OAuth token is kept in the 'mpesa' cache so every worker reuses it
+    until shortly before it expires.
+    """
+
+    def __init__(self):
+        self.base_url = API_HOSTS.get(settings.MPESA_ENVIRONMENT, API_HOSTS['sandbox'])
+        self.timeout = settings.MPESA_TIMEOUT
+        self._token_lock = threading.Lock()
+
+        # Reads (the token call) retry on connection errors and gateway 5xx.
+        # POSTs are only retried when the connection itself failed, so an STK
+        # push is never sent twice.
+        retry = Retry(
+            total=settings.MPESA_MAX_RETRIES,
+            read=0,
+            backoff_factor=0.3,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({'GET'}),
+            raise_on_status=False,
+        )
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_maxsize=10, max_retries=retry))
+
+    def get_access_token(self, force_refresh=False):
+        token = None if force_refresh else caches['mpesa'].get(TOKEN_CACHE_KEY)
+        if token:
+            return token
+
+        # One refresh per process at a time; other threads reuse its result
+        with self._token_lock:
+            token = None if force_refresh else caches['mpesa'].get(TOKEN_CACHE_KEY)
+            if token:
+                return token
+
+            r = self.session.get(
+                f"{self.base_url}/oauth/v1/generate?grant_type=client_credentials",
+                auth=(settings.MPESA_CONSUMER_KEY, settings.MPESA_CONSUMER_SECRET),
+                timeout=self.timeout,
+            )
+            r.raise_for_status()
+            data = r.json()
+            token = data['access_token']
+            expires_in = int(data.get('expires_in', 3599))
+            caches['mpesa'].set(TOKEN_CACHE_KEY, token, max(expires_in - TOKEN_EXPIRY_MARGIN, 1))
+            return token
+
+    def stk_push(self, payload):
+        url = f"{self.base_url}/mpesa/stkpush/v1/processrequest"
+        response = self.session.post(url, json=payload, headers=self._auth_headers(), timeout=self.timeout)
+
+        # Token revoked before its advertised expiry: refresh once and resend
+        if response.status_code == 401:
+            self.get_access_token(force_refresh=True)
+            response = self.session.post(url, json=payload, headers=self._auth_headers(), timeout=self.timeout)
+        return response.json()
+
+    def _auth_headers(self):
+        return {
+            'Authorization': f'Bearer {self.get_access_token()}',
+            'Content-Type': 'application/json'
+        }
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = MpesaClient()
+    return _client
 
+
+def get_access_token():
     try:
-        r = requests.get(api_url, auth=(consumer_key, consumer_secret))
-        r.raise_for_status()
-        token = r.json()['access_token']
-        return token
+        return get_client().get_access_token()
     except Exception as e:
         print(f"M-Pesa Auth Error: {e}")
         return None
@@ -25,7 +110,6 @@ def lipa_na_mpesa_online(phone_number, amount, callback_url):
     if not access_token:
         return {"error": "Failed to authenticate with M-Pesa"}
 
-    api_url = "https://sandbox.safaricom.co.ke/mpesa/stkpush/v1/processrequest"
     timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
 
     data_to_encode = f"{settings.MPESA_SHORTCODE}{settings.MPESA_PASSKEY}{timestamp}"
@@ -37,12 +121,6 @@ def lipa_na_mpesa_online(phone_number, amount, callback_url):
     elif phone_number.startswith('+'):
         phone_number = phone_number[1:]
 
-    # Construct Request
-    headers = {
-        'Authorization': f'Bearer {access_token}',
-        'Content-Type': 'application/json'
-    }
-
     payload = {
         "BusinessShortCode": settings.MPESA_SHORTCODE,
         "Password": password,
@@ -58,7 +136,6 @@ def lipa_na_mpesa_online(phone_number, amount, callback_url):
     }
 
     try:
-        response = requests.post(api_url, json=payload, headers=headers)
-        return response.json()
+        return get_client().stk_push(payload)
     except Exception as e:
-        return {"error": str(e)}
\ No newline at end of file
+        return {"error": str(e)}
@@ -1,3 +1,212 @@
-from django.test import TestCase
+import json
+from datetime import date, time, timedelta
+from io import StringIO
+from unittest import mock
+import responses
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from accounts.models import User
+from appointments.models import Appointment, Payment
+from cmhsApp.testing import shared_cache
+from . import mpesa
+from .callbacks import apply_stk_callback, ingest_callback, process_inbox
+from .models import MpesaCallback, Transaction
 
-# Create your tests here.
+
+def stk_callback(checkout_id, result_code=0, receipt='QAB123XYZ'):
+    stk = {'CheckoutRequestID': checkout_id, 'ResultCode': result_code}
+    if result_code == 0:
+        stk['CallbackMetadata'] = {'Item': [
+            {'Name': 'Amount', 'Value': 1},
+            {'Name': 'MpesaReceiptNumber', 'Value': receipt},
+            {'Name': 'PhoneNumber', 'Value': 254700000001},
+        ]}
+    return {'Body': {'stkCallback': stk}}
+
+
+class StkCallbackTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = User.objects.create_user('patient')
+        therapist = User.objects.create_user('therapist', role='therapist')
+        cls.appointment = Appointment.objects.create(patient=cls.patient, therapist=therapist,
+                                                     date=date(2030, 1, 7), time=time(9))
+        Transaction.objects.create(user=cls.patient, phone_number='254700000001', amount=1, checkout_request_id='ws_CO_1')
+        Payment.objects.create(patient=cls.patient, appointment=cls.appointment, amount=1, transaction_code='ws_CO_1')
+
+    def state(self):
+        self.appointment.refresh_from_db()
+        self.patient.refresh_from_db()
+        return (Transaction.objects.get().status, Payment.objects.get().status, self.appointment.status,
+                self.patient.is_premium)
+
+    def test_replayed_success_is_applied_once(self):
+        self.assertEqual(apply_stk_callback(stk_callback('ws_CO_1')), 'applied')
+        self.assertEqual(self.state(), ('completed', 'completed', 'confirmed', True))
+        self.assertEqual(Transaction.objects.get().transaction_code, 'QAB123XYZ')
+
+        self.assertEqual(apply_stk_callback(stk_callback('ws_CO_1', receipt='QAB999XYZ')), 'duplicate')
+        self.assertEqual(Transaction.objects.get().transaction_code, 'QAB123XYZ')
+
+    def test_success_after_failure_is_a_duplicate(self):
+        self.assertEqual(apply_stk_callback(stk_callback('ws_CO_1', result_code=1032)), 'failed')
+        self.assertEqual(self.state(), ('failed', 'failed', 'pending', False))
+
+        self.assertEqual(apply_stk_callback(stk_callback('ws_CO_1')), 'duplicate')
+        self.assertEqual(self.state(), ('failed', 'failed', 'pending', False))
+
+    def test_unknown_checkout_is_reported(self):
+        self.assertEqual(apply_stk_callback(stk_callback('ws_CO_forged')), 'unknown')
+        self.assertEqual(apply_stk_callback(stk_callback('ws_CO_forged', result_code=1)), 'unknown')
+        self.assertEqual(apply_stk_callback({'Body': {}}), 'ignored')
+        self.assertEqual(self.state(), ('pending', 'pending', 'pending', False))
+
+
+class CallbackInboxTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = User.objects.create_user('patient')
+        for checkout_id in ('ws_CO_1', 'ws_CO_2'):
+            Transaction.objects.create(user=cls.patient, phone_number='254700000001', amount=1,
+                                       checkout_request_id=checkout_id)
+
+    def ingest(self, checkout_id, **kwargs):
+        return ingest_callback(json.dumps(stk_callback(checkout_id, **kwargs)).encode())
+
+    def test_poison_row_does_not_block_the_batch(self):
+        poison = ingest_callback(b'{"Body": {"stkCallback": {"CheckoutRequestID": "ws_CO_2", "ResultCode": 0, '
+                                 b'"CallbackMetadata": {"Item": "oops"}}}}')
+        self.ingest('ws_CO_1')
+
+        rows = process_inbox()
+        self.assertEqual([row.status for row in rows], ['error', 'applied'])
+        self.assertEqual(dict(Transaction.objects.values_list('checkout_request_id', 'status')),
+                         {'ws_CO_1': 'completed', 'ws_CO_2': 'pending'})
+        poison.refresh_from_db()
+        self.assertTrue(poison.error)
+
+    def test_rows_are_applied_once(self):
+        self.ingest('ws_CO_1')
+        self.ingest('ws_CO_1')
+        self.assertEqual([row.status for row in process_inbox()], ['applied', 'duplicate'])
+        self.assertEqual(process_inbox(), [])
+
+        # Re-processing an already handled row changes nothing
+        rows = process_inbox(statuses=('applied', 'duplicate'))
+        self.assertEqual([row.status for row in rows], ['duplicate', 'duplicate'])
+        self.assertEqual(list(MpesaCallback.objects.order_by('id').values_list('attempts', flat=True)), [2, 2])
+        self.assertEqual(Transaction.objects.get(checkout_request_id='ws_CO_1').transaction_code, 'QAB123XYZ')
+
+    def test_success_page_applies_only_its_own_callback(self):
+        self.ingest('ws_CO_2', receipt='QAB222XYZ')
+        self.ingest('ws_CO_1')
+        self.client.force_login(self.patient)
+
+        response = self.client.get(reverse('payment_success'), {'checkout_id': 'ws_CO_1'})
+        self.assertTrue(response.context['is_confirmed'])
+        self.assertEqual(dict(MpesaCallback.objects.values_list('checkout_request_id', 'status')),
+                         {'ws_CO_1': 'applied', 'ws_CO_2': 'pending'})
+
+
+    def test_unstored_callbacks_are_not_acknowledged(self):
+        body = json.dumps(stk_callback('ws_CO_1'))
+        with mock.patch('payments.views.ingest_callback', side_effect=DatabaseError), \
+                self.assertLogs('payments.views', 'ERROR'):
+            response = self.client.post(reverse('mpesa_callback'), body, content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+
+        response = self.client.post(reverse('mpesa_callback'), body, content_type='application/json')
+        self.assertEqual(response.json(), {'status': 'ok'})
+        self.assertEqual(MpesaCallback.objects.get().checkout_request_id, 'ws_CO_1')
+
+    def test_replay_retries_recent_unknown_checkouts(self):
+        early = self.ingest('ws_CO_3')
+        stale = self.ingest('ws_CO_3')
+        self.assertEqual([row.status for row in process_inbox()], ['unknown', 'unknown'])
+        MpesaCallback.objects.filter(id=stale.id).update(received_at=timezone.now() - timedelta(days=2))
+
+        # The push response saved its checkout id after the callback arrived
+        Transaction.objects.create(user=self.patient, phone_number='254700000001', amount=1, checkout_request_id='ws_CO_3')
+        with shared_cache():
+            call_command('process_mpesa_callbacks', replay_failed=True, stdout=StringIO())
+        self.assertEqual(dict(MpesaCallback.objects.values_list('id', 'status')),
+                         {early.id: 'applied', stale.id: 'unknown'})
+        self.assertEqual(Transaction.objects.get(checkout_request_id='ws_CO_3').status, 'completed')
+
+class TransactionHistoryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = User.objects.create_user('patient')
+        Transaction.objects.create(user=cls.patient, phone_number='254700000001', amount=1)
+        Payment.objects.bulk_create([Payment(patient=cls.patient, amount=1, transaction_code=f'ws_CO_{i}')
+                                     for i in range(25)])
+
+    def test_session_payments_are_paged_on_their_own_cursor(self):
+        self.client.force_login(self.patient)
+        response = self.client.get(reverse('transaction_history'))
+        payments = response.context['session_payments']
+        self.assertEqual((len(payments), len(response.context['subscriptions'])), (20, 1))
+
+        response = self.client.get(reverse('transaction_history') + '?' + payments.next_query)
+        self.assertEqual(len(response.context['session_payments']), 5)
+        self.assertEqual(len(response.context['subscriptions']), 1)
+
+TOKEN_URL = "https://sandbox.safaricom.co.ke/oauth/v1/generate"
+STK_URL = "https://sandbox.safaricom.co.ke/mpesa/stkpush/v1/processrequest"
+
+
+@override_settings(
+    MPESA_ENVIRONMENT='sandbox', MPESA_CONSUMER_KEY='key', MPESA_CONSUMER_SECRET='secret',
+    MPESA_SHORTCODE='174379', MPESA_PASSKEY='passkey',
+    CACHES=dict(settings.CACHES, mpesa={'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'mpesa-tests'}),
+)
+class MpesaClientTests(TestCase):
+
+    def setUp(self):
+        caches['mpesa'].clear()
+        self.mpesa = mpesa.MpesaClient()
+
+    def token(self, value):
+        responses.add(responses.GET, TOKEN_URL, json={'access_token': value, 'expires_in': '3599'})
+
+    @responses.activate
+    def test_token_is_fetched_once_and_shared(self):
+        self.token('first')
+        self.assertEqual(self.mpesa.get_access_token(), 'first')
+        # A fresh client (another process) reuses the cached token
+        self.assertEqual(mpesa.MpesaClient().get_access_token(), 'first')
+        self.assertEqual(len(responses.calls), 1)
+
+    @responses.activate
+    def test_revoked_token_is_refreshed_and_the_push_resent_once(self):
+        self.token('revoked')
+        self.token('fresh')
+        responses.add(responses.POST, STK_URL, status=401, json={'errorMessage': 'Invalid Access Token'})
+        responses.add(responses.POST, STK_URL, json={'ResponseCode': '0', 'CheckoutRequestID': 'ws_CO_1'})
+
+        self.assertEqual(self.mpesa.stk_push({})['CheckoutRequestID'], 'ws_CO_1')
+        pushes = [call.request.headers['Authorization'] for call in responses.calls if call.request.method == 'POST']
+        self.assertEqual(pushes, ['Bearer revoked', 'Bearer fresh'])
+
+    @responses.activate
+    def test_token_call_retries_gateway_errors(self):
+        responses.add(responses.GET, TOKEN_URL, status=503)
+        self.token('after-retry')
+        self.assertEqual(self.mpesa.get_access_token(), 'after-retry')
+        self.assertEqual(len(responses.calls), 2)
+
+    @responses.activate
+    def test_push_is_never_retried_on_a_gateway_error(self):
+        self.token('token')
+        responses.add(responses.POST, STK_URL, status=503, json={'errorMessage': 'Service Unavailable'})
+        responses.add(responses.POST, STK_URL, json={'ResponseCode': '0'})
+        self.assertEqual(self.mpesa.stk_push({}), {'errorMessage': 'Service Unavailable'})
+        self.assertEqual(len([call for call in responses.calls if call.request.method == 'POST']), 1)
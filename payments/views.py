@@ -1,3 +1,4 @@
+import logging
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
@@ -5,13 +6,19 @@ from django.views.decorators.csrf import csrf_exempt
 from django.http import JsonResponse, HttpResponse
 from django.urls import reverse
 from appointments.models import Appointment, Payment
+from appointments import reservations
 from .models import Transaction
+from cmhsApp.pagination import paginate_request
 from .mpesa import lipa_na_mpesa_online
+from .callbacks import ingest_callback, process_inbox
 import json
 from django.core.mail import send_mail
 from .sms_service import send_ussd_sms
 
 
+logger = logging.getLogger(__name__)
+
+
 @login_required
 def pricing_page(request):
     return render(request, 'payments/pricing.html')
@@ -23,6 +30,9 @@ def payment_success(request):
     transaction = None
 
     if checkout_id:
+        # Don't make the patient wait for the worker if their callback is already in
+        process_inbox(checkout_id=checkout_id)
+
         # Fetch the transaction object updated by the mpesa_callback
         transaction = Transaction.objects.filter(checkout_request_id=checkout_id).first()
 
@@ -47,6 +57,13 @@ def initiate_payment(request, appointment_id=None):
     if appointment_id:
         appointment = get_object_or_404(Appointment, id=appointment_id)
         amount = 1
+
+        # The unpaid booking only keeps its slot while its hold is live
+        if appointment.status == 'cancelled':
+            messages.error(request, "Your reservation expired before payment. Please book the session again.")
+            return redirect('book_appointment')
+        if appointment.status == 'pending':
+            reservations.hold(appointment)
     else:
         amount = 1
 
@@ -104,54 +121,14 @@ def initiate_payment(request, appointment_id=None):
 
 @csrf_exempt
 def mpesa_callback(request):
+    # Persist and acknowledge; process_mpesa_callbacks applies it
     if request.method == 'POST':
         try:
-            data = json.loads(request.body)
-            stk = data.get('Body', {}).get('stkCallback', {})
-
-            if stk.get('ResultCode') == 0:
-                checkout_id = stk.get('CheckoutRequestID')
-                metadata = stk.get('CallbackMetadata', {}).get('Item', [])
-
-                mpesa_code = None
-                amount_paid = None
-                phone_used = None
-
-                for item in metadata:
-                    if item.get('Name') == 'MpesaReceiptNumber':
-                        mpesa_code = item.get('Value')
-                    elif item.get('Name') == 'Amount':
-                        amount_paid = item.get('Value')
-                    elif item.get('Name') == 'PhoneNumber':
-                        phone_used = item.get('Value')
-
-                # Update the Transaction Record
-                tx = Transaction.objects.get(checkout_request_id=checkout_id)
-                tx.status = 'completed'
-                tx.transaction_code = mpesa_code
-                tx.save()
-
-                # Update User Status
-                user = tx.user
-                user.is_premium = True
-                user.save()
-
-                # Update the Appointment Payment
-                try:
-                    pay_record = Payment.objects.get(transaction_code=checkout_id)
-                    pay_record.status = 'completed'
-                    pay_record.transaction_code = mpesa_code
-                    pay_record.save()
-
-
-                    if pay_record.appointment:
-                        pay_record.appointment.status = 'confirmed'
-                        pay_record.appointment.save()
-                except Payment.DoesNotExist:
-                    pass
-
-        except Exception as e:
-            print(f"Callback Logic Error: {e}")
+            ingest_callback(request.body)
+        except Exception:
+            # Not stored, so not acknowledged: Safaricom retries on a 5xx
+            logger.exception("M-Pesa callback could not be stored")
+            return JsonResponse({'status': 'error'}, status=503)
 
     return JsonResponse({'status': 'ok'})
 
@@ -183,15 +160,17 @@ def transaction_history(request):
     """
     # 1. Fetch Premium Subscriptions (from the Transaction model)
     # Ordered by newest first
-    subscriptions = Transaction.objects.filter(
-        user=request.user
-    ).order_by('-timestamp')
+    subscriptions = paginate_request(request, Transaction.objects.filter(user=request.user), ('-timestamp', '-id'))
 
     # 2. Fetch Individual Session Payments (from the Payment model)
     # This captures payments specifically linked to appointments
-    session_payments = Payment.objects.filter(
-        patient=request.user
-    ).select_related('appointment', 'appointment__therapist').order_by('-timestamp')
+    # Paged on its own cursor so both lists stay bounded
+    session_payments = paginate_request(
+        request,
+        Payment.objects.filter(patient=request.user).select_related('appointment', 'appointment__therapist'),
+        ('-timestamp', '-id'),
+        param='payments_after',
+    )
 
     # 3. Context for the template
     context = {